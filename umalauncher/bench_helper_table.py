@@ -0,0 +1,78 @@
+"""Times helper table rendering on recorded training logs.
+
+Usage: python bench_helper_table.py <training log> [<training log> ...]
+
+Every response packet that would update the helper table is rendered twice:
+once incrementally (what the overlay does while training) and once in full.
+Results are grouped by scenario.
+"""
+import os
+import sys
+import time
+import collections
+import copy
+import statistics
+# Installs the placeholders for the Windows-only modules, so this runs on any platform like the replay.
+import replay
+import training_log
+import helper_table
+
+
+class BenchCarrotJuicer():
+    """The parts of CarrotJuicer the helper table uses, without a browser."""
+    browser = None
+    last_helper_data = None
+
+    def __init__(self, threader):
+        self.threader = threader
+
+
+def iter_helper_packets(paths):
+    for path in paths:
+        for packet in training_log.TrainingLogReader(path):
+            if packet.get('_direction') == 1 and 'chara_info' in packet:
+                yield packet
+
+
+def bench(paths):
+    table = helper_table.HelperTable(BenchCarrotJuicer(replay.ReplayThreader()))
+    timings = collections.defaultdict(lambda: {'patch': [], 'full': []})
+
+    last_data = None
+    for packet in iter_helper_packets(paths):
+        table.carry_over_data(packet, last_data)
+        last_data = packet
+        scenario_id = packet['chara_info']['scenario_id']
+
+        # create_helper_elements changes the packet, so every run gets its own copy.
+        data = copy.deepcopy(packet)
+        start_time = time.perf_counter()
+        result = table.create_helper_elements(data, None)
+        patch_time = time.perf_counter() - start_time
+        if result is None:
+            continue
+
+        # Render again from scratch, as after a preset change.
+        table.selected_preset.reset_overlay_state()
+        data = copy.deepcopy(packet)
+        start_time = time.perf_counter()
+        table.create_helper_elements(data, None)
+        full_time = time.perf_counter() - start_time
+
+        timings[scenario_id]['patch'].append(patch_time)
+        timings[scenario_id]['full'].append(full_time)
+
+    print(f"{'scenario':>8} {'packets':>8} {'full ms':>9} {'patch ms':>9} {'max ms':>8}")
+    for scenario_id, times in sorted(timings.items()):
+        full_ms = statistics.mean(times['full']) * 1000
+        patch_ms = statistics.mean(times['patch']) * 1000
+        max_ms = max(times['full'] + times['patch']) * 1000
+        print(f"{scenario_id:>8} {len(times['full']):>8} {full_ms:>9.3f} {patch_ms:>9.3f} {max_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    replay.set_log_level("WARNING")
+    bench([os.path.join(replay.LAUNCH_DIR, path) for path in sys.argv[1:]])
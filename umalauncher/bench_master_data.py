@@ -0,0 +1,111 @@
+"""Times loading the master data snapshot with and without the on-disk cache.
+
+Usage: python bench_master_data.py [--mdb master.mdb] [--repeat 5]
+
+Works on a copy of master.mdb (the game's by default) with the cache in a temporary folder,
+so neither the game's files nor the launcher's appdata are touched.
+cold: there is no cache. Everything is read from master.mdb and the cache is written.
+warm: the cache matches master.mdb and is loaded from disk.
+invalidated: master.mdb changed since the cache was written, like after a game update.
+The old snapshot is returned right away and the new one is built in the background.
+changed while running: master.mdb changed after the snapshot was loaded and a new training starts.
+The loaded snapshot is kept until the new one is built in the background.
+Reports how long get_master_data blocks and when the background rebuilds finish.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+# Installs the placeholders for the Windows-only modules, so this runs on any platform like the replay.
+import replay
+import util
+import mdb
+
+
+def load():
+    """Returns the time get_master_data blocks when nothing is loaded yet."""
+    with mdb.MASTER_DATA_LOCK:
+        mdb.MASTER_DATA = None
+    start_time = time.perf_counter()
+    mdb.get_master_data()
+    return time.perf_counter() - start_time
+
+
+def touch(db_path):
+    # A new modification time is enough to change the fingerprint.
+    stat = os.stat(db_path)
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def wait_for_rebuild(start_time):
+    if mdb.REBUILD_THREAD is not None:
+        mdb.REBUILD_THREAD.join()
+    return time.perf_counter() - start_time
+
+
+def bench(repeat, db_path):
+    timings = {'cold': [], 'warm': [], 'invalidated': [], 'rebuild': [], 'changed': [], 'changed rebuild': []}
+    cache_path = util.get_appdata(mdb.MASTER_DATA_CACHE_FILE)
+    for _ in range(repeat):
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        timings['cold'].append(load())
+        timings['warm'].append(load())
+
+        touch(db_path)
+        start_time = time.perf_counter()
+        timings['invalidated'].append(load())
+        timings['rebuild'].append(wait_for_rebuild(start_time))
+
+        touch(db_path)
+        start_time = time.perf_counter()
+        # What update_mdb_cache does when a training starts.
+        mdb.get_master_data(force=True)
+        timings['changed'].append(time.perf_counter() - start_time)
+        timings['changed rebuild'].append(wait_for_rebuild(start_time))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times cold, warm and invalidated master data loads.")
+    parser.add_argument("--mdb", help="master.mdb to use instead of the game's.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of times to load each way.")
+    args = parser.parse_args()
+    replay.set_log_level("WARNING")
+
+    source_path = os.path.join(replay.LAUNCH_DIR, args.mdb) if args.mdb else mdb.get_db_path()
+    if not os.path.exists(source_path):
+        print(f"Could not find master.mdb at {source_path}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        util.appdata_dir = temp_dir
+        mdb.DB_PATH = os.path.join(temp_dir, "master.mdb")
+        shutil.copyfile(source_path, mdb.DB_PATH)
+        try:
+            timings = bench(args.repeat, mdb.DB_PATH)
+            cache_size = os.path.getsize(util.get_appdata(mdb.MASTER_DATA_CACHE_FILE))
+        finally:
+            # The pooled connections keep the copy open, which stops it from being removed on Windows.
+            mdb.POOL.close_all()
+
+    print(f"master.mdb: {os.path.getsize(source_path) / 1024 / 1024:.1f} MiB, cache: {cache_size / 1024:.0f} KiB")
+    print(f"{'load':<24} {'mean ms':>9} {'min ms':>9} {'max ms':>9}")
+    labels = {
+        'cold': "cold",
+        'warm': "warm",
+        'invalidated': "invalidated",
+        'rebuild': "invalidated, rebuilt",
+        'changed': "changed while running",
+        'changed rebuild': "changed, rebuilt",
+    }
+    for key, label in labels.items():
+        times = timings[key]
+        print(f"{label:<24} {statistics.mean(times) * 1000:>9.1f} {min(times) * 1000:>9.1f} {max(times) * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
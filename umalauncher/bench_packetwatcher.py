@@ -0,0 +1,159 @@
+"""Measures how long a msgpack takes from being written to the CarrotJuicer folder to being decoded.
+
+Usage: python bench_packetwatcher.py [--turns 100] [--interval 800] [--poll] [--baseline] [<training log> ...]
+
+A writer thread drops a request and a response into a temporary folder for every turn, the way the game
+does during a training, sometimes in two writes. A reader picks them up with PacketWatcher and decodes them
+like CarrotJuicer's decoder stage. Reports the latency from the end of each write to the decoded packet,
+and the CPU time used by the reader.
+--poll makes PacketWatcher use its polling fallback. Without change notifications (off Windows) it always does.
+--baseline reads the folder the way it was done before PacketWatcher: every 250 ms, sorted by mtime.
+The packets are taken from the given training logs, or made up if there are none.
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+import msgpack
+# Installs the placeholders for the Windows-only modules, so this runs on any platform like the replay.
+import replay
+import training_log
+import packetwatcher
+
+
+def iter_payloads(paths):
+    if not paths:
+        while True:
+            yield {'data': {'chara_info': {'turn': 1, 'skill_array': list(range(200))}, 'home_info': {'command_info_array': [{'command_id': i, 'params_inc_dec_info_array': [1] * 20} for i in range(5)]}}}
+    while True:
+        for path in paths:
+            for packet in training_log.TrainingLogReader(path):
+                if packet.get('_direction') == 1:
+                    yield {'data': packet}
+
+
+class PacketWriter(threading.Thread):
+    """Writes a request and a response per turn. write_times holds when each file was complete."""
+
+    def __init__(self, folder, payloads, turns, interval):
+        super().__init__(daemon=True)
+        self.folder = folder
+        self.payloads = payloads
+        self.turns = turns
+        self.interval = interval
+        self.write_times = {}
+        self.lock = threading.Lock()
+
+    def write(self, file_name, data):
+        path = os.path.join(self.folder, file_name)
+        with open(path, "wb") as f:
+            if random.random() < 0.2:
+                # The reader may see the file before it is complete.
+                f.write(data[:len(data) // 2])
+                f.flush()
+                time.sleep(0.005)
+                f.write(data[len(data) // 2:])
+            else:
+                f.write(data)
+            f.flush()
+            with self.lock:
+                self.write_times[file_name] = time.perf_counter()
+
+    def run(self):
+        for _ in range(self.turns):
+            timestamp = int(time.time() * 1000)
+            # Requests have a header in front of the msgpack data.
+            self.write(f"{timestamp}Q.msgpack", b"\x00" * 170 + msgpack.packb({'command_type': 1}))
+            time.sleep(random.uniform(0.02, 0.1))
+            self.write(f"{timestamp + 1}R.msgpack", msgpack.packb(next(self.payloads)))
+            time.sleep(self.interval * random.uniform(0.5, 1.5))
+
+
+def decode(path):
+    """Returns True if the file was decoded and removed, False if it is not complete yet."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith("Q.msgpack"):
+        data = data[170:]
+    try:
+        msgpack.unpackb(data, strict_map_key=False)
+    except Exception:
+        return False
+    os.remove(path)
+    return True
+
+
+def read_with_watcher(folder, writer, latencies, poll):
+    watcher = packetwatcher.PacketWatcher(folder)
+    if poll or sys.platform != "win32":
+        watcher.notifications_available = False
+    try:
+        while writer.is_alive() or os.listdir(folder):
+            if watcher.wait():
+                read_batch(watcher.get_batch(), writer, latencies)
+    finally:
+        watcher.close()
+
+
+def read_baseline(folder, writer, latencies):
+    while writer.is_alive() or os.listdir(folder):
+        time.sleep(0.25)
+        read_batch(sorted(glob.glob(os.path.join(folder, "*.msgpack")), key=os.path.getmtime), writer, latencies)
+
+
+def read_batch(paths, writer, latencies):
+    for path in paths:
+        if decode(path):
+            now = time.perf_counter()
+            with writer.lock:
+                # Missing if the file was read between its last write and the writer noting the time.
+                write_time = writer.write_times.pop(os.path.basename(path), now)
+            latencies.append(now - write_time)
+
+
+def get_percentile(values, percentile):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the latency of picking up packets from the CarrotJuicer folder.")
+    parser.add_argument("paths", nargs="*", help="Training logs to take the packets from.")
+    parser.add_argument("--turns", type=int, default=100, help="Number of turns to write.")
+    parser.add_argument("--interval", type=float, default=800., help="Average milliseconds between turns.")
+    parser.add_argument("--poll", action="store_true", help="Use PacketWatcher's polling fallback.")
+    parser.add_argument("--baseline", action="store_true", help="Read the folder like before PacketWatcher.")
+    args = parser.parse_args()
+    replay.set_log_level("WARNING")
+
+    payloads = iter_payloads([os.path.join(replay.LAUNCH_DIR, path) for path in args.paths])
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = os.path.join(temp_dir, "CarrotJuicer")
+        os.makedirs(folder)
+        writer = PacketWriter(folder, payloads, args.turns, args.interval / 1000)
+        latencies = []
+
+        start_time = time.perf_counter()
+        start_cpu = time.thread_time()
+        writer.start()
+        if args.baseline:
+            read_baseline(folder, writer, latencies)
+        else:
+            read_with_watcher(folder, writer, latencies, args.poll)
+        cpu_seconds = time.thread_time() - start_cpu
+        seconds = time.perf_counter() - start_time
+
+    mode = "baseline polling" if args.baseline else "PacketWatcher, polling" if args.poll or sys.platform != "win32" else "PacketWatcher"
+    print(f"{mode}: {len(latencies)} packets in {seconds:.1f} s")
+    print(f"{'latency':<10} {'mean ms':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print(f"{'':<10} {statistics.mean(latencies) * 1000:>9.1f} " + " ".join(f"{get_percentile(latencies, percentile) * 1000:>9.1f}" for percentile in (50, 90, 99, 100)))
+    print(f"Reader CPU: {cpu_seconds * 1000:.0f} ms ({cpu_seconds / seconds * 100:.2f}% of one core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import socket
+import struct
+from loguru import logger
+import profiler
+
+# Every datagram starts with its message type. All types except MULTIPART_HEADER follow it
+# with a big-endian 16 bit payload length.
+DATA = 0
+KEY = 1
+IV = 2
+REQUEST = 3
+MULTIPART_HEADER = 4  # Followed by the number of chunks as a single byte.
+MULTIPART_CHUNK = 5
+
+MAX_DATAGRAM_SIZE = 65535
+
+CAPTURE_LENGTH = struct.Struct("<I")
+
+
+def write_capture(capture_file, datagram):
+    capture_file.write(CAPTURE_LENGTH.pack(len(datagram)))
+    capture_file.write(datagram)
+
+
+def read_capture(path):
+    """Yields the datagrams stored in a capture file."""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(CAPTURE_LENGTH.size)
+            if len(header) < CAPTURE_LENGTH.size:
+                return
+            yield f.read(CAPTURE_LENGTH.unpack(header)[0])
+
+
+class CarrotBlenderReceiver:
+    """Receives CarrotBlender datagrams into a reused buffer and reassembles them into messages.
+
+    A response is sent as its encrypted data (whole, or a multipart header followed by its chunks),
+    then the key, then the IV. The IV completes the response. The key is kept for later responses
+    in case its datagram is lost. Requests are sent unencrypted in a single datagram."""
+
+    RECEIVE_TIMEOUT = 0.5
+
+    def __init__(self, host, port, buffer_size, capture_path=None):
+        self.host = host
+        self.port = port
+        self.buffer_size = buffer_size
+        self.capture_path = capture_path
+        self.capture_file = None
+        self.sock = None
+
+        self.buffer = bytearray(MAX_DATAGRAM_SIZE)
+        self.buffer_view = memoryview(self.buffer)
+
+        self.key = None
+        self.data = None
+        # Multipart data being reassembled, and the number of chunks still missing from it.
+        self.assembly = None
+        self.chunks_left = 0
+
+    def open(self):
+        """Binds the socket. Raises OSError if the address is not available."""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer_size)
+        logger.info(f"Max buffer size: {self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)}")
+        self.sock.settimeout(self.RECEIVE_TIMEOUT)
+        self.sock.bind((self.host, self.port))
+        if self.capture_path:
+            self.capture_file = open(self.capture_path, "ab")
+            logger.info(f"Capturing CarrotBlender datagrams to {self.capture_path}")
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # Not connected, which is expected for UDP on some platforms.
+                pass
+            self.sock.close()
+            self.sock = None
+        if self.capture_file is not None:
+            self.capture_file.close()
+            self.capture_file = None
+
+    def receive(self):
+        """Waits up to RECEIVE_TIMEOUT for a datagram.
+        Returns ("response", encrypted data, key, IV) or ("request", msgpack data) when it completes a message, otherwise None."""
+        try:
+            size = self.sock.recv_into(self.buffer)
+        except socket.timeout:
+            return None
+        datagram = self.buffer_view[:size]
+        if self.capture_file is not None:
+            write_capture(self.capture_file, datagram)
+        logger.opt(lazy=True).trace("Received {} bytes: {}", lambda: size, lambda: datagram.hex())
+        return self.process_datagram(datagram)
+
+    def drop_assembly(self, reason):
+        if self.assembly is not None:
+            logger.warning(f"Dropping incomplete multipart response ({reason}): {self.chunks_left} chunk(s) missing")
+            profiler.count("carrotblender.dropped_chunks", self.chunks_left)
+            self.assembly = None
+            self.chunks_left = 0
+
+    def process_datagram(self, datagram):
+        if len(datagram) < 2:
+            logger.error(f"Invalid message (invalid length): {bytes(datagram).hex()}")
+            return None
+
+        msg_type = datagram[0]
+        if msg_type == MULTIPART_HEADER:
+            self.drop_assembly("new response started")
+            self.data = None
+            self.chunks_left = datagram[1]
+            self.assembly = bytearray()
+            logger.debug(f"Got multipart response header with {self.chunks_left} chunks")
+            return None
+
+        if len(datagram) < 3:
+            logger.error(f"Invalid message (invalid length): {bytes(datagram).hex()}")
+            return None
+        msg_len = (datagram[1] << 8) | datagram[2]
+        if len(datagram) < msg_len + 3:
+            logger.error(f"Invalid message (incomplete): expected {msg_len} bytes, got {len(datagram) - 3}")
+            return None
+        payload = datagram[3:msg_len + 3]
+
+        if msg_type == DATA:
+            self.drop_assembly("new response started")
+            self.data = bytearray(payload)
+        elif msg_type == MULTIPART_CHUNK:
+            if self.assembly is None:
+                logger.error("Got unexpected multipart message chunk!")
+                profiler.count("carrotblender.unexpected_chunks")
+                return None
+            self.assembly += payload
+            self.chunks_left -= 1
+            if self.chunks_left == 0:
+                self.data, self.assembly = self.assembly, None
+        elif msg_type == KEY:
+            self.key = bytes(payload)
+        elif msg_type == IV:
+            self.drop_assembly("IV arrived first")
+            if not self.data or self.key is None:
+                logger.warning("Ignoring message: data and/or key is not set!")
+                return None
+            data, self.data = self.data, None
+            return ("response", data, self.key, bytes(payload))
+        elif msg_type == REQUEST:
+            return ("request", bytes(payload))
+        else:
+            logger.error(f"Invalid message (invalid type): {msg_type}")
+        return None
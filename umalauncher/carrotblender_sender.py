@@ -0,0 +1,107 @@
+"""Sends CarrotBlender datagrams to a running Uma Launcher, for testing the global build without the game.
+
+Usage: python carrotblender_sender.py [--port 17229] [--drop-rate 0.1] <path> [<path> ...]
+
+A path is either a capture file (written while save_packets is enabled), whose datagrams are sent as they were,
+or a training log (.umalog or .gz) or a folder of save_packets dumps, whose packets are encrypted and split
+into datagrams the way CarrotBlender does it.
+--drop-rate randomly leaves out multipart chunks to test how lost datagrams are handled.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import random
+import socket
+import argparse
+import msgpack
+from Cryptodome.Cipher import AES
+import carrotblender
+
+# Room for the type and length bytes in front of each chunk.
+MAX_CHUNK_SIZE = carrotblender.MAX_DATAGRAM_SIZE - 3 - 28
+# The 4 byte header in front of the msgpack data.
+PACKET_HEADER = b"\x00\x00\x00\x00"
+
+
+def make_datagram(msg_type, payload):
+    return bytes((msg_type, len(payload) >> 8, len(payload) & 0xff)) + payload
+
+
+def encode_response(packet, key, chunk_size=MAX_CHUNK_SIZE):
+    iv = os.urandom(16)
+    plain = PACKET_HEADER + msgpack.packb(packet)
+    plain += b"\x00" * (-len(plain) % 16)
+    data = AES.new(key, AES.MODE_CBC, iv=iv).encrypt(plain)
+
+    if len(data) <= chunk_size:
+        datagrams = [make_datagram(carrotblender.DATA, data)]
+    else:
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        datagrams = [bytes((carrotblender.MULTIPART_HEADER, len(chunks)))]
+        datagrams += [make_datagram(carrotblender.MULTIPART_CHUNK, chunk) for chunk in chunks]
+    datagrams.append(make_datagram(carrotblender.KEY, key))
+    datagrams.append(make_datagram(carrotblender.IV, iv))
+    return datagrams
+
+
+def encode_request(packet):
+    return [make_datagram(carrotblender.REQUEST, PACKET_HEADER + msgpack.packb(packet))]
+
+
+def iter_datagrams(path, chunk_size):
+    if os.path.isfile(path) and path.endswith(".capture"):
+        yield from carrotblender.read_capture(path)
+        return
+
+    key = os.urandom(32)
+    if os.path.isdir(path):
+        for packet_path in sorted(glob.glob(os.path.join(path, "*_packet_*.json"))):
+            with open(packet_path, "r", encoding="utf-8") as f:
+                packet = json.load(f)
+            if packet_path.endswith("_packet_in.json"):
+                yield from encode_response(packet, key, chunk_size)
+            else:
+                yield from encode_request(packet)
+        return
+
+    import training_log
+    for packet in training_log.TrainingLogReader(path):
+        if packet.pop('_direction', 1) == 1:
+            # Training logs keep the response data without the envelope.
+            yield from encode_response({'data': packet}, key, chunk_size)
+        else:
+            yield from encode_request(packet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sends recorded packets to Uma Launcher the way CarrotBlender does.")
+    parser.add_argument("paths", nargs="+", help="Capture files, training logs or folders of save_packets dumps.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=17229)
+    parser.add_argument("--chunk-size", type=int, default=MAX_CHUNK_SIZE, help="Largest encrypted data sent in one datagram.")
+    parser.add_argument("--interval", type=float, default=0., help="Milliseconds to wait between datagrams.")
+    parser.add_argument("--drop-rate", type=float, default=0., help="Fraction of multipart chunks to leave out.")
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sent = 0
+    dropped = 0
+    for path in args.paths:
+        for datagram in iter_datagrams(path, args.chunk_size):
+            if datagram[0] == carrotblender.MULTIPART_CHUNK and random.random() < args.drop_rate:
+                dropped += 1
+                continue
+            sock.sendto(datagram, (args.host, args.port))
+            sent += 1
+            if args.interval:
+                time.sleep(args.interval / 1000)
+    print(f"Sent {sent} datagrams, dropped {dropped} chunks.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main()
@@ -1,16 +1,16 @@
 import io
 import os
 import time
-import glob
 import traceback
 import math
 import json
+import queue
+import threading
 from datetime import datetime
 from inspect import trace
 from time import sleep
 
 import msgpack
-import select
 from loguru import logger
 from msgpack import Unpacker
 from selenium.common.exceptions import NoSuchWindowException
@@ -21,16 +21,22 @@ import mdb
 import helper_table
 import training_tracker
 import horsium
-import socket
+import packetwatcher
+import carrotblender
+import image_cache
+import overlay_channel
+import profiler
 
 from Cryptodome.Cipher import AES
 
-def unpack(data: bytes, key: bytes, iv: bytes) -> bytes:
-    logger.debug(f"Unpacking:\nData: {data.hex()}\nKey: {key.hex()}\nIV: {iv.hex()}")
+def unpack(data: bytearray, key: bytes, iv: bytes) -> bytes:
+    """Decrypts data in place and unpacks the msgpack inside."""
+    logger.opt(lazy=True).trace("Unpacking:\nData: {}\nKey: {}\nIV: {}", data.hex, key.hex, iv.hex)
     cipher = AES.new(key, AES.MODE_CBC, iv=iv)
-    decrypted = cipher.decrypt(data)
-    decrypted = decrypted[4:]
-    b = io.BytesIO(decrypted)
+    cipher.decrypt(data, output=data)
+    b = io.BytesIO(data)
+    # First 4 bytes are a header
+    b.seek(4)
     unpacker = Unpacker(file_like=b)
     return unpacker.unpack()
 
@@ -58,21 +64,36 @@ class CarrotJuicer:
     skill_browser = None
     last_skills_rect = None
     skipped_msgpacks = []
-
-    sock: socket = None
-    MAX_BUFFER_SIZE = 65535
-
-    key = None
-    iv = None
-    encrypted_data = None
+    # Msgpacks that are decoded and waiting to be handled. They are deleted once they are handled.
+    queued_msgpacks = None
+    # (size, mtime, time first seen like that) of each msgpack that could not be decoded.
+    # A file can be read while the game is still writing it.
+    decode_failures = None
+    # A file that still cannot be decoded after being unchanged for this long is broken.
+    DECODE_SETTLE_TIME = 2.
+    # Set by the decoder thread when it stops on an error, raised again by the handler loop.
+    decoder_error = None
+
+    receiver: carrotblender.CarrotBlenderReceiver = None
+
+    PACKET_QUEUE_SIZE = 32
+    packet_queue = None
+    pending_helper_data = None
+    helper_table_condition = None
+    # Whether the last overlay went to the event stream. Only used by the browser thread.
+    overlay_streamed = False
 
     def __init__(self, threader):
         self.threader = threader
 
         self.start_time = 0
 
+        self.packet_queue = queue.Queue(maxsize=self.PACKET_QUEUE_SIZE)
+        self.queued_msgpacks = set()
+        self.decode_failures = {}
+        self.helper_table_condition = threading.Condition()
+
         self.skill_id_dict = mdb.get_skill_id_dict()
-        self.status_name_dict = mdb.get_status_name_dict()
 
         self.screen_state_handler = threader.screenstate
         self.restart_time()
@@ -217,6 +238,7 @@ class CarrotJuicer:
 
     def end_training(self):
         if self.training_tracker:
+            self.training_tracker.close()
             self.training_tracker = None
         if self.skill_browser and self.skill_browser.alive():
             self.skill_browser.close()
@@ -395,7 +417,10 @@ class CarrotJuicer:
                 if not self.training_tracker or not self.training_tracker.training_id_matches(training_id):
                     # Update cached dicts first
                     mdb.update_mdb_cache()
+                    image_cache.prefetch_deck_icons(data['chara_info'])
 
+                    if self.training_tracker:
+                        self.training_tracker.close()
                     self.training_tracker = training_tracker.TrainingTracker(training_id, data['chara_info']['card_id'])
 
                 self.skills_list = []
@@ -554,6 +579,8 @@ class CarrotJuicer:
                     # Check to see if you already have the status.
                     status_ids = data['chara_info']['chara_effect_id_array']
                     if status_ids:
+                        # Looked up every time, the master data is replaced after a game update.
+                        status_name_dict = mdb.get_status_name_dict()
                         self.browser.execute_script("""
                         if(arguments[0])
                         {
@@ -564,7 +591,7 @@ class CarrotJuicer:
                                     }
                                 });
                         } 
-                        """, event_element, [self.status_name_dict[i] for i in status_ids if i in self.status_name_dict])
+                        """, event_element, [status_name_dict[i] for i in status_ids if i in status_name_dict])
 
             if 'chara_info' not in data and self.last_helper_data:
                 if 'IS_UL_GLOBAL' in os.environ:
@@ -595,8 +622,9 @@ class CarrotJuicer:
         return
 
     def handle_request(self, message, is_json=False):
-        data = self.load_request(message, is_json=is_json)
+        self.handle_request_data(self.load_request(message, is_json=is_json))
 
+    def handle_request_data(self, data):
         if not data:
             return
 
@@ -673,7 +701,7 @@ class CarrotJuicer:
 
 
     def process_message(self, message: str):
-        if message in self.skipped_msgpacks:
+        if message in self.skipped_msgpacks or message in self.queued_msgpacks:
             return
 
         try:
@@ -687,31 +715,148 @@ class CarrotJuicer:
 
         # logger.info(f"New Packet: {os.path.basename(message)}")
 
-        if message.endswith("R.msgpack"):
-            # Response
-            self.handle_response(message)
+        start_time = time.perf_counter()
+        try:
+            if message.endswith("R.msgpack"):
+                # Response
+                packet = ("response", self.load_response(message), message)
+            else:
+                # Request
+                packet = ("request", self.load_request(message), message)
+        except Exception as e:
+            self.handle_decode_failure(message, e)
+            return
+        self.decode_failures.pop(message, None)
 
-        else:
-            # Request
-            self.handle_request(message)
+        self.log_stage_timing("decode", start_time)
+        self.queued_msgpacks.add(message)
+        self.queue_packet(packet)
+        return
 
+
+    def handle_decode_failure(self, message, error):
+        """Leaves the file to be read again the next time the folder changes, unless the game has stopped writing it."""
+        try:
+            stat = os.stat(message)
+        except OSError:
+            self.decode_failures.pop(message, None)
+            return
+        file_state = (stat.st_size, stat.st_mtime_ns)
+        previous = self.decode_failures.get(message)
+        if previous is None or previous[:2] != file_state:
+            self.decode_failures[message] = (*file_state, time.monotonic())
+            logger.warning(f"Could not decode {message}, trying again later: {error}")
+            return
+        if time.monotonic() - previous[2] < self.DECODE_SETTLE_TIME:
+            return
+        logger.error(f"Deleting {message}, it could not be decoded: {error}\n{traceback.format_exc()}")
+        del self.decode_failures[message]
         self.remove_message(message)
-        return
 
 
-    def get_msgpack_batch(self, msg_path):
-        return sorted(glob.glob(os.path.join(msg_path, "*.msgpack")), key=os.path.getmtime)
+    def log_stage_timing(self, stage, start_time):
+        elapsed = time.perf_counter() - start_time
+        profiler.record(f"carrotjuicer.{stage.replace(' ', '_')}", elapsed)
+        logger.debug(f"Pipeline {stage}: {elapsed * 1000:.1f} ms, packet queue: {self.packet_queue.qsize()}")
+
+
+    def queue_packet(self, packet):
+        """Hands a decoded packet to the handler stage. Blocks while the queue is full."""
+        while not self.should_stop:
+            try:
+                self.packet_queue.put(packet, timeout=0.25)
+                return
+            except queue.Full:
+                continue
+
+
+    def handle_packet(self, packet):
+        packet_type, data, message = packet
+        start_time = time.perf_counter()
+        try:
+            if packet_type == "response":
+                self.handle_response(data, is_json=True)
+            else:
+                self.handle_request_data(data)
+        finally:
+            if message:
+                # Removed from the queued set only after the file is gone, so it is not decoded again.
+                self.remove_message(message)
+                self.queued_msgpacks.discard(message)
+        self.log_stage_timing(f"handle {packet_type}", start_time)
 
 
     def update_helper_table(self, data):
-        helper_table = self.helper_table.create_helper_elements(data, self.last_helper_data)
+        self.helper_table.carry_over_data(data, self.last_helper_data)
         self.last_helper_data = data
-        if helper_table:
-            self.browser.execute_script("""
-                window.UL_DATA.overlay_html = arguments[0];
-                window.update_overlay();
+
+        # Only the latest state matters. Replace anything the browser stage has not picked up yet.
+        # The browser stage gets its own copy: this thread keeps changing the top level of last_helper_data.
+        with self.helper_table_condition:
+            if self.pending_helper_data is not None:
+                logger.debug("Pipeline browser: dropping outdated helper table update")
+                profiler.count("carrotjuicer.helper_table_updates_dropped")
+            self.pending_helper_data = dict(data)
+            self.helper_table_condition.notify()
+
+
+    def run_browser_updater(self):
+        while not self.should_stop:
+            with self.helper_table_condition:
+                if self.pending_helper_data is None:
+                    self.helper_table_condition.wait(timeout=0.25)
+                data = self.pending_helper_data
+                self.pending_helper_data = None
+
+            if data is None:
+                continue
+
+            # The handler thread sets self.browser to None when it closes the browser.
+            browser = self.browser
+            try:
+                start_time = time.perf_counter()
+                helper_table = self.helper_table.create_helper_elements(data, None)
+                if helper_table and browser:
+                    update, partial_update = helper_table
+                    # The helper page receives the overlay from umaserver's event stream.
+                    # WebDriver is only used while the page is not subscribed.
+                    overlay_channel.OVERLAY_CHANNEL.publish(update, partial_update)
+                    if overlay_channel.OVERLAY_CHANNEL.has_subscribers():
+                        profiler.count("carrotjuicer.overlay_pushed")
+                        self.overlay_streamed = True
+                    else:
+                        profiler.count("carrotjuicer.overlay_execute_script")
+                        if self.overlay_streamed:
+                            # A subscriber is only removed once writing to it fails, so the page
+                            # may have missed the last overlays. A patch could leave rows stale.
+                            self.overlay_streamed = False
+                            partial_update = None
+                        self.send_overlay_with_script(browser, update, partial_update)
+                self.log_stage_timing("browser", start_time)
+            except NoSuchWindowException:
+                pass
+            except Exception:
+                if browser is not None and browser is not self.browser:
+                    logger.debug(f"Browser was closed while the helper table was sent: {traceback.format_exc()}")
+                    continue
+                logger.error("ERROR IN UPDATING HELPER TABLE")
+                logger.error(traceback.format_exc())
+                util.show_error_box("Uma Launcher: Error in helper table.", f"This should not happen. You may contact the developer about this issue.")
+
+
+    def send_overlay_with_script(self, browser, update, partial_update):
+        # Only replace what changed. Falls back to the whole update if the page does not have the patched elements.
+        patched = False
+        if partial_update is not None:
+            patched = browser.execute_script("""
+                return window.apply_partial_update ? window.apply_partial_update(arguments[0]) : false;
+                """,
+                partial_update)
+        if not patched:
+            browser.execute_script("""
+                window.apply_update(arguments[0]);
                 """,
-                helper_table)
+                update)
 
 
     def update_skill_window(self):
@@ -805,10 +950,78 @@ class CarrotJuicer:
         try:
             self.run()
         except Exception:
+            if self.training_tracker:
+                self.training_tracker.close()
             util.show_error_box("Critical Error", "Uma Launcher has encountered a critical error and will now close.")
             self.threader.stop()
 
+    def is_enabled(self):
+        return self.threader.settings["enable_carrotjuicer"] and self.threader.settings['enable_browser']
+
+    def run_decoder(self, base_path):
+        """Decode stage: reads packets from the CarrotJuicer folder or the CarrotBlender socket."""
+        watcher = None
+        if 'IS_UL_GLOBAL' not in os.environ:
+            watcher = packetwatcher.PacketWatcher(os.path.join(base_path, "CarrotJuicer"))
+
+        try:
+            while not self.should_stop:
+                if not self.is_enabled():
+                    time.sleep(0.25)
+                    continue
+
+                if watcher:
+                    if watcher.wait():
+                        for message in watcher.get_batch():
+                            if self.should_stop:
+                                break
+                            self.process_message(message)
+                    continue
+
+                if not self.receiver:
+                    time.sleep(0.25)
+                    continue
+
+                try:
+                    message = self.receiver.receive()
+                except OSError as e:
+                    if self.should_stop:
+                        break
+                    logger.error(f"Socket interrupted: {e}\n{traceback.format_exc()}")
+                    continue
+                if message:
+                    self.process_blender_message(message)
+        except Exception as e:
+            logger.error(f"Packet decoder stopped: {e}\n{traceback.format_exc()}")
+            self.decoder_error = e
+        finally:
+            if watcher:
+                watcher.close()
+
+    def process_blender_message(self, message):
+        start_time = time.perf_counter()
+        if message[0] == "request":
+            unpacked = self.load_request(message[1], is_json=True)
+            logger.debug(f"Unpacked request: {unpacked}")
+            self.log_stage_timing("decode", start_time)
+            self.queue_packet(("request", unpacked, None))
+            return
+
+        _, data, key, iv = message
+        try:
+            unpacked = unpack(data, key, iv)
+        except Exception as e:
+            logger.error(f"Error decoding message: {e}")
+            logger.error(traceback.format_exc())
+            return
+        logger.debug("Unpacked message:")
+        logger.debug(unpacked)
+        self.log_stage_timing("decode", start_time)
+        self.queue_packet(("response", unpacked, None))
+
     def run(self):
+        decoder_thread = None
+        browser_thread = None
         try:
             base_path = None
             if 'IS_UL_GLOBAL' not in os.environ:
@@ -822,30 +1035,45 @@ class CarrotJuicer:
             if 'IS_UL_GLOBAL' in os.environ:
                 port = self.threader.settings["carrotblender_port"]
                 ip_address = self.threader.settings["carrotblender_host"]
+                capture_path = None
+                if self.threader.settings["save_packets"]:
+                    capture_path = util.get_relative(str(datetime.now()).replace(":", "-") + "_carrotblender.capture")
+                self.receiver = carrotblender.CarrotBlenderReceiver(ip_address, port, self.threader.settings["carrotblender_max_buffer_size"], capture_path)
                 try:
-                    self.sock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
-                    self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.threader.settings["carrotblender_max_buffer_size"])
-                    logger.info(f"Max buffer size: {self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)}" )
-                    self.sock.bind( (ip_address, port) )
-                except socket.error as message:
+                    self.receiver.open()
+                except OSError:
+                    self.receiver.close()
+                    self.receiver = None
                     util.show_warning_box("Uma Launcher: Error initializing CarrotJuicer.",
                                         f"Could not bind to {ip_address}:{port}")
 
-            chunks_left = 0
+            # Decoding and browser updates run in their own threads so a slow WebDriver call
+            # does not hold up the next packet. This thread handles the packets.
+            decoder_thread = threading.Thread(target=self.run_decoder, args=(base_path,), daemon=True)
+            browser_thread = threading.Thread(target=self.run_browser_updater, daemon=True)
+            decoder_thread.start()
+            browser_thread.start()
+
             while not self.should_stop:
 
-                msg_path = None
-                if 'IS_UL_GLOBAL' not in os.environ:
-                    time.sleep(0.25)
-                    msg_path = os.path.join(base_path, "CarrotJuicer")
+                if self.decoder_error is not None:
+                    raise RuntimeError("Packet decoder stopped") from self.decoder_error
 
-                if not self.threader.settings["enable_carrotjuicer"] or not self.threader.settings['enable_browser']:
+                if not self.is_enabled():
                     if self.browser and self.browser.alive():
                         self.browser.quit()
                     if self.skill_browser and self.skill_browser.alive():
                         self.skill_browser.quit()
+                    # Packets already decoded stay queued until the juicer is enabled again.
+                    time.sleep(0.25)
                     continue
 
+                packet = None
+                try:
+                    packet = self.packet_queue.get(timeout=0.25)
+                except queue.Empty:
+                    pass
+
                 if self.browser and self.browser.alive():
                     if self.reset_browser:
                         self.browser.set_window_rect(self.get_browser_reset_position())
@@ -882,91 +1110,32 @@ class CarrotJuicer:
                         logger.error(traceback.format_exc())
                         pass
 
-                if 'IS_UL_GLOBAL' not in os.environ:
-                    messages = self.get_msgpack_batch(msg_path)
-                    for message in messages:
-                        self.process_message(message)
-                else:
+                # Handle everything that was decoded in the meantime before checking the browser again.
+                while packet:
+                    self.handle_packet(packet)
+                    if self.should_stop:
+                        break
                     try:
-                        ready = select.select([self.sock], [], [], 0.5)
-                        if ready[0]:
-                            message = self.sock.recv(self.MAX_BUFFER_SIZE)
-                            logger.debug(f"Received {len(message)} bytes of data")
-                        else:
-                            # No data available, keep waiting
-                            # TODO: is there a better way to do this than busy waiting?
-                            continue
-                    except Exception as e:
-                        #TODO: kill the socket in a "good" way that doesn't throw an exception here
-                        logger.error(f"Socket interrupted: {e}\n{traceback.format_exc()}")
-                        continue
-                    if message == b'':
-                        # Shouldn't happen
-                        logger.error(f"Socket read no data!")
-                        continue
-                    if len(message) < 2:
-                        logger.error( f"Invalid message (invalid length): {message.hex()}")
-                        continue
-                    msg_type = message[0]
-                    msg_len = 0
-                    if msg_type != 4:
-                        msg_len = message[1] * 256 + message[2]
-                        if len(message) < msg_len:
-                            logger.error( f"Invalid message (incomplete): {message.hex()}")
-                            continue
-                        message = message[3:msg_len+3]
-
-                    if msg_type == 0:# Data (full)
-                        logger.debug(f"Processing data: {message.hex()}")
-                        self.encrypted_data = message
-                    elif msg_type == 1: # Key
-                        logger.debug(f"Processing key: {message.hex()}")
-                        self.key = message
-                    elif msg_type == 2: # IV
-                        logger.debug(f"Processing IV: {message.hex()}")
-                        self.iv = message
-
-                        # TODO: check chunks_left to see if we dropped one or more
-                        if self.key is not None and self.iv is not None and self.encrypted_data is not None and self.encrypted_data != b'':
-                            try:
-                                unpacked = unpack(self.encrypted_data, self.key, self.iv)
-                                logger.debug("Unpacked message:")
-                                logger.debug(unpacked)
-                                self.handle_response(unpacked, is_json=True)
-                                # TODO: we could probably keep the key as it shouldn't change
-                                self.key = None
-                                self.iv = None
-                                self.encrypted_data = None
-                            except Exception as e:
-                                logger.error(f"Error decoding and handling message: {e}")
-                                logger.error(traceback.format_exc())
-                                self.key = None
-                                self.iv = None
-                                self.encrypted_data = None
-                        else:
-                            logger.warning( f"Ignoring message: data, key and/or IV is not set!")
-                    elif msg_type == 3: # Request (unencrypted msgpack)
-                        logger.debug(f"Processing request: {message.hex()}")
-                        logger.debug(f"Unpacked request: {msgpack.unpackb(message[4:])}")
-                        self.handle_request( message, is_json=True)
-                    elif msg_type == 4: # Data (multipart header)
-                        chunks_left = message[1]
-                        self.encrypted_data = b''
-                        logger.debug(f"Got multipart response header with {chunks_left} chunks")
-                    elif msg_type == 5: # Data (multipart chunk)
-                        if chunks_left < 1:
-                            logger.error( "Got unexpected multipart message chunk!")
-                            continue
-                        chunks_left -= 1
-                        logger.debug(f"Got chunk of size {msg_len}: {message.hex()}")
-                        self.encrypted_data += message
-                    else:
-                        logger.error( f"Invalid message (invalid type): {message.hex()}")
-                        continue
+                        packet = self.packet_queue.get_nowait()
+                    except queue.Empty:
+                        packet = None
 
         except NoSuchWindowException:
             pass
 
+        self.should_stop = True
+        for thread in (decoder_thread, browser_thread):
+            if thread:
+                thread.join()
+
+        # Packets that were decoded but not handled yet still belong in the training log.
+        while True:
+            try:
+                packet = self.packet_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_packet(packet)
+
         if self.browser:
             logger.debug("Closing browser.")
             self.browser.quit()
@@ -975,6 +1144,9 @@ class CarrotJuicer:
             logger.debug("Closing skill browser.")
             self.skill_browser.quit()
 
+        if self.training_tracker:
+            self.training_tracker.close()
+
         self.save_last_browser_rect()
         self.save_skill_window_rect()
 
@@ -983,10 +1155,9 @@ class CarrotJuicer:
 
     def stop(self):
         self.should_stop = True
-        if self.sock is not None:
+        if self.receiver is not None:
             logger.info("Stopping CarrotBlender socket")
-            self.sock.shutdown(socket.SHUT_RDWR)
-            self.sock.close()
+            self.receiver.close()
 
 
 
@@ -1098,7 +1269,8 @@ def setup_helper_page(browser: horsium.BrowserWindow):
         energy: 100,
         max_energy: 100,
         table: "",
-        expanded: true
+        expanded: true,
+        seq: 0
     };
 
     document.body.prepend(window.UL_OVERLAY);
@@ -1118,6 +1290,114 @@ def setup_helper_page(browser: horsium.BrowserWindow):
         }
     };
 
+    window.patch_overlay = function(patch) {
+        // Replaces single sections/rows by id. Returns false if the overlay needs a full update instead.
+        if (window.UL_OVERLAY.ul_data.childElementCount == 0) {
+            return false;
+        }
+        var elements = [];
+        for (const id in patch) {
+            var element = document.getElementById(id);
+            if (!element) {
+                return false;
+            }
+            elements.push([element, patch[id]]);
+        }
+        if (elements.length == 0) {
+            return true;
+        }
+        elements.forEach(([element, html]) => { element.outerHTML = html; });
+
+        if (window.UL_DATA.expanded) {
+            window.expand_overlay();
+        }
+        return true;
+    };
+
+    // Building the overlay from the model sent with overlay_browser_rendering. Gives the same HTML as Preset.generate_overlay.
+    window.render_row = function(row_id, tr_attributes, cells) {
+        var looks = window.UL_DATA.looks;
+        var html = '<tr id="' + row_id + '"' + tr_attributes + '>';
+        for (const [look, value] of cells) {
+            html += looks[look][0] + value + looks[look][1];
+        }
+        return html + '</tr>';
+    };
+
+    window.render_table = function(table) {
+        if (!table) {
+            return "";
+        }
+        var rows = table.rows.map(([row_id, tr_attributes, cells]) => window.render_row(row_id, tr_attributes, cells));
+        return '<table id="training-table"><thead>' + table.header + '</thead><tbody>' + rows.join("") + '</tbody></table>';
+    };
+
+    window.wrap_section = function(section_id, html) {
+        return '<div id="ul-section-' + section_id + '" style="display: contents;">' + html + '</div>';
+    };
+
+    window.render_model = function(model) {
+        window.UL_DATA.looks = model.looks;
+        var html = "";
+        for (const [section_id, section_html] of model.sections) {
+            html += window.wrap_section(section_id, section_html === null ? window.render_table(model.table) : section_html);
+        }
+        window.UL_DATA.overlay_html = html;
+        window.update_overlay();
+    };
+
+    window.apply_delta = function(delta) {
+        if (!window.UL_DATA.looks) {
+            return false;
+        }
+        for (const index in delta.looks) {
+            window.UL_DATA.looks[index] = delta.looks[index];
+        }
+        var patch = {};
+        for (const section_id in delta.sections) {
+            patch["ul-section-" + section_id] = window.wrap_section(section_id, delta.sections[section_id]);
+        }
+        for (const row_id in delta.rows) {
+            patch[row_id] = window.render_row(row_id, delta.rows[row_id][0], delta.rows[row_id][1]);
+        }
+        return window.patch_overlay(patch);
+    };
+
+    window.apply_update = function(update) {
+        if ("model" in update) {
+            window.render_model(update.model);
+        } else {
+            window.UL_DATA.overlay_html = update.html;
+            window.update_overlay();
+        }
+    };
+
+    window.apply_partial_update = function(partial_update) {
+        return "delta" in partial_update ? window.apply_delta(partial_update.delta) : window.patch_overlay(partial_update.patch);
+    };
+
+    // Overlay updates pushed by Uma Launcher.
+    window.connect_overlay_events = function() {
+        if (window.UL_EVENTS) {
+            window.UL_EVENTS.close();
+        }
+        window.UL_EVENTS = new EventSource('http://127.0.0.1:3150/overlay-events');
+        window.UL_EVENTS.addEventListener("overlay", function(event) {
+            var message = JSON.parse(event.data);
+            if ("patch" in message || "delta" in message) {
+                if (message.seq != window.UL_DATA.seq + 1 || !window.apply_partial_update(message)) {
+                    // Missed an update or the overlay changed under us. Ask for all of it.
+                    fetch('http://127.0.0.1:3150/overlay-resync', { method: 'POST' });
+                    return;
+                }
+            } else {
+                window.apply_update(message);
+            }
+            window.UL_DATA.seq = message.seq;
+        });
+    }
+    window.connect_overlay_events();
+
     // Skill window.
     window.await_skill_window_timeout = null;
     window.await_skill_window = function() {
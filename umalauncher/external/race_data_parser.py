@@ -2,6 +2,9 @@ import base64
 import gzip
 import struct
 import sys
+from collections import namedtuple
+from functools import cached_property
+import numpy as np
 import util
 sys.path.append(util.get_asset('external'))
 
@@ -100,6 +103,127 @@ def deserialize(b: bytearray) -> race_data_pb2.RaceSimulateData:
 def parse(race_scenario):
     return deserialize(gzip.decompress(base64.b64decode(race_scenario)))
 
+
+HORSE_FRAME_FIELDS = [
+    ('distance', '<f4', 0),
+    ('lane_position', '<u2', 4),
+    ('speed', '<u2', 6),
+    ('hp', '<u2', 8),
+    ('temptation_mode', 'i1', 10),
+    ('block_front_horse_index', 'i1', 11),
+]
+
+HORSE_RESULT_FIELDS = [
+    ('finish_order', '<i4', 0),
+    ('finish_time', '<f4', 4),
+    ('finish_diff_time', '<f4', 8),
+    ('start_delay_time', '<f4', 12),
+    ('guts_order', 'u1', 16),
+    ('wiz_order', 'u1', 17),
+    ('last_spurt_start_distance', '<f4', 18),
+    ('running_style', 'u1', 22),
+    ('defeat', '<i4', 23),
+    ('finish_time_raw', '<f4', 27),
+]
+
+Event = namedtuple('Event', ['frame_time', 'type', 'params'])
+
+
+def make_dtype(fields, itemsize):
+    return np.dtype({
+        'names': [field[0] for field in fields],
+        'formats': [field[1] for field in fields],
+        'offsets': [field[2] for field in fields],
+        'itemsize': itemsize,
+    })
+
+
+class RaceData():
+    """Reads a race replay without decoding it up front.
+    Frames and results are NumPy views on the replay bytes; events are parsed when first used.
+    Use to_protobuf() when the full RaceSimulateData is needed."""
+
+    def __init__(self, b: bytes):
+        self.buffer = memoryview(b)
+        self.max_length, self.version = struct.unpack_from('<ii', self.buffer, 0)
+        offset = 4 + self.max_length
+
+        (self.distance_diff_max, self.horse_num, self.horse_frame_size,
+         self.horse_result_size) = struct.unpack_from('<fiii', self.buffer, offset)
+        offset += 16
+
+        padding_size = struct.unpack_from('<i', self.buffer, offset)[0]
+        offset += 4 + padding_size
+
+        self.frame_count, self.frame_size = struct.unpack_from('<ii', self.buffer, offset)
+        offset += 8
+        self.frames_offset = offset
+        self.frames_end = offset + self.frame_count * self.frame_size
+
+        if 4 + self.horse_num * self.horse_frame_size > self.frame_size:
+            raise ValueError("Race frames are smaller than their horse data.")
+
+    @cached_property
+    def frames(self):
+        """Structured array of shape (frame_count,) with 'time' and 'horse_frame' (frame_count, horse_num) fields."""
+        horse_frame_dtype = make_dtype(HORSE_FRAME_FIELDS, self.horse_frame_size)
+        frame_dtype = np.dtype({
+            'names': ['time', 'horse_frame'],
+            'formats': ['<f4', (horse_frame_dtype, (self.horse_num,))],
+            'offsets': [0, 4],
+            'itemsize': self.frame_size,
+        })
+        return np.frombuffer(self.buffer, dtype=frame_dtype, count=self.frame_count, offset=self.frames_offset)
+
+    @property
+    def frame_times(self):
+        return self.frames['time']
+
+    @property
+    def horse_frames(self):
+        return self.frames['horse_frame']
+
+    @cached_property
+    def results_offset(self):
+        padding_size = struct.unpack_from('<i', self.buffer, self.frames_end)[0]
+        return self.frames_end + 4 + padding_size
+
+    @cached_property
+    def horse_results(self):
+        """Structured array with one result per horse, in gate order."""
+        return np.frombuffer(self.buffer, dtype=make_dtype(HORSE_RESULT_FIELDS, self.horse_result_size),
+                             count=self.horse_num, offset=self.results_offset)
+
+    @cached_property
+    def events(self):
+        offset = self.results_offset + self.horse_num * self.horse_result_size
+        padding_size = struct.unpack_from('<i', self.buffer, offset)[0]
+        offset += 4 + padding_size
+
+        event_count = struct.unpack_from('<i', self.buffer, offset)[0]
+        offset += 4
+
+        events = []
+        for _ in range(event_count):
+            event_size = struct.unpack_from('<h', self.buffer, offset)[0]
+            offset += 2
+            frame_time, event_type, param_count = struct.unpack_from('<fbb', self.buffer, offset)
+            params = struct.unpack_from(f'<{param_count}i', self.buffer, offset + 6)
+            events.append(Event(frame_time, event_type, params))
+            offset += event_size
+        return events
+
+    def get_finish_order(self, horse_index):
+        """Returns the 0-based finishing position of the horse at horse_index."""
+        return int(self.horse_results['finish_order'][horse_index])
+
+    def to_protobuf(self) -> race_data_pb2.RaceSimulateData:
+        return deserialize(self.buffer)
+
+
+def parse_lazy(race_scenario):
+    return RaceData(gzip.decompress(base64.b64decode(race_scenario)))
+
 def main():
     b = input('Please paste content of field "race_scenario" here: ').strip('"')
     b = gzip.decompress(base64.b64decode(b))
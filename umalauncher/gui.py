@@ -1303,6 +1303,13 @@ class UmaBorderlessPopup(UmaMainWidget):
         if len(self.check_target) > 0:
             self.timer.stop()
             self.close()
+            return
+
+        # Objects that report progress can change the message while the popup is open.
+        message = getattr(self.update_object, 'progress_message', None)
+        if message and message != self.label.text():
+            self.label.setText(message)
+            self.adjustSize()
 
 
 class UmaUpdatePopup(UmaMainWidget):
@@ -1,138 +1,172 @@
 import copy
-import os
 
+import numpy as np
 from loguru import logger
 import mdb
 import util
+import image_cache
 import constants
+import profiler
 from helper_table_defaults import RowTypes
 
 
-class TrainingPartner():
-    def __init__(self, partner_id, starting_bond, chara_info):
-        self.partner_id = partner_id
-        self.starting_bond = starting_bond
-        self.chara_info = chara_info
-        self.chara_id = None
+def get_partner_table_key(chara_info):
+    """Returns everything a PartnerTable is built from."""
+    return (
+        chara_info['scenario_id'],
+        tuple(support_card['support_card_id'] for support_card in chara_info['support_card_array']),
+        tuple(eval_data['training_partner_id'] for eval_data in chara_info['evaluation_info_array']),
+    )
+
+
+def get_usefulness_cutoff(partner_id, support_id, support_card_type, scenario_id):
+    """Returns the bond up to which gains are useful. 0 if bond with this partner is never useful."""
+    # Ignore group and friend type cards except Satake Mei in Project L'Arc
+    if partner_id <= 6:
+        if support_id in (10094, 30160) and scenario_id in (6,):  # Only count Mei in Project L'Arc
+            return 60
+        if support_id in (10104, 30188) and scenario_id in (7,):  # Only count Ryoka in UAF
+            return 60
+        if support_card_type in ("group", "friend"):
+            return 0
+        return 80
+
+    if partner_id <= 1000:
+        if partner_id in (102,) and not scenario_id in (1, 6, 4):  # Disable Akikawa usefulness in certain scenarios
+            return 60
+        # Skip all non-Umas except Akikawa
+        return 0
+
+    return 80
+
+
+class PartnerTable():
+    """The training partners of a run, as arrays indexed by partner slot.
+    Everything that depends on the deck is looked up once. update() sets the current bonds
+    and computes the bond gains of all partners at once."""
+
+    def __init__(self, chara_info):
+        self.key = get_partner_table_key(chara_info)
+        scenario_id = chara_info['scenario_id']
+
+        self.slots = {}
+        self.partner_ids = []
+        self.imgs = []
+        self.support_ids = []
+        self.support_card_types = []
+        for eval_data in chara_info['evaluation_info_array']:
+            partner_id = eval_data['training_partner_id']
+            try:
+                support_id, support_card_type, img = self.get_partner_data(partner_id, chara_info)
+            except Exception as e:
+                logger.error(f"Error while creating training partner: {e}")
+                continue
+            self.slots[partner_id] = len(self.partner_ids)
+            self.partner_ids.append(partner_id)
+            self.imgs.append(img)
+            self.support_ids.append(support_id)
+            self.support_card_types.append(support_card_type)
 
-        if partner_id < 100:
+        partner_ids = np.array(self.partner_ids, dtype=np.int32)
+        is_support_card = partner_ids <= 6
+        is_group_or_friend = np.array([support_card_type in ("group", "friend") for support_card_type in self.support_card_types], dtype=bool)
+
+        # Akikawa is 102
+        self.training_bond = np.where(partner_ids < 1000, np.where(is_support_card & is_group_or_friend, 4, 7), 0)
+        self.hint_extra_bond = np.where(is_support_card, 5, 0)
+        self.charming_partner = is_support_card
+        self.rising_star_partner = partner_ids == 102
+        self.usefulness_cutoff = np.array([
+            get_usefulness_cutoff(partner_id, support_id, support_card_type, scenario_id)
+            for partner_id, support_id, support_card_type in zip(self.partner_ids, self.support_ids, self.support_card_types)
+        ], dtype=np.int32)
+
+        self.starting_bond = np.zeros(len(self.partner_ids), dtype=np.int32)
+        self.bond = self.useful_bond = self.hint_bond = self.hint_useful_bond = self.starting_bond
+
+    def get_partner_data(self, partner_id, chara_info):
+        """Returns (support_id, support_card_type, img) of a partner. Both support values are None if the partner is not a support card."""
+        if partner_id <= 6:
             support_id = chara_info['support_card_array'][partner_id - 1]['support_card_id']
             support_card_dict = mdb.get_support_card_dict()
-            found_support = False
             if support_id not in support_card_dict:
                 logger.warning(f"Could not find support_id {support_id}, attempting to force an update")
                 support_card_dict = mdb.get_support_card_dict(force=True)
                 if support_id not in support_card_dict:
-                    logger.error(f"Could not find support_id {support_id} after forced update")
-                    self.img = "https://umapyoi.net/missing_chara.png"
-                else:
-                    logger.info(f"Successfully found support_id {support_id}")
-                    found_support = True
-            else:
-                found_support = True
-            if found_support:
-                support_data = support_card_dict[support_id]
-                chara_id = support_data[3]
-                self.chara_id = chara_id
-                self.img = f"https://gametora.com/images/umamusume/characters/icons/chr_icon_{chara_id}.png"
-        elif partner_id > 1000:
-            self.chara_id = partner_id
-            self.img = f"https://gametora.com/images/umamusume/characters/icons/chr_icon_{partner_id}.png"
-        else:
-            try:
-                chara_id = mdb.get_single_mode_unique_chara_dict()[chara_info['scenario_id']][partner_id]
-                self.chara_id = chara_id
-                self.img = f"https://gametora.com/images/umamusume/characters/icons/chr_icon_{chara_id}.png"
-            except KeyError:
-                self.img = "https://umapyoi.net/missing_chara.png"
-                logger.error(f"Could not find unique chara_id for partner_id {partner_id} in scenario {chara_info['scenario_id']}")
-        
-        # Precalc-bonds
-        bond, useful_bond, hint_bond, hint_useful_bond = self.calc_bonds()
-        self.bond = bond
-        self.useful_bond = useful_bond
-        self.hint_bond = hint_bond
-        self.hint_useful_bond = hint_useful_bond
-    
-    def add_effect_bonus_bond(self, bond):
-        # Add 2 extra bond when charming is active and the partner is not Akikawa
-        if self.partner_id <= 6 and 8 in self.chara_info.get('chara_effect_id_array', []):
-            bond += 2
-
-        # Add 2 extra bond when rising star is active and the partner is Akikawa
-        elif self.partner_id == 102 and 9 in self.chara_info.get('chara_effect_id_array', []):
-            bond += 2
-        
-        return bond
-    
-    def calc_bonds(self):
-        bond = 0
-        max_possible = min(100, 100 - self.starting_bond)
-        # Akikawa is 102
-        if self.partner_id < 1000:
-            add = 7
-            if self.partner_id <= 6:
-                support_card_id = self.chara_info['support_card_array'][self.partner_id - 1]['support_card_id']
-                support_card_data = mdb.get_support_card_dict()[support_card_id]
-                support_card_type = constants.SUPPORT_CARD_TYPE_DICT[(support_card_data[1], support_card_data[2])]
-                if support_card_type in ("group", "friend"):
-                    add = 4
-            
-            bond += add
-
-            bond = self.add_effect_bonus_bond(bond)
-
-        bond = min(bond, max_possible)
-        
-        hint_bond = bond
-
-        if self.partner_id <= 6:
-            hint_bond += 5
-
-        hint_bond = self.add_effect_bonus_bond(hint_bond)
-
-        hint_bond = min(hint_bond, max_possible)
-
-        hint_bond -= bond
-
-        return max(bond, 0), max(self.calc_useful_bond(bond, self.starting_bond), 0), max(hint_bond, 0), max(self.calc_useful_bond(hint_bond, self.starting_bond + bond), 0)
+                    raise KeyError(f"Could not find support_id {support_id} after forced update")
+                logger.info(f"Successfully found support_id {support_id}")
+            support_data = support_card_dict[support_id]
+            chara_id = support_data[3]
+            return support_id, mdb.get_support_card_type(support_data), image_cache.get_chara_icon_url(chara_id)
+
+        if partner_id > 1000:
+            return None, None, image_cache.get_chara_icon_url(partner_id)
+
+        try:
+            chara_id = mdb.get_single_mode_unique_chara_dict()[chara_info['scenario_id']][partner_id]
+            return None, None, image_cache.get_chara_icon_url(chara_id)
+        except KeyError:
+            logger.error(f"Could not find unique chara_id for partner_id {partner_id} in scenario {chara_info['scenario_id']}")
+            return None, None, "https://umapyoi.net/missing_chara.png"
+
+    def update(self, chara_info):
+        """Sets the bonds of the current packet and computes the gains of every partner."""
+        bonds = {eval_data['training_partner_id']: eval_data['evaluation'] for eval_data in chara_info['evaluation_info_array']}
+        starting_bond = np.array([bonds[partner_id] for partner_id in self.partner_ids], dtype=np.int32)
+
+        # 2 extra bond when charming is active for support cards, or rising star is active for Akikawa
+        chara_effects = chara_info.get('chara_effect_id_array', [])
+        effect_bonus = np.where(
+            (self.charming_partner & (8 in chara_effects)) | (self.rising_star_partner & (9 in chara_effects)),
+            2, 0)
+
+        max_possible = 100 - starting_bond
+        bond = np.minimum(self.training_bond + effect_bonus, max_possible)
+        hint_bond = np.minimum(bond + self.hint_extra_bond + effect_bonus, max_possible) - bond
 
+        self.starting_bond = starting_bond
+        self.bond = np.maximum(bond, 0)
+        self.useful_bond = self.get_useful_bond(bond, starting_bond)
+        self.hint_bond = np.maximum(hint_bond, 0)
+        self.hint_useful_bond = self.get_useful_bond(hint_bond, starting_bond + bond)
+
+    def get_useful_bond(self, amount, starting_bond):
+        return np.maximum(np.minimum(amount + starting_bond, self.usefulness_cutoff) - starting_bond, 0)
+
+    def get_bond_gains(self, commands, sum_hints):
+        """Returns the total and useful bond gains of each command.
+        Only the best hint counts, unless sum_hints is set (blue Venus effect)."""
+        partner_counts = np.zeros((len(commands), len(self.partner_ids)), dtype=np.int32)
+        hint_counts = np.zeros_like(partner_counts)
+        for row, command in enumerate(commands):
+            tips_partners = command.get('tips_event_partner_array', [])
+            for partner_id in command.get('training_partner_array', []):
+                slot = self.slots.get(partner_id)
+                if slot is None:
+                    continue
+                partner_counts[row, slot] += 1
+                if partner_id in tips_partners:
+                    hint_counts[row, slot] += 1
+
+        total_bond = partner_counts @ self.bond
+        useful_bond = partner_counts @ self.useful_bond
+        if sum_hints:
+            total_bond += hint_counts @ self.hint_bond
+            useful_bond += hint_counts @ self.hint_useful_bond
+        else:
+            has_hint = hint_counts > 0
+            total_bond += np.where(has_hint, self.hint_bond, 0).max(axis=1, initial=0)
+            useful_bond += np.where(has_hint, self.hint_useful_bond, 0).max(axis=1, initial=0)
+        return total_bond.tolist(), useful_bond.tolist()
 
-    def calc_useful_bond(self, amount, starting_bond):
-        usefulness_cutoff = 80
-        
-        # Ignore group and friend type cards except Satake Mei in Project L'Arc
-        if self.partner_id <= 6:
-            support_card_id = self.chara_info['support_card_array'][self.partner_id - 1]['support_card_id']
-
-            if support_card_id in (10094, 30160) and self.chara_info['scenario_id'] in (6,):  # Only count Mei in Project L'Arc
-                usefulness_cutoff = 60
-            elif support_card_id in (10104, 30188) and self.chara_info['scenario_id'] in (7,):  # Only count Ryoka in UAF
-                usefulness_cutoff = 60
-            else:
-                support_card_data = mdb.get_support_card_dict()[support_card_id]
-                support_card_type = constants.SUPPORT_CARD_TYPE_DICT[(support_card_data[1], support_card_data[2])]
-                if support_card_type in ("group", "friend"):
-                    return 0
-
-        cur_bond = amount + starting_bond
-        effective_bond = 0
-
-        if 6 < self.partner_id <= 1000:
-            if self.partner_id in (102,) and not self.chara_info['scenario_id'] in (1, 6, 4):  # Disable Akikawa usefulness in certain scenarios
-                usefulness_cutoff = 60
-            else:
-                # Skip all non-Umas except Akikawa
-                return 0
-
-        new_bond = min(cur_bond, usefulness_cutoff)
-        effective_bond = new_bond - starting_bond
-        return max(effective_bond, 0)
 
 class HelperTable():
     carrotjuicer = None
     selected_preset = None
     preset_dict = None
+    partner_table = None
+    rendered_preset = None
+    rendered_in_browser = None
 
     def __init__(self, carrotjuicer):
         self.carrotjuicer = carrotjuicer
@@ -143,14 +177,14 @@ class HelperTable():
     def update_presets(self, preset_dict, selected_preset):
         self.preset_dict = preset_dict
         self.selected_preset = selected_preset
+        self.selected_preset.reset_overlay_state()
         if self.carrotjuicer.last_helper_data and self.carrotjuicer.browser and self.carrotjuicer.browser.alive():
             self.carrotjuicer.update_helper_table(self.carrotjuicer.last_helper_data)
 
 
-    def create_helper_elements(self, data, last_data) -> str:
-        """Creates the helper elements for the given response packet.
+    def carry_over_data(self, data, last_data):
+        """Transfers data from the last packet if it does not exist in the current one.
         """
-        # Transfer data from last data if it does not exist in the current data
         if last_data:
             if 'reserved_race_array' not in data and 'reserved_race_array' in last_data:
                 data['reserved_race_array'] = last_data['reserved_race_array']
@@ -160,6 +194,16 @@ class HelperTable():
             if 'home_info' not in data and 'home_info' in last_data:
                 data['home_info'] = last_data['home_info']
 
+    @profiler.timed("helper_table.build")
+    def create_helper_elements(self, data, last_data):
+        """Creates the helper elements for the given response packet.
+        Returns (update, partial update) or None if there is nothing to show. The update is {'html': overlay_html}
+        and the partial update {'patch': patch} (see Preset.generate_overlay_patch), or with the
+        overlay_browser_rendering setting {'model': model} and {'delta': delta} (see Preset.generate_overlay_model).
+        The partial update is None if the whole update has to be shown.
+        """
+        self.carry_over_data(data, last_data)
+
         if not 'home_info' in data:
             return None
         
@@ -189,8 +233,12 @@ class HelperTable():
             return []
 
         # Default commands
+        # Only params_inc_dec_info_array is changed in place below; everything else is replaced, so a shallow copy is enough.
         for command in get_commands('home_info'):
-            all_commands[command['command_id']] = copy.deepcopy(command)
+            command = dict(command)
+            if command.get('params_inc_dec_info_array') is not None:
+                command['params_inc_dec_info_array'] = list(command['params_inc_dec_info_array'])
+            all_commands[command['command_id']] = command
         
         # Scenario specific commands
         # Obsolete, but works as reference for devs
@@ -280,13 +328,11 @@ class HelperTable():
 
 
         # Support Dict
-        eval_dict = {}
-        for eval_data in data['chara_info']['evaluation_info_array']:
-            try:
-                eval_dict[eval_data['training_partner_id']] = TrainingPartner(eval_data['training_partner_id'], eval_data['evaluation'],data['chara_info'])
-            except Exception as e:
-                logger.error(f"Error while creating TrainingPartner: {e}")
-                continue
+        # The deck and partners usually stay the same for the whole run, so only the bonds are updated per packet.
+        if self.partner_table is None or self.partner_table.key != get_partner_table_key(data['chara_info']):
+            self.partner_table = PartnerTable(data['chara_info'])
+        partner_table = self.partner_table
+        partner_table.update(data['chara_info'])
 
         onsen_points_gain = {}
         # Onsen
@@ -322,15 +368,32 @@ class HelperTable():
         uaf_sport_competition = {}
         uaf_consultations_left = {}
 
-        for command in all_commands.values():
-            if command['command_id'] not in constants.COMMAND_ID_TO_KEY:
-                continue
+        training_commands = [command for command in all_commands.values() if command['command_id'] in constants.COMMAND_ID_TO_KEY]
+
+        # Set up "training partners" for SS Match
+        for command in training_commands:
+            if command['command_id'] == 'ss_match':
+                command['training_partner_array'] = []
+                arc_eval_dict = {partner_data['chara_id']: partner_data['target_id'] for partner_data in data['arc_data_set']['evaluation_info_array']}
+                
+                for chara in data['arc_data_set']['selection_info']['selection_rival_info_array']:
+                    partner_id = arc_eval_dict[chara['chara_id']]
+                    command['training_partner_array'].append(partner_id)
+
+        # For bond, first check if blue venus effect is active.
+        venus_blue_active = False
+        if 'venus_data_set' in data:
+            if len(data['venus_data_set']['venus_spirit_active_effect_info_array']) > 0 and data['venus_data_set']['venus_spirit_active_effect_info_array'][0]['chara_id'] == 9041:
+                venus_blue_active = True
+
+        # Bond gains of all commands at once
+        total_bond_gains, useful_bond_gains = partner_table.get_bond_gains(training_commands, venus_blue_active)
+
+        for command, total_bond, useful_bond in zip(training_commands, total_bond_gains, useful_bond_gains):
             level = command.get('level', 0)
             failure_rate = command.get('failure_rate', 0)
             gained_stats = {stat_type: 0 for stat_type in set(constants.COMMAND_ID_TO_KEY.values())}
             gained_skillpt = 0
-            total_bond = 0
-            useful_bond = 0
             gained_energy = 0
             rainbow_count = 0
             arc_aptitude_gain = 0
@@ -347,32 +410,12 @@ class HelperTable():
                         gained_energy += param['value']
 
 
-            # Set up "training partners" for SS Match
-            if command['command_id'] == 'ss_match':
-                command['training_partner_array'] = []
-                arc_eval_dict = {partner_data['chara_id']: partner_data['target_id'] for partner_data in data['arc_data_set']['evaluation_info_array']}
-                
-                for chara in data['arc_data_set']['selection_info']['selection_rival_info_array']:
-                    partner_id = arc_eval_dict[chara['chara_id']]
-                    command['training_partner_array'].append(partner_id)
-
-
-            # For bond, first check if blue venus effect is active.
             spirit_id = 0
             spirit_boost = 0
-            venus_blue_active = False
-            if 'venus_data_set' in data:
-                if 'spirit_data' in command:
-                    spirit_id = command['spirit_data']['spirit_id']
-                    spirit_boost = command['spirit_data']['is_boost']
-                if len(data['venus_data_set']['venus_spirit_active_effect_info_array']) > 0 and data['venus_data_set']['venus_spirit_active_effect_info_array'][0]['chara_id'] == 9041:
-                    venus_blue_active = True
-
-
-            tip_gains_total = [0]
-            tip_gains_useful = [0]
-            bond_gains_total = [0]
-            bond_gains_useful = [0]
+            if 'venus_data_set' in data and 'spirit_data' in command:
+                spirit_id = command['spirit_data']['spirit_id']
+                spirit_boost = command['spirit_data']['is_boost']
+
             partner_count = 0
             useful_partner_count = 0
             riko_count = 0
@@ -383,19 +426,20 @@ class HelperTable():
                 partner_count += 1
 
                 # Detect if training_partner is rainbowing
-                training_partner = eval_dict[training_partner_id]
+                slot = partner_table.slots.get(training_partner_id)
+                if slot is None:
+                    continue
                 if training_partner_id <= 6:
                     # Partner is a support card
-                    support_id = data['chara_info']['support_card_array'][training_partner_id - 1]['support_card_id']
-                    support_data = mdb.get_support_card_dict()[support_id]
-                    support_card_type = mdb.get_support_card_type(support_data)
+                    support_id = partner_table.support_ids[slot]
+                    support_card_type = partner_table.support_card_types[slot]
 
                     # Don't count friend cards as useful except Mei Satake in Project L'Arc and Light Hello in Grand Live and Ryoka for UAF.
                     # This should probably be moved to a setting rather then beeing predefined for the user to customize
                     if support_card_type != 'friend' or support_id == 30160 and scenario_id in (6,) or support_id == 30052 and scenario_id in (3,) or support_id == 30188 and support_id in (7,):
                         useful_partner_count += 1
 
-                    if support_card_type not in ("group", "friend") and training_partner.starting_bond >= 80 and command['command_id'] in constants.SUPPORT_TYPE_TO_COMMAND_IDS[support_card_type]:
+                    if support_card_type not in ("group", "friend") and partner_table.starting_bond[slot] >= 80 and command['command_id'] in constants.SUPPORT_TYPE_TO_COMMAND_IDS[support_card_type]:
                         rainbow_count += 1
                     elif support_card_type == "group" and util.get_group_support_id_to_passion_zone_effect_id_dict()[support_id] in data['chara_info']['chara_effect_id_array']:
                         rainbow_count += 1
@@ -410,14 +454,6 @@ class HelperTable():
                 elif training_partner_id > 1000:  # TODO: Maybe 1000 < training_partner_id < 9000
                     useful_partner_count += 1
 
-
-                if training_partner_id in command.get('tips_event_partner_array', []):
-                    tip_gains_total.append(training_partner.hint_bond)
-                    tip_gains_useful.append(training_partner.hint_useful_bond)
-
-                bond_gains_total.append(training_partner.bond)
-                bond_gains_useful.append(training_partner.useful_bond)
-
             unity_partner_count = 0
             useful_unity_partner_count = 0
             spirit_burst_partner_count = 0
@@ -439,16 +475,6 @@ class HelperTable():
                     unity_partner_count += 1
                     spirit_burst_partner_count += 1
 
-            total_bond = sum(bond_gains_total)
-            useful_bond = sum(bond_gains_useful)
-            
-            if not venus_blue_active:
-                total_bond += max(tip_gains_total)
-                useful_bond += max(tip_gains_useful)
-            else:
-                total_bond += sum(tip_gains_total)
-                useful_bond += sum(tip_gains_useful)
-
             current_stats = data['chara_info'].get(constants.COMMAND_ID_TO_KEY[command['command_id']], 0)
 
             gl_tokens = {token_type: 0 for token_type in constants.GL_TOKEN_LIST}
@@ -653,7 +679,7 @@ class HelperTable():
                 s_turn += month * 2
                 s_turn += half
                 s_turn += 1
-                thumb_url = f"https://gametora.com/images/umamusume/{'en/' if 'IS_UL_GLOBAL' in os.environ else '' }race_banners/thum_race_rt_000_{str(program_data['race_instance_id'])[:4]}_00.png"
+                thumb_url = image_cache.get_race_banner_url(program_data['race_instance_id'])
 
                 scheduled_races.append({
                     "turn": s_turn,
@@ -842,7 +868,7 @@ class HelperTable():
             "gff_tasting_great_thres": gff_tasting_great_thres,
             "gff_vegetables": gff_vegetables,
             "gff_field_point": gff_field_point,
-            "eval_dict": eval_dict,
+            "partner_table": partner_table,
             "all_commands": all_commands,
             'races': races,
             'uma_aptitudes': uma_aptitudes,
@@ -863,6 +889,15 @@ class HelperTable():
             if self.selected_preset.name != general_preset:
                 self.selected_preset = self.carrotjuicer.threader.settings.get_preset_with_name(general_preset)
 
-        overlay_html = self.selected_preset.generate_overlay(main_info, command_info)
-
-        return overlay_html
+        # Patches are made against what the last preset showed, so a different preset or rendering mode starts over.
+        render_in_browser = self.carrotjuicer.threader.settings['overlay_browser_rendering']
+        if self.selected_preset is not self.rendered_preset or render_in_browser != self.rendered_in_browser:
+            self.selected_preset.reset_overlay_state()
+            self.rendered_preset = self.selected_preset
+            self.rendered_in_browser = render_in_browser
+
+        if render_in_browser:
+            model, delta = self.selected_preset.generate_overlay_model(main_info, command_info)
+            return {'model': model}, None if delta is None else {'delta': delta}
+        overlay_html, patch = self.selected_preset.generate_overlay_patch(main_info, command_info)
+        return {'html': overlay_html}, None if patch is None else {'patch': patch}
@@ -1,29 +1,19 @@
 from enum import Enum
-import copy
 import helper_table_elements as hte
 import util
+import image_cache
 import settings_elements as se
 import constants
 from loguru import logger
 
-def compensate_overcap(game_state, command):
-    # Compensate for overcapped stats by doubling any gained stats that bring the current stats over 1200.
-    current_stats = {command_type: game_state[command_type]['current_stats'] for command_type in game_state}
-    gained_stats = copy.deepcopy(command['gained_stats'])
-    for stat in current_stats:
-        if current_stats[stat] + gained_stats[stat] > 1200:
-            stats_until_1200 = max(1200 - current_stats[stat], 0)
-            gained_stats[stat] = stats_until_1200 + (gained_stats[stat] - stats_until_1200) * 2
-
-    return gained_stats
-
 
 class CurrentStatsRow(hte.Row):
     long_name = "Current stats"
     short_name = "Current Stats"
     description = "Shows the current stats of each facility."
+    inputs = ('current_stats',)
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
         for command in game_state.values():
@@ -89,24 +79,19 @@ class GainedStatsRow(hte.Row):
     long_name = "Stats gained total"
     short_name = "Stat Gain"
     description = "Shows the total stats gained per facility. This includes stats gained outside the facility itself. \nExcludes skill points by default."
+    inputs = ('gained_stats', 'current_stats', 'gained_skillpt')
 
     def __init__(self):
         super().__init__()
         self.settings = GainedStatsSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
-
-        all_gained_stats = []
-        all_gained_stats_compensated = []
-        for command in game_state.values():
-            gained_stats = sum(command['gained_stats'].values())
-            gained_stats_compensated = sum(compensate_overcap(game_state, command).values())
-            if self.settings.enable_skillpts.value:
-                gained_stats += command['gained_skillpt']
-                gained_stats_compensated += command['gained_skillpt']
-            all_gained_stats.append(gained_stats)
-            all_gained_stats_compensated.append(gained_stats_compensated)
+        all_gained_stats = metrics.get_gained_stat_sums()
+        all_gained_stats_compensated = metrics.get_compensated_stat_sums()
+        if self.settings.enable_skillpts.value:
+            all_gained_stats = [gained_stats + command['gained_skillpt'] for gained_stats, command in zip(all_gained_stats, metrics.commands)]
+            all_gained_stats_compensated = [gained_stats + command['gained_skillpt'] for gained_stats, command in zip(all_gained_stats_compensated, metrics.commands)]
 
         if self.settings.highlight_max_overcapped.value and self.settings.displayed_value.value == 2 or self.settings.displayed_value.value == 1:
             max_gained_stats = max(all_gained_stats_compensated)
@@ -161,17 +146,16 @@ class GainedStatsDistributionRow(hte.Row):
     long_name = "Stats gained distribution"
     short_name = "Stat Gain <br>Distribution"
     description = "Shows the stats gained per facility per type. This includes stats gained outside the facility itself."
+    inputs = ('gained_stats', 'current_stats', 'gained_skillpt')
 
     def __init__(self):
         super().__init__()
         self.settings = GainedStatsDistributionSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
-
-        for command in game_state.values():
+        for command, gained_stats_compensated in zip(metrics.commands, metrics.get_compensated_stats()):
             gained_stats = command['gained_stats']
-            gained_stats_compensated = compensate_overcap(game_state, command)
 
             def display_value(gained, compensated):
                 if self.settings.displayed_value.value == 0:
@@ -227,12 +211,13 @@ class GainedEnergyRow(hte.Row):
     long_name = "Energy gained/lost"
     short_name = "Energy"
     description = "Shows the total energy gained or lost per facility."
+    inputs = ('gained_energy',)
 
     def __init__(self):
         super().__init__()
         self.settings = GainedEnergySettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
         for command in game_state.values():
@@ -270,15 +255,16 @@ class TotalBondRow(hte.Row):
     long_name = "Bond gained total"
     short_name = "Total Bond"
     description = "Shows the total bond gain for each facility. Total includes all bond gains of all supports and Akikawa, until the bar is filled."
+    inputs = ('total_bond',)
 
     def __init__(self):
         super().__init__()
         self.settings = TotalBondSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        max_total_bond = max(facility['total_bond'] for facility in game_state.values())
+        max_total_bond = metrics.get_max('total_bond')
 
         for command in game_state.values():
             total_bond = command['total_bond']
@@ -312,15 +298,16 @@ class UsefulBondRow(hte.Row):
     long_name = "Useful bond gained total"
     short_name = "Useful Bond"
     description = "Shows the useful bond gain for each facility. Useful includes supports until orange bar, excluding friend/group cards.<br>Also Akikawa until green bar (except Project L'Arc). During L'Arc, Mei counts as useful until green bar."
+    inputs = ('useful_bond',)
 
     def __init__(self):
         super().__init__()
         self.settings = UsefulBondSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        max_useful_bond = max(facility['useful_bond'] for facility in game_state.values())
+        max_useful_bond = metrics.get_max('useful_bond')
 
         for command in game_state.values():
             useful_bond = command['useful_bond']
@@ -352,15 +339,16 @@ class GainedSkillptRow(hte.Row):
     long_name = "Skill points gained"
     short_name = "Skill Points"
     description = "Shows the total skill points gained per facility."
+    inputs = ('gained_skillpt',)
 
     def __init__(self):
         super().__init__()
         self.settings = GainedSkillptSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        max_gained_skillpt = max(facility['gained_skillpt'] for facility in game_state.values())
+        max_gained_skillpt = metrics.get_max('gained_skillpt')
 
         for command in game_state.values():
             gained_skillpt = command['gained_skillpt']
@@ -414,12 +402,13 @@ class FailPercentageRow(hte.Row):
     long_name = "Fail percentage"
     short_name = "Fail %"
     description = "Shows the fail percentage per facility."
+    inputs = ('failure_rate',)
 
     def __init__(self):
         super().__init__()
         self.settings = FailPercentageSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
         for command in game_state.values():
@@ -444,8 +433,9 @@ class LevelRow(hte.Row):
     long_name = "Facility level"
     short_name = "Level"
     description = "Shows the level of each facility."
+    inputs = ('level',)
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
         for command in game_state.values():
@@ -472,8 +462,8 @@ class GrandMastersFragmentsRow(hte.Row):
         super().__init__()
         self.settings = GrandMastersFragmentsSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 5:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 5:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -493,11 +483,8 @@ class GrandMastersFragmentsRow(hte.Row):
 
         return cells
     
-    def to_tr(self, command_info):
-        if command_info['speed']['scenario_id'] != 5:
-            return ""
-
-        return super().to_tr(command_info)
+    def is_shown(self, command_info, metrics):
+        return command_info['speed']['scenario_id'] == 5
 
 
 class GrandLiveTotalTokensSettings(se.NewSettings):
@@ -525,16 +512,16 @@ class GrandLiveTotalTokensRow(hte.Row):
         super().__init__()
         self.settings = GrandLiveTotalTokensSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 3:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 3:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        max_gl_tokens = max(sum(command['gl_tokens'].values()) for command in game_state.values())
+        all_gl_tokens = metrics.get_sums('gl_tokens')
+        max_gl_tokens = max(all_gl_tokens)
 
-        for command in game_state.values():
-            gl_tokens = sum(command['gl_tokens'].values())
+        for gl_tokens in all_gl_tokens:
             if self.settings.highlight_max.value and max_gl_tokens > 0 and gl_tokens == max_gl_tokens:
                 cells.append(hte.Cell(gl_tokens, bold=True, color=self.settings.highlight_max_color.value))
             else:
@@ -549,8 +536,8 @@ class GrandLiveTokensDistributionRow(hte.Row):
     short_name = "Token Gain <br>Distribution"
     description = "[Scenario-specific] Shows the distribution of Grand Live tokens on each facility. Hidden in other scenarios."
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 3:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 3:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -572,19 +559,17 @@ class GrandLiveTokensDistributionRow(hte.Row):
 
         return cells
     
-    def to_tr(self, command_info):
-        if list(command_info.values())[0]['scenario_id'] != 3:
-            return ""
-
-        return super().to_tr(command_info)
+    def is_shown(self, command_info, metrics):
+        return metrics.scenario_id == 3
     
 
 class RainbowCountRow(hte.Row):
     long_name = "Rainbow count"
     short_name = "Rainbows"
     description = "Shows the total number of rainbows on each facility."
+    inputs = ('rainbow_count',)
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
         for command in game_state.values():
@@ -614,15 +599,16 @@ class PartnerCountRow(hte.Row):
     long_name = "Training partner count"
     short_name = "Partners"
     description = "Shows the total number of training partners on each facility. This includes partners that don't give extra stats when training together."
+    inputs = ('partner_count',)
 
     def __init__(self):
         super().__init__()
         self.settings = PartnerCountSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        highest_partner_count = max(command['partner_count'] for command in game_state.values())
+        highest_partner_count = metrics.get_max('partner_count')
 
         for command in game_state.values():
             if self.settings.highlight_max.value and highest_partner_count > 0 and command['partner_count'] == highest_partner_count:
@@ -654,15 +640,16 @@ class UsefulPartnerCountRow(hte.Row):
     long_name = "Useful training partner count"
     short_name = "Useful<br>Partners"
     description = "Shows the number of useful training partners on each facility. Useful partners are any that give extra stats when training together."
+    inputs = ('useful_partner_count',)
 
     def __init__(self):
         super().__init__()
         self.settings = UsefulPartnerCountSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        highest_useful_partner_count = max(command['useful_partner_count'] for command in game_state.values())
+        highest_useful_partner_count = metrics.get_max('useful_partner_count')
 
         for command in game_state.values():
             if self.settings.highlight_max.value and highest_useful_partner_count > 0 and command['useful_partner_count'] == highest_useful_partner_count:
@@ -694,15 +681,16 @@ class HintCountRow(hte.Row):
     long_name = "Skill hint count"
     short_name = "Skill Hints"
     description = "Shows the total number of skill hints available at each facility."
+    inputs = ('num_hints',)
 
     def __init__(self):
         super().__init__()
         self.settings = HintCountSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        highest_hint_count = max(command['num_hints'] for command in game_state.values())
+        highest_hint_count = metrics.get_max('num_hints')
 
         for command in game_state.values():
             if self.settings.highlight_max.value and highest_hint_count > 0 and command['num_hints'] == highest_hint_count:
@@ -794,15 +782,13 @@ class UnityTrainingCountRow(hte.Row):
         super().__init__()
         self.settings = UnityTrainingCountSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 2:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 2:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
-
-
-        highest_unity_partner_count = max(command['unity_partner_count'] for command in game_state.values())
-        highest_spirit_burst_partner_count = max(command['spirit_burst_partner_count'] for command in game_state.values())
+        highest_unity_partner_count = metrics.get_max('unity_partner_count')
+        highest_spirit_burst_partner_count = metrics.get_max('spirit_burst_partner_count')
 
         for command in game_state.values():
             bold = False
@@ -832,15 +818,13 @@ class UsefulUnityTrainingCountRow(hte.Row):
         super().__init__()
         self.settings = UsefulUnityTrainingCountSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 2:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 2:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
-
-
-        highest_unity_partner_count = max(command['useful_unity_partner_count'] for command in game_state.values())
-        highest_spirit_burst_partner_count = max(command['spirit_burst_partner_count'] for command in game_state.values())
+        highest_unity_partner_count = metrics.get_max('useful_unity_partner_count')
+        highest_spirit_burst_partner_count = metrics.get_max('spirit_burst_partner_count')
 
         for command in game_state.values():
             bold = False
@@ -870,8 +854,8 @@ class UnityScoreRow(hte.Row):
         super().__init__()
         self.settings = UnityScoreSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 2:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 2:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -932,13 +916,13 @@ class LArcStarGaugeGainRow(hte.Row):
         super().__init__()
         self.settings = LArcStarGaugeGainSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 6:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 6:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        max_star_gauge_gain = max(facility['arc_gauge_gain'] for facility in game_state.values())
+        max_star_gauge_gain = metrics.get_max('arc_gauge_gain')
 
         for command in game_state.values():
             star_gauge_gain = command['arc_gauge_gain']
@@ -976,13 +960,13 @@ class LArcAptitudePointsRow(hte.Row):
         super().__init__()
         self.settings = LArcAptitudePointsSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 6:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 6:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        max_aptitude_gain = max(facility['arc_aptitude_gain'] for facility in game_state.values())
+        max_aptitude_gain = metrics.get_max('arc_aptitude_gain')
 
         for command in game_state.values():
             aptitude_gain = command['arc_aptitude_gain']
@@ -1003,8 +987,8 @@ class UAFSportPointGainRow(hte.Row):
         super().__init__()
         self.settings = UAFSportPointGainSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 7:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 7:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -1058,18 +1042,18 @@ class EnergyRatio(hte.Row):
         super().__init__()
         self.settings = EnergyRatioSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
 
         cells = [hte.Cell(self.short_name, title=self.description)]
         
         max_gain = 0
         ratio_list = []
-        for command in game_state.values():
+        for command, gained_stats in zip(metrics.commands, metrics.get_gained_stat_sums()):
             energy = command['gained_energy']
             chosen_commands = command['gained_stats']
         
             if self.settings.comparison_choice.value == 0:
-                chosen_commands = sum(command['gained_stats'].values())
+                chosen_commands = gained_stats
             elif self.settings.comparison_choice.value == 1:
                 chosen_commands = command['useful_bond']
             elif self.settings.comparison_choice.value == 2:
@@ -1207,8 +1191,8 @@ class GFFVegetablesRow(hte.Row):
         super().__init__()
         self.settings = GFFVegetablesSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 8:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 8:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -1237,8 +1221,8 @@ class GFFVegetablesDistributionRow(hte.Row):
     short_name = "Veggies <br>Distribution"
     description = "[Scenario-specific] Displays the distribution of vegetables planted for each training facility."
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 8:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 8:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -1287,16 +1271,16 @@ class RMUTotalResearchLevelRow(hte.Row):
         super().__init__()
         self.settings = RMUTotalResearchLevelSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 9:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 9:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        max_research_lvl = max(sum([data['value'] for data in command['point_up_info_array']]) for command in game_state.values())
+        research_lvls = metrics.get_sums('point_up_info_array', 'value')
+        max_research_lvl = max(research_lvls)
 
-        for command in game_state.values():
-            research_lvl = sum([data['value'] for data in command['point_up_info_array']])
+        for research_lvl in research_lvls:
             if self.settings.highlight_max.value and max_research_lvl > 0 and research_lvl == max_research_lvl:
                 cells.append(hte.Cell(research_lvl, bold=True, color=self.settings.highlight_max_color.value))
             else:
@@ -1310,8 +1294,8 @@ class RMUResearchDistributionRow(hte.Row):
     short_name = "Research Lvl <br>Distribution"
     description = "[Scenario-specific] Shows the distribution of research level gained on each facility. Hidden in other scenarios."
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 9:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 9:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -1336,11 +1320,8 @@ class RMUResearchDistributionRow(hte.Row):
 
         return cells
     
-    def to_tr(self, command_info):
-        if list(command_info.values())[0]['scenario_id'] != 9:
-            return ""
-
-        return super().to_tr(command_info)
+    def is_shown(self, command_info, metrics):
+        return metrics.scenario_id == 9
 
 class DYIPointsDistributionRow(hte.Row):
     long_name = "Design Your Island points distribution"
@@ -1352,8 +1333,8 @@ class DYIPointsDistributionRow(hte.Row):
         super().__init__()
         self.settings = DYISettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 11:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 11:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -1379,11 +1360,8 @@ class DYIPointsDistributionRow(hte.Row):
 
         return cells
 
-    def to_tr(self, command_info):
-        if list(command_info.values())[0]['scenario_id'] != 11:
-            return ""
-
-        return super().to_tr(command_info)
+    def is_shown(self, command_info, metrics):
+        return metrics.scenario_id == 11
 
 
 class OnsenPointsDistributionRow(hte.Row):
@@ -1396,8 +1374,8 @@ class OnsenPointsDistributionRow(hte.Row):
         super().__init__()
         self.settings = OnsenSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 12:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 12:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -1420,11 +1398,8 @@ class OnsenPointsDistributionRow(hte.Row):
 
         return cells
 
-    def to_tr(self, command_info):
-        if list(command_info.values())[0]['scenario_id'] != 12:
-            return ""
-
-        return super().to_tr(command_info)
+    def is_shown(self, command_info, metrics):
+        return metrics.scenario_id == 12
 
 
 class DreamPointsRow(hte.Row):
@@ -1437,13 +1412,14 @@ class DreamPointsRow(hte.Row):
         super().__init__()
         self.settings = DreamPointsSettings()
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 13:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 13:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
 
-        has_ssr_casino_drive = list(game_state.values())[0]['has_ssr_casino_drive']
+        first_command = metrics.commands[0]
+        has_ssr_casino_drive = first_command['has_ssr_casino_drive']
         dp_sums = {}
         for command_key, command_data in game_state.items():
             point_sum = 0
@@ -1451,7 +1427,7 @@ class DreamPointsRow(hte.Row):
                 point_sum += (2 if has_ssr_casino_drive else 1) if member['gain_exp'] == 0 else 0
             dp_sums[command_key] = point_sum
         max_points = max(dp_sums.values())
-        if list(game_state.values())[0]['turn'] > 60:
+        if first_command['turn'] > 60:
             return [] # Can't gain DP after the last Reflection/Strategy Meeting
         if max_points == 0 and self.settings.hide_row_if_no_gain.value:
             return [] # Don't show row if no DP gain
@@ -1470,7 +1446,7 @@ def generate_div(member):
     cell_text = "<div style=\"display: flex; flex-direction: column; align-items: center; justify-content: center;\">"
     chara_id = member['chara_id']
     gain_xp = member['gain_exp']
-    chara_img = f"https://gametora.com/images/umamusume/characters/icons/chr_icon_{chara_id}.png"
+    chara_img = image_cache.get_chara_icon_url(chara_id)
     gain_img = util.get_dreams_image_dict()[str(gain_xp)]  # TODO use the other PNG if the level is maxed
     cell_text += f"<div style=\"display: flex; flex-direction: column; align-items: center; justify-content: center;\"><img src=\"{chara_img}\" height=\"36\" width=\"36\" style=\"margin-bottom: -2px\" />"
     cell_text += f"""<img src=\"{gain_img}\"height=\"19\" width=\"19\" style=\"position: relative; top: -12px; right: -12px; margin-bottom: -10px\" /></div>"""
@@ -1483,8 +1459,8 @@ class DreamsPartnersRow(hte.Row):
     short_name = "Dream Gauge"
     description = "[Scenario-specific] Shows the Dream Gauge gain for each team member. Hidden in other scenarios."
 
-    def _generate_cells(self, game_state) -> list[hte.Cell]:
-        if list(game_state.values())[0]['scenario_id'] != 13:
+    def _generate_cells(self, game_state, metrics) -> list[hte.Cell]:
+        if metrics.scenario_id != 13:
             return []
 
         cells = [hte.Cell(self.short_name, title=self.description)]
@@ -1508,11 +1484,8 @@ class DreamsPartnersRow(hte.Row):
 
         return cells
 
-    def to_tr(self, command_info):
-        if list(command_info.values())[0]['scenario_id'] != 13:
-            return ""
-
-        return super().to_tr(command_info)
+    def is_shown(self, command_info, metrics):
+        return metrics.scenario_id == 13
 
 
 
@@ -1,12 +1,15 @@
 import enum
-import os
+import string
+import sys
 import traceback
 
 from loguru import logger
 import gui
 import util
+import image_cache
 import constants
 import mdb
+import profiler
 import settings_elements as se
 
 TABLE_HEADERS = {
@@ -21,6 +24,150 @@ TABLE_HEADERS = {
     "pr_activities": "PR Activities",
 }
 
+TABLE_SECTION = "table"
+
+
+def escape_template(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def get_section_id(section_id):
+    return f"ul-section-{section_id}"
+
+
+def wrap_section(section_id, html):
+    # display: contents keeps the wrapper out of the overlay's flex layout.
+    return f"<div id=\"{get_section_id(section_id)}\" style=\"display: contents;\">{html}</div>"
+
+
+class Template():
+    """An HTML snippet with {name} placeholders, split once into static parts and field names.
+    Rendering only substitutes the values and appends everything to an output list."""
+
+    def __init__(self, template):
+        self.parts = []
+        for literal, field_name, format_spec, _ in string.Formatter().parse(template):
+            if literal:
+                self.parts.append((sys.intern(literal), None, None))
+            if field_name is not None:
+                self.parts.append((None, field_name, format_spec))
+
+    def render(self, out, **values):
+        for literal, field_name, format_spec in self.parts:
+            if literal is not None:
+                out.append(literal)
+            elif format_spec:
+                out.append(format(values[field_name], format_spec))
+            else:
+                out.append(str(values[field_name]))
+
+    def __call__(self, **values):
+        out = []
+        self.render(out, **values)
+        return ''.join(out)
+
+
+# Opening <td> tags by (style, bold, color, background, title). Cells mostly share a handful of looks.
+TD_OPEN_CACHE = {}
+MAX_TD_OPEN_CACHE_SIZE = 4096
+
+
+def get_td_open(style, bold, color, background, title):
+    key = (style, bold, color, background, title)
+    td_open = TD_OPEN_CACHE.get(key)
+    if td_open is not None:
+        return td_open
+
+    if bold:
+        style += "font-weight:bold;"
+    if color:
+        style += f"color:{color};"
+    if background:
+        style += f"background:{background};"
+    if style:
+        style = f" style=\"{style}\""
+    
+    if title:
+        title = title.replace('\n','')
+        title = f" title=\"{title}\""
+    td_open = sys.intern(f"<td{style if style else ''}{title if title else ''}>")
+
+    if len(TD_OPEN_CACHE) > MAX_TD_OPEN_CACHE_SIZE:
+        TD_OPEN_CACHE.clear()
+    TD_OPEN_CACHE[key] = td_open
+    return td_open
+
+
+BOND_PARTNER_OPEN_TEMPLATE = Template("<div style=\"position:relative;display:flex;flex-direction:column;align-items:center;gap:0.2rem;\"><img src=\"{img}\" width=\"56\" height=\"56\" style=\"display:inline-block;\"/>")
+BOND_HINT_ICON = """<div style="position:absolute;right:0px;width:20px;height:20px;border-radius:50%;background:linear-gradient(135deg,#ff6b8f,#ff3b6f);color:#fff;font-weight:700;font-size:14px;line-height:20px;text-align:center;box-shadow:0 1px 3px rgba(0,0,0,.3);z-index:10;pointer-events:none;transform: rotate(20deg);">!</div>"""
+BOND_BAR_TEMPLATE = Template("""
+<div style="width: 100%;height: 0.75rem;position: relative;background-color: #4A494B;border-radius: 0.5rem;">
+    <div style="position: absolute;width:calc(100% - 4px);height:calc(100% - 4px);top:2px;left:50%;transform: translateX(-50%);">
+        <div style="position: absolute;width:100%;height:100%;background-color:#6E6B79;border-radius: 1rem;"></div>
+        <div style="position: absolute;width:{starting_bond}%;height:100%;background-color:{bond_color};"></div>
+        <div style="position: absolute;width:2px;height:100%;background-color:#4A494B;top:0px;left:20%;transform: translateX(-50%);"></div>
+        <div style="position: absolute;width:2px;height:100%;background-color:#4A494B;top:0px;left:40%;transform: translateX(-50%);"></div>
+        <div style="position: absolute;width:2px;height:100%;background-color:#4A494B;top:0px;left:60%;transform: translateX(-50%);"></div>
+        <div style="position: absolute;width:2px;height:100%;background-color:#4A494B;top:0px;left:80%;transform: translateX(-50%);"></div>
+        <div style="position: absolute;width:100%;height:100%;border: 2px solid #4A494B;box-sizing: content-box;left: -2px;top: -2px;border-radius: 1rem;"></div>
+    </div>
+</div>""".replace("\n", "").replace("    ", ""))
+BOND_NUMBER_TEMPLATE = Template("<p style=\"margin:0;padding:0;color:{bond_color};font-weight:bold;\">{starting_bond}</p>")
+
+
+MANT_ROW_OPEN = '<div style="display:flex;flex-wrap:wrap;justify-content:center;gap:0.4rem;width:100%;padding:0.2rem 0;">'
+MANT_HAMMER_HIGHLIGHT = "box-shadow: 0px 0px 10px 7px rgba(255,0,0,0.65); border-radius:4px;"
+MANT_ITEM_OPEN_TEMPLATE = Template(
+    '<div title="{description}" style="position:relative;flex:0 0 auto;'
+    'width:36px;height:36px;cursor:default;">'
+    '<img src="{icon_src}" width="32" height="32" '
+    'style="position:absolute;top:50%;left:50%;transform:translate(-50%,-50%);{highlight}"/>'
+)
+MANT_MODIFIER_TEMPLATE = Template(
+    '<div style="position:absolute;bottom:10px;left:50%;transform:translateX(-50%);'
+    'background:rgba(0,0,0,0.75);color:#ffd700;font-size:0.5rem;font-weight:700;'
+    'padding:0 2px;border-radius:3px;white-space:nowrap;z-index:2;line-height:1.2;">'
+    '{modifier}</div>'
+)
+MANT_OWNED_TEMPLATE = Template(
+    '<div style="position:absolute;bottom:-2px;left:50%;transform:translateX(-50%);'
+    'background:rgba(0,0,0,0.7);color:#7bed9f;font-size:0.55rem;font-weight:700;'
+    'padding:0 3px;border-radius:4px;white-space:nowrap;z-index:2;line-height:1.2;">'
+    'x{owned_count}</div>'
+)
+MANT_TURNS_TEMPLATE = Template(
+    '<div style="position:absolute;top:-2px;right:-2px;'
+    'background:{turn_color};color:#fff;font-size:0.6rem;font-weight:700;'
+    'min-width:14px;height:14px;line-height:14px;text-align:center;'
+    'border-radius:7px;padding:0 2px;z-index:2;">'
+    '{turns_left}</div>'
+)
+MANT_COST_TEMPLATE = Template(
+    '<div style="position:absolute;bottom:-2px;left:50%;transform:translateX(-50%);'
+    'background:rgba(0,0,0,0.7);color:{cost_color};font-size:0.55rem;font-weight:700;'
+    'padding:0 3px;border-radius:4px;white-space:nowrap;z-index:2;line-height:1.2;">'
+    '{coin_num}</div>'
+)
+MANT_COIN_TEMPLATE = Template(
+    '<div style="position:relative;flex:0 0 auto;'
+    'width:36px;height:36px;cursor:default;">'
+    '<img src="{coin_src}" width="32" height="32" '
+    'style="position:absolute;top:50%;left:50%;transform:translate(-50%,-50%);"/>'
+    '<div style="position:absolute;bottom:-2px;left:50%;transform:translateX(-50%);'
+    'background:rgba(0,0,0,0.7);color:#ffd700;font-size:0.6rem;font-weight:700;'
+    'padding:0 3px;border-radius:4px;white-space:nowrap;z-index:2;line-height:1.2;">'
+    '{coin_count}</div>'
+)
+MANT_SALE_TEMPLATE = Template(
+    '<div style="position:absolute;top:-4px;right:-6px;'
+    'background:linear-gradient(135deg,#ff6b8f,#ff3b6f);'
+    'color:#fff;font-weight:700;font-size:0.5rem;line-height:1;'
+    'padding:2px 3px;border-radius:4px;'
+    'box-shadow:0 1px 3px rgba(0,0,0,.3);z-index:10;'
+    'pointer-events:none;white-space:nowrap;">{sale_val}%</div>'
+)
+
+
 class Colors(enum.Enum):
     """Defines the colors used in the helper table.
     """
@@ -40,22 +187,75 @@ class Cell():
         self.style = style
         self.title = title
 
+    def render(self, out):
+        out.append(get_td_open(self.style, self.bold, self.color, self.background, self.title))
+        out.append(str(self.value))
+        out.append("%</td>" if self.percent else "</td>")
+
     def to_td(self):
-        style = self.style
-        if self.bold:
-            style += "font-weight:bold;"
-        if self.color:
-            style += f"color:{self.color};"
-        if self.background:
-            style += f"background:{self.background};"
-        if style:
-            style = f" style=\"{style}\""
-        
-        title = self.title
-        if title:
-            title = title.replace('\n','')
-            title = f" title=\"{title}\""
-        return f"<td{style if style else ''}{title if title else ''}>{self.value}{'%' if self.percent else ''}</td>"
+        out = []
+        self.render(out)
+        return ''.join(out)
+
+    def get_look(self):
+        return (self.style, self.bold, self.color, self.background, self.title, self.percent)
+
+    def get_model_value(self):
+        # The browser turns ints into the same text as str(). Everything else is sent as the text itself.
+        return self.value if type(self.value) is int else str(self.value)
+
+
+def compensate_overcap(game_state, command, current_stats=None):
+    # Compensate for overcapped stats by doubling any gained stats that bring the current stats over 1200.
+    if current_stats is None:
+        current_stats = {command_type: game_state[command_type]['current_stats'] for command_type in game_state}
+    gained_stats = dict(command['gained_stats'])
+    for stat in current_stats:
+        if current_stats[stat] + gained_stats[stat] > 1200:
+            stats_until_1200 = max(1200 - current_stats[stat], 0)
+            gained_stats[stat] = stats_until_1200 + (gained_stats[stat] - stats_until_1200) * 2
+
+    return gained_stats
+
+
+class DerivedMetrics():
+    """Values derived from a packet's command_info that several rows use. The Preset creates one per table and passes it to every row.
+    Each one is computed for all facilities the first time a row asks for it, in the order of command_info."""
+
+    def __init__(self, game_state):
+        self.game_state = game_state
+        self.commands = list(game_state.values())
+        self.scenario_id = self.commands[0]['scenario_id'] if self.commands else None
+        self.cache = {}
+
+    def get(self, name, compute):
+        if name not in self.cache:
+            self.cache[name] = compute()
+        return self.cache[name]
+
+    def get_compensated_stats(self):
+        """Gained stats of each facility, see compensate_overcap."""
+        def compute():
+            current_stats = {command_type: command['current_stats'] for command_type, command in self.game_state.items()}
+            return [compensate_overcap(self.game_state, command, current_stats) for command in self.commands]
+        return self.get('compensated_stats', compute)
+
+    def get_gained_stat_sums(self):
+        return self.get('gained_stat_sums', lambda: [sum(command['gained_stats'].values()) for command in self.commands])
+
+    def get_compensated_stat_sums(self):
+        return self.get('compensated_stat_sums', lambda: [sum(gained_stats.values()) for gained_stats in self.get_compensated_stats()])
+
+    def get_max(self, key):
+        return self.get(('max', key), lambda: max(command[key] for command in self.commands))
+
+    def get_sums(self, key, field=None):
+        """Sum of the values of a dict, or of a field of a list of dicts, for each facility."""
+        if field is None:
+            compute = lambda: [sum(command[key].values()) for command in self.commands]
+        else:
+            compute = lambda: [sum(item[field] for item in command[key]) for command in self.commands]
+        return self.get(('sums', key, field), compute)
 
 
 class Row():
@@ -64,9 +264,15 @@ class Row():
     description = None
     settings = None
     cells = None
+    # command_info keys this row reads. None means it may read anything.
+    inputs = None
 
     dialog = None
     style = None
+    cached_key = None
+    cached_tr = None
+    cached_model_key = None
+    cached_model = None
 
     """Defines a row in the helper table.
     """
@@ -75,7 +281,7 @@ class Row():
         self.style = None
         self.disabled = False
 
-    def _generate_cells(self, command_info) -> list[Cell]:
+    def _generate_cells(self, command_info, metrics) -> list[Cell]:
         """Returns a list of cells for this row.
         """
         cells = [Cell(self.short_name)]
@@ -85,10 +291,10 @@ class Row():
         
         return cells
 
-    def get_cells(self, command_info) -> list[Cell]:
+    def get_cells(self, command_info, metrics) -> list[Cell]:
         """Returns the value of the row at the given column index.
         """
-        return self._generate_cells(command_info)
+        return self._generate_cells(command_info, metrics)
 
     def display_settings_dialog(self, parent):
         """Displays the settings dialog for this row.
@@ -99,9 +305,49 @@ class Row():
         self.dialog = None
         self.settings = settings_var[0]
     
-    def to_tr(self, command_info):
-        td = ''.join(cell.to_td() for cell in self.get_cells(command_info))
-        return f"<tr{self.get_style()}>{td}</tr>"
+    def is_shown(self, command_info, metrics):
+        """Rows for a single scenario return False in the other scenarios."""
+        return True
+
+    def to_tr(self, command_info, metrics):
+        if not self.is_shown(command_info, metrics):
+            return ""
+        out = [f"<tr{self.get_style()}>"]
+        for cell in self.get_cells(command_info, metrics):
+            cell.render(out)
+        out.append("</tr>")
+        return ''.join(out)
+
+    def get_input_key(self, command_info):
+        """Returns everything the row's HTML is made from."""
+        settings = self.settings.to_dict() if self.settings else None
+        if self.inputs is None:
+            return (self.disabled, self.style, settings, command_info)
+        values = [[command.get(key) for key in self.inputs] for command in command_info.values()]
+        # The scenario decides whether some rows are shown at all.
+        return (self.disabled, self.style, settings, list(command_info), [command.get('scenario_id') for command in command_info.values()], values)
+
+    def to_cached_tr(self, command_info, metrics):
+        """Same as to_tr, but only rebuilds the row when its inputs changed since the last call."""
+        input_key = self.get_input_key(command_info)
+        if self.cached_tr is None or input_key != self.cached_key:
+            self.cached_tr = self.to_tr(command_info, metrics)
+            self.cached_key = input_key
+        return self.cached_tr
+
+    def to_model(self, command_info, metrics):
+        """Returns the row as (tr attributes, [(look, value), ...]) for building it in the browser, or None if it is not shown."""
+        if not self.is_shown(command_info, metrics):
+            return None
+        return (self.get_style(), [(cell.get_look(), cell.get_model_value()) for cell in self.get_cells(command_info, metrics)])
+
+    def to_cached_model(self, command_info, metrics):
+        """Same as to_model, but only rebuilds the row when its inputs changed since the last call."""
+        input_key = self.get_input_key(command_info)
+        if self.cached_model is None or input_key != self.cached_model_key:
+            self.cached_model = self.to_model(command_info, metrics)
+            self.cached_model_key = input_key
+        return self.cached_model
     
     def get_style(self):
         if self.style:
@@ -181,6 +427,14 @@ class Preset():
     rows = None
     initialized_rows: list[Row] = None
     row_types = None
+    last_sections = None
+    last_table_rows = None
+    last_generated_rows = None
+    compiled = None
+    # Cell looks sent to the browser by their index, and what was last sent. See generate_overlay_model.
+    looks = None
+    look_indices = None
+    last_model = None
 
     gm_fragment_dict = util.get_gm_fragment_dict()
     gl_token_dict = util.get_gl_token_dict()
@@ -193,6 +447,7 @@ class Preset():
             self.initialized_rows = [row.value() for row in self.rows]
         else:
             self.initialized_rows = []
+        self.compile()
 
     def __iter__(self):
         return iter(self.initialized_rows)
@@ -213,52 +468,188 @@ class Preset():
         self.dialog = None
         self.settings = settings_var[0]
     
-    def generate_overlay(self, main_info, command_info):
-        html_elements = []
+    def generate_sections(self, main_info, command_info, render_table=True):
+        """Returns the overlay as a list of (section id, html).
+        Without render_table, the table section is None and generate_overlay_model sends the table instead."""
+        sections = []
 
         if self.settings.progress_bar.value:
-            html_elements.append(self.generate_progress_bar(main_info))
+            sections.append(("progress-bar", self.generate_progress_bar(main_info)))
 
         if self.settings.energy_enabled.value:
-            html_elements.append(self.generate_energy(main_info))
+            sections.append(("energy", self.generate_energy(main_info)))
 
         if self.settings.skillpt_enabled.value:
-            html_elements.append(self.generate_skillpt(main_info))
+            sections.append(("skillpt", self.generate_skillpt(main_info)))
 
         if self.settings.fans_enabled.value:
-            html_elements.append(self.generate_fans(main_info))
+            sections.append(("fans", self.generate_fans(main_info)))
         
         if self.settings.schedule_enabled.value:
-            html_elements.append(self.generate_schedule(main_info))
+            sections.append(("schedule", self.generate_schedule(main_info)))
         
         if self.settings.support_bonds.value:
-            html_elements.append(self.generate_bonds(main_info, display_type=self.settings.support_bonds.value))
+            sections.append(("bonds", self.generate_bonds(main_info, display_type=self.settings.support_bonds.value)))
 
         if self.settings.scenario_specific_enabled.value:
-            html_elements.append(self.generate_gm_table(main_info))
-            html_elements.append(self.generate_gl_table(main_info))
-            html_elements.append(self.generate_arc(main_info))
-            html_elements.append(self.generate_uaf(main_info))
-            html_elements.append(self.generate_gff(main_info))
+            sections.append(("gm", self.generate_gm_table(main_info)))
+            sections.append(("gl", self.generate_gl_table(main_info)))
+            sections.append(("arc", self.generate_arc(main_info)))
+            sections.append(("uaf", self.generate_uaf(main_info)))
+            sections.append(("gff", self.generate_gff(main_info)))
 
-        html_elements.append(self.generate_table(command_info, main_info))
+        sections.append((TABLE_SECTION, self.generate_table(command_info, main_info) if render_table else None))
 
         if self.settings.scenario_specific_enabled.value:
             # Put MANT after the table
-            html_elements.append(self.generate_mant(main_info))
+            sections.append(("mant", self.generate_mant(main_info)))
 
         # html_elements.append("""<button id="btn-skill-window" onclick="window.await_skill_window();">Open Skills Window</button>""")
 
-        return ''.join(html_elements)
+        return sections
+
+    def generate_overlay(self, main_info, command_info):
+        return ''.join(wrap_section(section_id, html) for section_id, html in self.generate_sections(main_info, command_info))
+
+    def reset_overlay_state(self):
+        """Forgets what was last shown, so the next patch is a full render."""
+        self.last_sections = None
+        self.last_table_rows = None
+        self.looks = None
+        self.look_indices = None
+        self.last_model = None
+        self.compile()
+
+    def compile(self):
+        """Drops the compiled templates. They are built again the first time they are needed,
+        so a preset is compiled once when it is loaded or changed."""
+        self.compiled = {}
+
+    def get_compiled(self, key, builder):
+        if self.compiled is None:
+            self.compile()
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            compiled = builder()
+            self.compiled[key] = compiled
+        return compiled
+
+    @profiler.timed("helper_table.render")
+    def generate_overlay_patch(self, main_info, command_info):
+        """Returns (overlay_html, patch).
+        The patch maps element ids to the new outer HTML of every section or table row that changed
+        since the last call. It is None when the layout changed and the full overlay has to be shown."""
+        sections = self.generate_sections(main_info, command_info)
+        table_rows = self.last_generated_rows
+        overlay_html = ''.join(wrap_section(section_id, html) for section_id, html in sections)
+
+        patch = None
+        last_sections = self.last_sections
+        last_table_rows = self.last_table_rows
+        if last_sections is not None and [section[0] for section in sections] == [section[0] for section in last_sections]:
+            patch = {}
+            for (section_id, html), (_, last_html) in zip(sections, last_sections):
+                if html == last_html:
+                    continue
+                if section_id == TABLE_SECTION and last_table_rows is not None and table_rows[0] == last_table_rows[0] \
+                        and [row[0] for row in table_rows[1]] == [row[0] for row in last_table_rows[1]]:
+                    # Same header and rows, only replace the rows that changed.
+                    for (row_id, tr), (_, last_tr) in zip(table_rows[1], last_table_rows[1]):
+                        if tr != last_tr:
+                            patch[row_id] = tr
+                    continue
+                patch[get_section_id(section_id)] = wrap_section(section_id, html)
+
+        self.last_sections = sections
+        self.last_table_rows = table_rows
+        return overlay_html, patch
+
+    @profiler.timed("helper_table.render")
+    def generate_overlay_model(self, main_info, command_info):
+        """Returns (model, delta) for building the overlay in the browser, see setup_helper_page.
+        The model has the HTML of every section except the table. The table is sent as its header and rows of cells,
+        each cell being the index of its look (opening and closing td tag) and its value.
+        The delta has the sections and rows that changed since the last call and the looks that are new.
+        It is None when the layout changed and the whole model has to be shown."""
+        if self.looks is None:
+            self.looks = []
+            self.look_indices = {}
+        new_looks = {}
+
+        def get_look_index(look):
+            index = self.look_indices.get(look)
+            if index is None:
+                index = self.look_indices[look] = len(self.looks)
+                style, bold, color, background, title, percent = look
+                self.looks.append([get_td_open(style, bold, color, background, title), "%</td>" if percent else "</td>"])
+                new_looks[index] = self.looks[index]
+            return index
+
+        sections = self.generate_sections(main_info, command_info, render_table=False)
+        table = self.generate_table_model(command_info, main_info)
+        rows = {}
+        if table is not None:
+            for row_id, row_model in table[1]:
+                tr_attributes, cells = row_model
+                rows[row_id] = (row_model, [tr_attributes, [[get_look_index(look), value] for look, value in cells]])
+
+        model = {
+            'sections': sections,
+            'looks': list(self.looks),
+            'table': None if table is None else {
+                'header': table[0],
+                'rows': [[row_id, row[1][0], row[1][1]] for row_id, row in rows.items()],
+            },
+        }
+
+        delta = None
+        last_model = self.last_model
+        if last_model is not None:
+            last_sections, last_header, last_rows = last_model
+            same_table = (table is None and last_header is None) or (table is not None and table[0] == last_header and list(rows) == list(last_rows))
+            if same_table and [section[0] for section in sections] == [section[0] for section in last_sections]:
+                delta = {
+                    'sections': {section_id: html for (section_id, html), (_, last_html) in zip(sections, last_sections) if html != last_html},
+                    'looks': new_looks,
+                    'rows': {row_id: row[1] for row_id, row in rows.items() if row[0] != last_rows[row_id][0]},
+                }
+
+        self.last_model = (sections, None if table is None else table[0], rows)
+        return model, delta
+
+    def generate_table_model(self, command_info, main_info):
+        """Returns (header HTML, [(row id, (tr attributes, [(look, value), ...])), ...]), or None if there is no table."""
+        if not command_info:
+            return None
+        table_header = self.get_table_header(command_info, main_info)
+        metrics = DerivedMetrics(command_info)
+
+        rows = []
+        for i, row in enumerate(self.initialized_rows):
+            if not row.disabled:
+                try:
+                    row_model = row.to_cached_model(command_info, metrics)
+                except KeyError as e:
+                    logger.error(f"Error generating table row: {e}\n{traceback.format_exc()}")
+                    continue
+                if row_model is not None:
+                    rows.append((f"ul-row-{i}", row_model))
+        return table_header, rows
 
     def generate_progress_bar(self, main_info):
+        scenario_id = main_info['scenario_id']
+        bar_template, turn_len = self.get_compiled(("progress-bar", scenario_id), lambda: self.compile_progress_bar(scenario_id))
+        dark_start = main_info['turn'] * turn_len
+        return bar_template(dark_start=dark_start, dark_width=100 - dark_start)
 
+    def compile_progress_bar(self, scenario_id):
+        """Builds the progress bar with everything except the darkened part filled in."""
         sections = constants.DEFAULT_TRAINING_SECTIONS
 
-        if main_info['scenario_id'] == 6:
+        if scenario_id == 6:
             sections = constants.DEFAULT_ARC_SECTIONS
 
-        if main_info['scenario_id'] == 13:
+        if scenario_id == 13:
             sections = constants.DEFAULT_DREAMS_SECTIONS
 
         tot_turns = sections[-1][0] - 1
@@ -277,10 +668,9 @@ class Preset():
 
             start_dist = end_dist
         
-        rects = ''.join(rects)
+        rects = escape_template(''.join(rects))
 
-        dark_start = main_info['turn'] * turn_len
-        dark_rect = f"""<rect x="{dark_start}" y="0" width="{100 - dark_start}" height="2" fill="rgba(0, 0, 0, 0.6)" mask="url(#mask)" />"""
+        dark_rect = """<rect x="{dark_start}" y="0" width="{dark_width}" height="2" fill="rgba(0, 0, 0, 0.6)" mask="url(#mask)" />"""
 
 
         bar_svg = f"""
@@ -296,7 +686,7 @@ class Preset():
 
         bar_div = f"<div id=\"progress-bar-container\" style=\"width: 100%; padding: 0 1rem; display:flex; align-items: center; justify-content: center; gap: 0.5rem;\"><p style=\"white-space: nowrap; margin: 0;\">Progress: </p>{bar_svg}</div>"
 
-        return bar_div
+        return Template(bar_div), turn_len
     
     def generate_energy(self, main_info):
         return f"<div id=\"energy\"><b>Energy:</b> {main_info['energy']}/{main_info['max_energy']}</div>"
@@ -307,10 +697,7 @@ class Preset():
     def generate_fans(self, main_info):
         return f"<div id=\"fans\"><b>Fans:</b> {main_info['fans']:,}</div>"
     
-    def generate_table(self, command_info, main_info):
-        if not command_info:
-            return ""
-        
+    def compile_table_header(self, command_info, main_info):
         headers = [TABLE_HEADERS['fac']]
         if main_info['scenario_id'] == 7:
             headers = [f"""<th style="text-overflow: clip;white-space: nowrap;overflow: hidden;">{header}</th>""" for header in headers]
@@ -329,25 +716,51 @@ class Preset():
 
 
         table_header = ''.join(headers)
-        table = [f"<tr>{table_header}</tr>"]
+        return f"<tr>{table_header}</tr>"
+
+    def get_table_header(self, command_info, main_info):
+        if main_info['scenario_id'] == 7:
+            header_key = ("table-header", 7, tuple(list(main_info['all_commands'].keys())[:5]))
+        else:
+            header_key = ("table-header", tuple(command_info))
+        return self.get_compiled(header_key, lambda: self.compile_table_header(command_info, main_info))
+
+    def generate_table(self, command_info, main_info):
+        self.last_generated_rows = None
+        if not command_info:
+            return ""
 
-        for row in self.initialized_rows:
+        table = [self.get_table_header(command_info, main_info)]
+        metrics = DerivedMetrics(command_info)
+
+        # Rows get an id so they can be replaced on their own. See generate_overlay_patch.
+        rows = []
+        for i, row in enumerate(self.initialized_rows):
             if not row.disabled:
                 try:
-                    table.append(row.to_tr(command_info))
+                    tr = row.to_cached_tr(command_info, metrics)
                 except KeyError as e:
                     logger.error(f"Error generating table row: {e}\n{traceback.format_exc()}")
                     continue
+                if not tr.startswith("<tr"):
+                    continue
+                row_id = f"ul-row-{i}"
+                tr = f"<tr id=\"{row_id}\"{tr[3:]}"
+                rows.append((row_id, tr))
+                table.append(tr)
+
+        self.last_generated_rows = (table[0], rows)
 
         thead = f"<thead>{table[0]}</thead>"
         tbody = f"<tbody>{''.join(table[1:])}</tbody>"
         return f"<table id=\"training-table\">{thead}{tbody}</table>"
 
     def generate_bonds(self, main_info, display_type):
-        eval_dict = main_info['eval_dict']
+        partner_table = main_info['partner_table']
+        starting_bonds = partner_table.starting_bond.tolist()
         ids = []
-        for key in eval_dict.keys():
-            if self.settings.hide_support_bonds.value and eval_dict[key].starting_bond == 100:
+        for key, slot in partner_table.slots.items():
+            if self.settings.hide_support_bonds.value and starting_bonds[slot] == 100:
                 continue
 
             if key < 100:
@@ -360,42 +773,30 @@ class Preset():
     
         ids = sorted(ids)
 
-        partners = []
+        out = []
 
         for id in ids:
-            partner = eval_dict[id]
+            slot = partner_table.slots[id]
+            starting_bond = starting_bonds[slot]
 
             bond_color = ""
             for cutoff, color in constants.BOND_COLOR_DICT.items():
-                if partner.starting_bond < cutoff:
+                if starting_bond < cutoff:
                     break
                 bond_color = color
 
-            img = f"<img src=\"{partner.img}\" width=\"56\" height=\"56\" style=\"display:inline-block;\"/>"
-            hint_icon = """<div style="position:absolute;right:0px;width:20px;height:20px;border-radius:50%;background:linear-gradient(135deg,#ff6b8f,#ff3b6f);color:#fff;font-weight:700;font-size:14px;line-height:20px;text-align:center;box-shadow:0 1px 3px rgba(0,0,0,.3);z-index:10;pointer-events:none;transform: rotate(20deg);">!</div>"""
-            bond_ele = ""
+            BOND_PARTNER_OPEN_TEMPLATE.render(out, img=partner_table.imgs[slot])
+            if id in main_info['hint_partners']:
+                out.append(BOND_HINT_ICON)
             if display_type in (2, 3):
                 # Bars
-                bond_ele += f"""
-<div style="width: 100%;height: 0.75rem;position: relative;background-color: #4A494B;border-radius: 0.5rem;">
-    <div style="position: absolute;width:calc(100% - 4px);height:calc(100% - 4px);top:2px;left:50%;transform: translateX(-50%);">
-        <div style="position: absolute;width:100%;height:100%;background-color:#6E6B79;border-radius: 1rem;"></div>
-        <div style="position: absolute;width:{partner.starting_bond}%;height:100%;background-color:{bond_color};"></div>
-        <div style="position: absolute;width:2px;height:100%;background-color:#4A494B;top:0px;left:20%;transform: translateX(-50%);"></div>
-        <div style="position: absolute;width:2px;height:100%;background-color:#4A494B;top:0px;left:40%;transform: translateX(-50%);"></div>
-        <div style="position: absolute;width:2px;height:100%;background-color:#4A494B;top:0px;left:60%;transform: translateX(-50%);"></div>
-        <div style="position: absolute;width:2px;height:100%;background-color:#4A494B;top:0px;left:80%;transform: translateX(-50%);"></div>
-        <div style="position: absolute;width:100%;height:100%;border: 2px solid #4A494B;box-sizing: content-box;left: -2px;top: -2px;border-radius: 1rem;"></div>
-    </div>
-</div>""".replace("\n", "").replace("    ", "")
+                BOND_BAR_TEMPLATE.render(out, starting_bond=starting_bond, bond_color=bond_color)
             if display_type in (1, 3):
                 # Numbers
-                bond_ele += f"<p style=\"margin:0;padding:0;color:{bond_color};font-weight:bold;\">{partner.starting_bond}</p>"
-            
-            ele = f"<div style=\"position:relative;display:flex;flex-direction:column;align-items:center;gap:0.2rem;\">{img}{hint_icon if id in main_info['hint_partners'] else ''}{bond_ele}</div>"
-            partners.append(ele)
+                BOND_NUMBER_TEMPLATE.render(out, starting_bond=starting_bond, bond_color=bond_color)
+            out.append("</div>")
         
-        inner = ''.join(partners)
+        inner = ''.join(out)
 
         return f"<div id=\"support-bonds\" style=\"max-width: 100vw; display: flex; flex-direction: row; flex-wrap: nowrap; overflow-x: auto; gap:0.3rem; scrollbar-width: none;\">{inner}</div>"
 
@@ -632,8 +1033,6 @@ class Preset():
             return ""
 
         mant_imgs = util.get_mant_image_dict()
-        items_html = ""
-        inv_html = ""
 
         # Build inventory lookup: item_id -> count owned
         inventory = {inv['item_id']: inv['num'] for inv in main_info.get('user_item_info_array', [])}
@@ -650,139 +1049,61 @@ class Preset():
             races_left = 2
         elif main_info['turn'] >= 73:
             races_left = 3
-        #Inventory
-        for item in main_info.get('user_item_info_array', []):
-            item_id = item['item_id']
+
+        def render_item_open(out, item_id):
             icon_src = mant_imgs.get(f'scenario_free_item_icon_{item_id:05}', '')
             description = constants.MANT_ITEM_ID_TO_DESCRIPTION.get(item_id, '')
-            modifier = constants.MANT_ITEM_ID_TO_MODIFIER.get(item_id, '')
+            highlight = num_hammers >= races_left and (item_id == 11001 or item_id == 11002)
+            MANT_ITEM_OPEN_TEMPLATE.render(out, description=description, icon_src=icon_src, highlight=MANT_HAMMER_HIGHLIGHT if highlight else "")
 
+        def render_modifier(out, item_id):
             # Modifier label for shared-icon items (megaphones, cleat hammers)
-            modifier_label = ""
+            modifier = constants.MANT_ITEM_ID_TO_MODIFIER.get(item_id, '')
             if modifier:
-                modifier_label = (
-                    f'<div style="position:absolute;bottom:10px;left:50%;transform:translateX(-50%);'
-                    f'background:rgba(0,0,0,0.75);color:#ffd700;font-size:0.5rem;font-weight:700;'
-                    f'padding:0 2px;border-radius:3px;white-space:nowrap;z-index:2;line-height:1.2;">'
-                    f'{modifier}</div>'
-                )
+                MANT_MODIFIER_TEMPLATE.render(out, modifier=modifier)
+
+        out = [MANT_ROW_OPEN]
 
+        #Inventory
+        for item in main_info.get('user_item_info_array', []):
+            item_id = item['item_id']
+            render_item_open(out, item_id)
+            render_modifier(out, item_id)
             # Owned count badge
-            owned_count = inventory.get(item_id, 0)
-            owned_badge = (
-                f'<div style="position:absolute;bottom:-2px;left:50%;transform:translateX(-50%);'
-                f'background:rgba(0,0,0,0.7);color:#7bed9f;font-size:0.55rem;font-weight:700;'
-                f'padding:0 3px;border-radius:4px;white-space:nowrap;z-index:2;line-height:1.2;">'
-                f'x{owned_count}</div>'
-            )
-
-            inv_html += (
-                f'<div title="{description}" style="position:relative;flex:0 0 auto;'
-                f'width:36px;height:36px;cursor:default;">'
-                f'<img src="{icon_src}" width="32" height="32" '
-                f'style="position:absolute;top:50%;left:50%;transform:translate(-50%,-50%);'
-                f'{"box-shadow: 0px 0px 10px 7px rgba(255,0,0,0.65); border-radius:4px;\"/>" if num_hammers >= races_left and (item_id == 11001 or item_id == 11002) else "\"/>"}'
-                f'{modifier_label}{owned_badge}'
-                f'</div>'
-            )
+            MANT_OWNED_TEMPLATE.render(out, owned_count=inventory.get(item_id, 0))
+            out.append("</div>")
+
+        out.append("</div>")
+        out.append(MANT_ROW_OPEN)
+
+        # Coin badge at the end
+        sale_val = main_info.get('sale_value', 0)
+        MANT_COIN_TEMPLATE.render(out, coin_src=mant_imgs.get('coin', ''), coin_count=main_info['coin_num'])
+        if sale_val > 0:
+            MANT_SALE_TEMPLATE.render(out, sale_val=sale_val)
+        out.append("</div>")
 
         #Shop
         for item in reversed(main_info['pick_up_item_info_array']):
             if item['item_buy_num'] == item['limit_buy_count']:
                 # Sold out
                 continue
-            item_id = item['item_id']
-            icon_src = mant_imgs.get(f'scenario_free_item_icon_{item_id:05}', '')
-            description = constants.MANT_ITEM_ID_TO_DESCRIPTION.get(item_id, '')
-            modifier = constants.MANT_ITEM_ID_TO_MODIFIER.get(item_id, '')
+            render_item_open(out, item['item_id'])
 
             # Turns left badge
             turns_left = self._get_mant_turns_left(item, main_info['turn'])
             turn_color = '#e74c3c' if turns_left == 1 else '#e67e22' if turns_left <= 2 else '#888'
-            turns_badge = (
-                f'<div style="position:absolute;top:-2px;right:-2px;'
-                f'background:{turn_color};color:#fff;font-size:0.6rem;font-weight:700;'
-                f'min-width:14px;height:14px;line-height:14px;text-align:center;'
-                f'border-radius:7px;padding:0 2px;z-index:2;">'
-                f'{turns_left}</div>'
-            )
+            MANT_TURNS_TEMPLATE.render(out, turn_color=turn_color, turns_left=turns_left)
 
             # Coin cost badge
             can_afford = main_info['coin_num'] >= item['coin_num']
-            cost_color = '#ccc' if can_afford else '#e74c3c'
-            coin_badge = (
-                f'<div style="position:absolute;bottom:-2px;left:50%;transform:translateX(-50%);'
-                f'background:rgba(0,0,0,0.7);color:{cost_color};font-size:0.55rem;font-weight:700;'
-                f'padding:0 3px;border-radius:4px;white-space:nowrap;z-index:2;line-height:1.2;">'
-                f'{item["coin_num"]}</div>'
-            )
+            MANT_COST_TEMPLATE.render(out, cost_color='#ccc' if can_afford else '#e74c3c', coin_num=item['coin_num'])
 
-            # Modifier label for shared-icon items (megaphones, cleat hammers)
-            modifier_label = ""
-            if modifier:
-                modifier_label = (
-                    f'<div style="position:absolute;bottom:10px;left:50%;transform:translateX(-50%);'
-                    f'background:rgba(0,0,0,0.75);color:#ffd700;font-size:0.5rem;font-weight:700;'
-                    f'padding:0 2px;border-radius:3px;white-space:nowrap;z-index:2;line-height:1.2;">'
-                    f'{modifier}</div>'
-                )
-
-            # Owned count badge
-            owned_badge = ""
-            # owned_count = inventory.get(item_id, 0)
-            # if owned_count > 0:
-            #     owned_badge = (
-            #         f'<div style="position:absolute;top:-2px;left:-2px;'
-            #         f'background:rgba(0,0,0,0.7);color:#7bed9f;font-size:0.55rem;font-weight:700;'
-            #         f'padding:0 3px;border-radius:4px;white-space:nowrap;z-index:2;line-height:1.2;">'
-            #         f'+{owned_count}</div>'
-            #     )
-
-            items_html += (
-                f'<div title="{description}" style="position:relative;flex:0 0 auto;'
-                f'width:36px;height:36px;cursor:default;">'
-                f'<img src="{icon_src}" width="32" height="32" '
-                f'style="position:absolute;top:50%;left:50%;transform:translate(-50%,-50%);'
-                f'{"box-shadow: 0px 0px 10px 7px rgba(255,0,0,0.65); border-radius:4px;\"/>" if num_hammers >= races_left and (item_id == 11001 or item_id == 11002) else "\"/>"}'
-                f'{turns_badge}{coin_badge}{modifier_label}{owned_badge}'
-                f'</div>'
-            )
+            render_modifier(out, item['item_id'])
+            out.append("</div>")
 
-        # Coin badge at the end
-        coin_src = mant_imgs.get('coin', '')
-        coin_count = main_info['coin_num']
-        sale_indicator = ""
-        sale_val = main_info.get('sale_value', 0)
-        if sale_val > 0:
-            sale_indicator = (
-                f'<div style="position:absolute;top:-4px;right:-6px;'
-                'background:linear-gradient(135deg,#ff6b8f,#ff3b6f);'
-                'color:#fff;font-weight:700;font-size:0.5rem;line-height:1;'
-                'padding:2px 3px;border-radius:4px;'
-                'box-shadow:0 1px 3px rgba(0,0,0,.3);z-index:10;'
-                f'pointer-events:none;white-space:nowrap;">{sale_val}%</div>'
-            )
-        coin_badge_html = (
-            f'<div style="position:relative;flex:0 0 auto;'
-            f'width:36px;height:36px;cursor:default;">'
-            f'<img src="{coin_src}" width="32" height="32" '
-            f'style="position:absolute;top:50%;left:50%;transform:translate(-50%,-50%);"/>'
-            f'<div style="position:absolute;bottom:-2px;left:50%;transform:translateX(-50%);'
-            f'background:rgba(0,0,0,0.7);color:#ffd700;font-size:0.6rem;font-weight:700;'
-            f'padding:0 3px;border-radius:4px;white-space:nowrap;z-index:2;line-height:1.2;">'
-            f'{coin_count}</div>'
-            f'{sale_indicator}'
-            f'</div>'
-        )
-
-        return (
-            f'<div style="display:flex;flex-wrap:wrap;justify-content:center;'
-            f'gap:0.4rem;width:100%;padding:0.2rem 0;">'
-            f'{inv_html}</div>'
-            f'<div style="display:flex;flex-wrap:wrap;justify-content:center;'
-            f'gap:0.4rem;width:100%;padding:0.2rem 0;">'
-            f'{coin_badge_html}{items_html}</div>'
-        )
+        out.append("</div>")
+        return ''.join(out)
 
     def generate_mant_races_div(self, main_info):
         if main_info['turn'] <= 12 or main_info['turn'] >= 73:
@@ -802,19 +1123,18 @@ class Preset():
                 logger.error(f"Race grade not found for program id {program_id}")
             if race_grade == 800 or race_grade == 700 or race_grade == 400: # Debut/OP/Pre-OP, ignore
                 continue
-            race_img_url = "https://gametora.com/images/umamusume/race_ribbons/utx_txt_grade_ribbon_"
             if race_grade == 700:
-                race_img_url += "06.png" # Pre-OP
+                race_img_url = image_cache.get_race_ribbon_url("06") # Pre-OP
             elif race_grade == 400:
-                race_img_url += "02.png" # OP
+                race_img_url = image_cache.get_race_ribbon_url("02") # OP
             elif race_grade == 300:
-                race_img_url += "03.png" # G3
+                race_img_url = image_cache.get_race_ribbon_url("03") # G3
             elif race_grade == 200:
-                race_img_url += "04.png" # G2
+                race_img_url = image_cache.get_race_ribbon_url("04") # G2
             elif race_grade == 100:
-                race_img_url += "05.png" # G1
+                race_img_url = image_cache.get_race_ribbon_url("05") # G1
             else:
-                race_img_url += "07.png" # EX
+                race_img_url = image_cache.get_race_ribbon_url("07") # EX
             # race_img_url = self.get_thumb_url(program_id)
             races_div += "<tr>"
             races_div += f"<td><img src=\"{race_img_url}\" width=\"51\" height=\"18.5\" style=\"vertical-align:middle;\"/></td>"
@@ -920,8 +1240,7 @@ class Preset():
             util.show_warning_box(f"Could not get program data for program_id {program_id}")
             return None
 
-        thumb_url = f"https://gametora.com/images/umamusume/{'en/' if 'IS_UL_GLOBAL' in os.environ else ''}race_banners/thum_race_rt_000_{str(program_data['race_instance_id'])[:4]}_00.png"
-        return thumb_url
+        return image_cache.get_race_banner_url(program_data['race_instance_id'])
 
     def to_dict(self):
         return {
@@ -22,6 +22,7 @@ from selenium.webdriver.edge.service import Service as EdgeService
 from selenium.webdriver.chrome.service import Service as ChromeService
 from selenium.common.exceptions import NoSuchWindowException
 import util
+import profiler
 import socket
 
 OLD_DRIVERS = []
@@ -156,6 +157,8 @@ class BrowserWindow:
         self.run_at_launch = run_at_launch
         self.browser_name = "Auto"
         self.latest_error = ""
+        # CarrotJuicer drives the browser from more than one thread.
+        self.lock = threading.RLock()
         
         self.ensure_tab_open()
 
@@ -275,11 +278,12 @@ class BrowserWindow:
         def wrapper(self, *args, **kwargs):
             tries = 0
 
-            while tries < 3:
-                tries += 1
-                self.ensure_tab_open()
-                if self.driver:
-                    return func(self, *args, **kwargs)
+            with self.lock:
+                while tries < 3:
+                    tries += 1
+                    self.ensure_tab_open()
+                    if self.driver:
+                        return func(self, *args, **kwargs)
 
             util.show_warning_box("Uma Launcher: Unable to reach browser.", f"Webbrowser is unable to open.<br><br>If this problem persists, try restarting your computer<br>or selecting a different browser in the preferences.<br><br>Extra info:<br>{self.latest_error}")
         return wrapper
@@ -334,7 +338,8 @@ class BrowserWindow:
 
     @ensure_focus
     def execute_script(self, *args, **kwargs):
-        return self.driver.execute_script(*args, **kwargs)
+        with profiler.span("browser.execute_script"):
+            return self.driver.execute_script(*args, **kwargs)
 
     @ensure_focus
     def set_window_rect(self, rect):
@@ -0,0 +1,127 @@
+import os
+import re
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from loguru import logger
+import util
+import mdb
+
+GAMETORA_IMAGE_URL = "https://gametora.com/images/umamusume/"
+# Served by umaserver from the image cache.
+PROXY_IMAGE_URL = "http://127.0.0.1:3150/gametora/"
+IMAGE_CACHE_FOLDER = "image_cache"
+
+# Only these images are proxied, so the server cannot be used to fetch anything else.
+ALLOWED_PATH = re.compile(r"(en/)?(characters/icons|race_banners|race_ribbons)/[\w-]+\.png")
+
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = 10
+# Failed images are not requested again for a while.
+RETRY_DELAY = 60 * 5
+
+
+def get_url(image_path):
+    """Returns the overlay URL of a GameTora image, relative to images/umamusume/."""
+    return PROXY_IMAGE_URL + image_path
+
+def get_chara_icon_url(chara_id):
+    return get_url(f"characters/icons/chr_icon_{chara_id}.png")
+
+def get_race_banner_url(race_instance_id):
+    return get_url(f"{'en/' if 'IS_UL_GLOBAL' in os.environ else ''}race_banners/thum_race_rt_000_{str(race_instance_id)[:4]}_00.png")
+
+def get_race_ribbon_url(ribbon):
+    return get_url(f"race_ribbons/utx_txt_grade_ribbon_{ribbon}.png")
+
+
+class ImageCache():
+    """GameTora images stored on disk. Missing images are downloaded by a small pool of threads.
+    Requests for an image that is already being downloaded wait for the same download."""
+
+    def __init__(self, folder, base_url=GAMETORA_IMAGE_URL, workers=DOWNLOAD_WORKERS):
+        self.folder = folder
+        self.base_url = base_url
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ImageCache")
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.downloads = {}  # image path -> Future
+        self.failed = {}  # image path -> time of the failure
+
+    def get_file_path(self, image_path):
+        return os.path.join(self.folder, *image_path.split("/"))
+
+    def fetch(self, image_path):
+        """Returns a Future of the file path of the image, or None if it is on disk already."""
+        file_path = self.get_file_path(image_path)
+        if os.path.exists(file_path):
+            return None
+        with self.lock:
+            future = self.downloads.get(image_path)
+            if future is None:
+                future = self.downloads[image_path] = self.executor.submit(self.download, image_path, file_path)
+            return future
+
+    def download(self, image_path, file_path):
+        try:
+            failed_time = self.failed.get(image_path)
+            if failed_time is not None and time.time() - failed_time < RETRY_DELAY:
+                return None
+            try:
+                response = self.session.get(self.base_url + image_path, timeout=DOWNLOAD_TIMEOUT)
+                response.raise_for_status()
+            except requests.RequestException:
+                logger.warning(f"Could not download {image_path}: {traceback.format_exc()}")
+                self.failed[image_path] = time.time()
+                return None
+
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(response.content)
+            os.replace(tmp_path, file_path)
+            self.failed.pop(image_path, None)
+            logger.debug(f"Downloaded {image_path}")
+            return file_path
+        except OSError:
+            logger.warning(f"Could not store {image_path}: {traceback.format_exc()}")
+            return None
+        finally:
+            with self.lock:
+                self.downloads.pop(image_path, None)
+
+    def get(self, image_path, timeout=DOWNLOAD_TIMEOUT):
+        """Returns the file path of the image, downloading it first if needed. Returns None if it could not be downloaded in time."""
+        future = self.fetch(image_path)
+        if future is None:
+            return self.get_file_path(image_path)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            return None
+
+    def prefetch(self, image_paths):
+        """Starts downloading the images that are not on disk yet."""
+        for image_path in image_paths:
+            self.fetch(image_path)
+
+
+IMAGE_CACHE = None
+def get_image_cache():
+    global IMAGE_CACHE
+    if IMAGE_CACHE is None:
+        IMAGE_CACHE = ImageCache(util.get_appdata(IMAGE_CACHE_FOLDER))
+    return IMAGE_CACHE
+
+
+def prefetch_deck_icons(chara_info):
+    """Warms the cache with the icons of the trainee and the support cards of a run."""
+    chara_ids = {chara_info['card_id'] // 100}
+    support_card_dict = mdb.get_support_card_dict()
+    for support_card in chara_info.get('support_card_array', []):
+        support_data = support_card_dict.get(support_card['support_card_id'])
+        if support_data:
+            chara_ids.add(support_data[3])
+    get_image_cache().prefetch(f"characters/icons/chr_icon_{chara_id}.png" for chara_id in chara_ids)
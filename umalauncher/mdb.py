@@ -1,11 +1,18 @@
 import sqlite3
 import os
+import sys
+import hashlib
+import pickle
+import time
+import threading
 import traceback
+from array import array
 
 from loguru import logger
 import util
 import constants
 import gui
+import profiler
 
 DB_PATH = None
 def get_db_path():
@@ -44,27 +51,168 @@ def get_db_path():
     return DB_PATH
 
 
-def update_mdb_cache():
-    logger.info("Reloading cached dicts.")
+MDB_SOURCE = "master.mdb"
+# umapyoi.net can publish names between game updates, so it is asked every time.
+# The requests are conditional, so an unchanged response only costs a 304.
+UMAPYOI_SOURCE = "umapyoi.net"
+SOURCE_STATES = {}
+UPDATE_LOCK = threading.Lock()
+
+def get_source_state(source):
+    """Returns something that changes whenever the given source changes.
+    A source is master.mdb, umapyoi.net or an asset folder."""
+    if source == MDB_SOURCE:
+        return get_mdb_fingerprint()
+    if source == UMAPYOI_SOURCE:
+        return None
+    try:
+        folder = util.get_asset(source)
+        mtimes = [entry.stat().st_mtime_ns for entry in os.scandir(folder)]
+        return (os.stat(folder).st_mtime_ns, len(mtimes), max(mtimes, default=0))
+    except OSError:
+        return None
+
+def refresh_cached_dicts(update_funcs):
+    with UPDATE_LOCK:
+        sources = {source for _, source in update_funcs}
+        states = {source: get_source_state(source) for source in sources}
+        changed = {source for source in sources if source == UMAPYOI_SOURCE or source not in SOURCE_STATES or SOURCE_STATES[source] != states[source]}
+        if not changed:
+            return
+
+        start_time = time.perf_counter()
+        funcs = [func for func, source in update_funcs if source in changed]
+        for func in funcs:
+            func(force=True)
+        SOURCE_STATES.update({source: states[source] for source in changed})
+        logger.info(f"Reloaded {len(funcs)} cached dicts for changed sources {sorted(changed)} in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+def update_mdb_cache(background=True):
+    """Reloads the cached dicts whose source changed since the last update.
+    The master data is brought up to date right away. Everything else
+    (umapyoi.net names, asset images) is refreshed in a background thread unless background is False."""
+    get_master_data(force=True)
+
     all_update_funcs = UPDATE_FUNCS + util.UPDATE_FUNCS
-    for func in all_update_funcs:
-        func(force=True)
+    if background:
+        threading.Thread(target=refresh_cached_dicts, args=(all_update_funcs,), daemon=True).start()
+    else:
+        refresh_cached_dicts(all_update_funcs)
+
+class ConnectionPool():
+    """Keeps one read-only connection per thread open between queries.
+    Connections are reopened when master.mdb changes and closed once idle
+    so the game is free to replace the file when it updates."""
+
+    IDLE_TIMEOUT = 30
+    CACHED_STATEMENTS = 256
+    MMAP_SIZE = 256 * 1024 * 1024
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = {}  # thread id -> [conn, fingerprint, users, last_used]
+        self.reaper = None
+
+    def get_fingerprint(self, db_path):
+        try:
+            stat = os.stat(db_path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def open(self, db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False, cached_statements=self.CACHED_STATEMENTS)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {self.MMAP_SIZE}")
+        return conn
+
+    def acquire(self):
+        db_path = get_db_path()
+        if db_path is None:
+            raise sqlite3.OperationalError("Database path could not be determined.")
+        fingerprint = self.get_fingerprint(db_path)
+        thread_id = threading.get_ident()
+
+        with self.lock:
+            entry = self.connections.get(thread_id)
+            if entry and entry[2] == 0 and entry[1] != fingerprint:
+                logger.debug("master.mdb changed, reopening connection.")
+                entry[0].close()
+                entry = None
+            if entry is None:
+                entry = [None, fingerprint, 0, 0]
+                self.connections[thread_id] = entry
+            entry[2] += 1
+
+        if entry[0] is None:
+            try:
+                entry[0] = self.open(db_path)
+            except sqlite3.OperationalError:
+                with self.lock:
+                    del self.connections[thread_id]
+                raise
+            self.start_reaper()
+        return entry[0]
+
+    def release(self):
+        with self.lock:
+            entry = self.connections.get(threading.get_ident())
+            if entry:
+                entry[2] -= 1
+                entry[3] = time.monotonic()
+
+    def close_idle(self, max_idle):
+        with self.lock:
+            self._close_idle(max_idle)
+
+    def _close_idle(self, max_idle):
+        # Called with self.lock held.
+        now = time.monotonic()
+        for thread_id, entry in list(self.connections.items()):
+            if entry[2] == 0 and now - entry[3] >= max_idle:
+                entry[0].close()
+                del self.connections[thread_id]
+
+    def close_all(self):
+        self.close_idle(0)
+
+    def start_reaper(self):
+        with self.lock:
+            if self.reaper is not None:
+                return
+            self.reaper = threading.Thread(target=self.run_reaper, daemon=True)
+            self.reaper.start()
+
+    def run_reaper(self):
+        while True:
+            time.sleep(self.IDLE_TIMEOUT / 2)
+            with self.lock:
+                self._close_idle(self.IDLE_TIMEOUT)
+                # Decided under the lock: a connection opened after this starts a new reaper,
+                # one opened before it keeps this one running.
+                if not self.connections:
+                    self.reaper = None
+                    return
+
+POOL = ConnectionPool()
 
 class Connection():
     def __init__(self):
+        self.conn = None
+        self.span = profiler.span("mdb.query")
         try:
-            db_path = get_db_path()
-            if db_path is None:
-                raise sqlite3.OperationalError("Database path could not be determined.")
-            self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            self.conn = POOL.acquire()
         except sqlite3.OperationalError:
             util.show_error_box_no_report("Connection Error", "Could not connect to the game database.<br>Try restarting Uma Launcher after the game updates.<br>Uma Launcher will now close.")
             if gui.THREADER:
                 gui.THREADER.stop()
     def __enter__(self):
+        self.span.__enter__()
         return self.conn, self.conn.cursor()
     def __exit__(self, type, value, traceback):
-        self.conn.close()
+        self.span.__exit__(type, value, traceback)
+        if self.conn is not None:
+            POOL.release()
         
         if type is not None:
             logger.error(f"Error: {type} {value}")
@@ -81,81 +229,374 @@ def rows_to_dict(rows, columns, keep_newline=False):
     return [{columns[i]: data if not isinstance(data, str) or keep_newline else data.replace("\\n", "") for i, data in enumerate(row)} for row in rows]
 
 
+class MasterData():
+    """Snapshot of every master.mdb table the launcher needs, loaded in one pass.
+    All lookups are answered from here without touching the database."""
+
+    TEXT_CATEGORIES = (5, 14, 16, 28, 47, 142, 170, 181, 209, 225)
+
+    def __init__(self):
+        # Dicts handed out by the get_*_dict functions. A snapshot is not changed once it is in use:
+        # a reload builds a new one and replaces MASTER_DATA with it.
+        self.event_title_dict = {}
+        self.race_program_name_dict = {}
+        self.skill_name_dict = {}
+        self.skill_hint_name_dict = {}
+        self.status_name_dict = {}
+        self.outfit_name_dict = {}
+        self.support_card_dict = {}
+        self.chara_name_dict = {}
+        self.race_name_dict = {}
+        self.race_distance_dict = {}
+        self.race_surface_dict = {}
+        self.mant_item_string_dict = {}
+        self.gl_lesson_dict = {}
+        self.group_card_effect_ids = []
+        self.program_id_dict = {}
+        self.skill_id_dict = {}
+        self.scouting_score_to_rank_dict = {}
+        self.single_mode_unique_chara_dict = {}
+
+        # Indexes for the per-packet lookups.
+        self.text = {}                  # category -> {index: text}
+        self.short_story_ids = {}       # short_story_id -> story_id
+        self.story_dress_icons = {}     # (story_id, card_id) -> event_title_dress_icon
+        self.dress_icon_stories = {}    # event_title_dress_icon -> story ids ordered by id
+        self.skill_groups = {}          # (group_id, rarity) -> array of skill ids with group_rate > 0, ordered by group_rate
+        self.skill_disp_order = {}      # skill id -> disp_order
+        self.program_grade = {}         # program id -> grade
+        self.card_skills = {}           # card id -> [(need_rank, skill_id)]
+        self.total_minigame_plushies = 0
+        self.uaf_required_rank_for_turn = None
+        self.uaf_training_effects = None
+        self.cooking_success_odds = []  # [(power_min, power_max, success_rate)]
+        self.cooking_power_data = []    # [(turn_num, success_num, great_success_num)]
+        self.cooking_vegetable_max = {} # (facility_id, facility_lv) -> max count
+
+        self.fingerprint = None
+
+    def fetch(self, cursor, query):
+        try:
+            cursor.execute(query)
+            return cursor.fetchall()
+        except sqlite3.OperationalError as e:
+            logger.error(f"MasterData query failed: {e}\n{traceback.format_exc()}")
+            return None
+
+    def load(self):
+        start_time = time.perf_counter()
+        with Connection() as (_, cursor):
+            self.load_text(cursor)
+            self.load_stories(cursor)
+            self.load_skills(cursor)
+            self.load_programs(cursor)
+            self.load_support_cards(cursor)
+            self.load_cards(cursor)
+            self.load_scenarios(cursor)
+        logger.info(f"Loaded master data in {(time.perf_counter() - start_time) * 1000:.0f} ms ({self.get_size() // 1024} KiB)")
+
+    def load_text(self, cursor):
+        rows = self.fetch(cursor, f"""SELECT category, "index", text FROM text_data WHERE category IN ({','.join(str(category) for category in self.TEXT_CATEGORIES)})""") or []
+        text = {category: {} for category in self.TEXT_CATEGORIES}
+        for category, index, value in rows:
+            text[category][index] = value
+        self.text = text
+
+        self.status_name_dict.update(text[142])
+        self.outfit_name_dict.update(text[5])
+        self.chara_name_dict.update(text[170])
+        self.mant_item_string_dict.update(text[225])
+
+    def load_stories(self, cursor):
+        event_titles = self.text[181]
+        rows = self.fetch(cursor, """SELECT story_id, short_story_id FROM single_mode_story_data ORDER BY id""") or []
+        out = {}
+        short_story_ids = {}
+        for story_id, short_story_id in rows:
+            if story_id in event_titles:
+                out[story_id] = event_titles[story_id]
+                if short_story_id != 0:
+                    out[short_story_id] = event_titles[story_id]
+            if short_story_id != 0:
+                short_story_ids.setdefault(short_story_id, story_id)
+        self.event_title_dict.update(out)
+        self.short_story_ids = short_story_ids
+
+        rows = self.fetch(cursor, """SELECT story_id, card_id, event_title_dress_icon FROM single_mode_story_data ORDER BY id""") or []
+        story_dress_icons = {}
+        dress_icon_stories = {}
+        for story_id, card_id, dress_icon in rows:
+            story_dress_icons.setdefault((story_id, card_id), dress_icon)
+            dress_icon_stories.setdefault(dress_icon, []).append(story_id)
+        self.story_dress_icons = story_dress_icons
+        self.dress_icon_stories = dress_icon_stories
+
+    def load_skills(self, cursor):
+        rows = self.fetch(cursor, """SELECT id, group_id, rarity, group_rate, disp_order FROM skill_data ORDER BY id""")
+        if rows is None:
+            util.show_error_box_no_report("Error","Failed to read the master.mdb file.<br>Try restarting Uma Launcher after the game updates.<br>Uma Launcher will now close.")
+            if gui.THREADER:
+                gui.THREADER.stop()
+            return
+
+        skill_names = self.text[47]
+        skill_hint_names = {}
+        for skill_id, group_id, rarity, _, _ in rows:
+            if skill_id in skill_names:
+                self.skill_name_dict[skill_id] = skill_names[skill_id]
+                skill_hint_names[(group_id, rarity)] = skill_names[skill_id]
+
+        skill_id_dict = {}
+        skill_groups = {}
+        for skill_id, group_id, rarity, group_rate, _ in sorted(rows, key=lambda row: -row[3]):
+            skill_key = (group_id, rarity)
+            if skill_key not in skill_id_dict:
+                skill_id_dict[skill_key] = skill_id
+            if group_rate > 0:
+                skill_groups.setdefault(skill_key, []).append((group_rate, skill_id))
+        self.skill_hint_name_dict.update(skill_hint_names)
+        self.skill_id_dict.update(skill_id_dict)
+        self.skill_groups = {key: array('i', (skill_id for _, skill_id in sorted(skills, key=lambda skill: skill[0]))) for key, skills in skill_groups.items()}
+        self.skill_disp_order = {row[0]: row[4] for row in rows}
+
+    def load_programs(self, cursor):
+        race_names = self.text[28]
+        rows = self.fetch(cursor, """SELECT * FROM single_mode_program""")
+        if rows:
+            columns = get_columns(cursor)
+            races = rows_to_dict(rows, columns)
+            self.program_id_dict.update({race["id"]: race for race in races})
+            for race in races:
+                if race["race_instance_id"] in race_names:
+                    self.race_program_name_dict[race["id"]] = race_names[race["race_instance_id"]]
+            self.race_name_dict.update(self.race_program_name_dict)
+
+        rows = self.fetch(cursor, """SELECT smp.id, r.grade, rcs.distance, rcs.ground FROM single_mode_program smp JOIN race_instance ri on smp.race_instance_id = ri.id JOIN race r on ri.race_id = r.id LEFT JOIN race_course_set rcs on r.course_set = rcs.id""") or []
+        self.program_grade = {row[0]: row[1] for row in rows}
+        self.race_distance_dict.update({row[0]: row[2] for row in rows if row[2] is not None})
+        self.race_surface_dict.update({row[0]: row[3] for row in rows if row[3] is not None})
+
+    def load_support_cards(self, cursor):
+        rows = self.fetch(cursor, """SELECT id, rarity, command_id, support_card_type, chara_id, effect_id FROM support_card_data""") or []
+        self.support_card_dict.update({row[0]: row[1:5] for row in rows})
+        group_card_effect_ids = [(row[0], row[5]) for row in rows if row[3] == 3]
+        if group_card_effect_ids:
+            self.group_card_effect_ids[:] = group_card_effect_ids  # Thanks StellatedCube
+
+    def load_cards(self, cursor):
+        rows = self.fetch(cursor, """SELECT cd.id, ass.need_rank, ass.skill_id FROM card_data cd JOIN available_skill_set ass ON cd.available_skill_set_id = ass.available_skill_set_id""") or []
+        card_skills = {}
+        for card_id, need_rank, skill_id in rows:
+            card_skills.setdefault(card_id, []).append((need_rank, skill_id))
+        self.card_skills = card_skills
+
+        rows = self.fetch(cursor, """SELECT chara_id FROM card_data c WHERE default_rarity != 0""") or []
+        self.total_minigame_plushies = 3 * (len(rows) + len({row[0] for row in rows}))
+
+    def load_scenarios(self, cursor):
+        gl_squares = self.text[209]
+        rows = self.fetch(cursor, """SELECT id, square_title_text_id, square_type FROM single_mode_live_square""") or []
+        self.gl_lesson_dict.update({row[0]: (gl_squares[row[1]], row[2]) for row in rows if row[1] in gl_squares})
+
+        rows = self.fetch(cursor, """SELECT team_min_value FROM team_building_rank""") or []
+        tmp_dict = {}
+        for i, row in enumerate(rows):
+            min_score = row[0]
+            try:
+                rank = constants.SCOUTING_RANK_LIST[i]
+            except IndexError:
+                rank = constants.SCOUTING_RANK_LIST[-1]
+            tmp_dict[min_score] = rank
+        self.scouting_score_to_rank_dict.update(tmp_dict)
+
+        rows = self.fetch(cursor, """SELECT scenario_id, partner_id, chara_id FROM single_mode_unique_chara""") or []
+        tmp_dict = {}
+        for row in rows:
+            if row[0] not in tmp_dict:
+                tmp_dict[row[0]] = {}
+            tmp_dict[row[0]][row[1]] = row[2]
+        self.single_mode_unique_chara_dict.update(tmp_dict)
+
+        self.uaf_required_rank_for_turn = self.fetch(cursor, """SELECT turn, win_sport_rank FROM single_mode_sport_competition""") or None
+        rows = self.fetch(cursor, """SELECT id, effect_value_2 FROM single_mode_sport_compe_effect""")
+        self.uaf_training_effects = {row[0]: row[1] for row in rows} if rows else None
+
+        self.cooking_success_odds = self.fetch(cursor, """SELECT power_min, power_max, success_rate FROM single_mode_cook_success_odds""") or []
+        self.cooking_power_data = self.fetch(cursor, """SELECT turn_num, success_num, great_success_num FROM single_mode_cook_power_data""") or []
+        rows = self.fetch(cursor, """SELECT l.facility_id, l.facility_lv, e.effect_value_2 FROM single_mode_cook_garden_effect e JOIN single_mode_cook_garden_level l on l.effect_group_id = e.effect_group_id WHERE e.effect_type == 110""") or []
+        cooking_vegetable_max = {}
+        for facility_id, facility_lv, max_count in rows:
+            cooking_vegetable_max.setdefault((facility_id, facility_lv), max_count)
+        self.cooking_vegetable_max = cooking_vegetable_max
+
+    def get_state(self):
+        return {key: value for key, value in vars(self).items() if key != "fingerprint"}
+
+    def get_size(self):
+        """Approximate memory used by the snapshot in bytes."""
+        total = 0
+        for value in vars(self).values():
+            total += sys.getsizeof(value)
+            if isinstance(value, dict):
+                for item in value.values():
+                    total += sys.getsizeof(item)
+        return total
+
+
+MASTER_DATA_CACHE_VERSION = 1
+MASTER_DATA_CACHE_FILE = "master_data.cache"
+
+def get_mdb_fingerprint():
+    """Identifies the current master.mdb by its size, mtime and a hash of the SQLite header.
+    The header includes the file change counter, which changes on every write."""
+    db_path = get_db_path()
+    try:
+        stat = os.stat(db_path)
+        with open(db_path, "rb") as f:
+            header = f.read(100)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns, hashlib.blake2b(header, digest_size=16).hexdigest())
+
+def read_master_data_cache():
+    cache_path = util.get_appdata(MASTER_DATA_CACHE_FILE)
+    if not os.path.exists(cache_path):
+        return None, None
+    try:
+        with open(cache_path, "rb") as f:
+            version, fingerprint, state = pickle.load(f)
+    except Exception:
+        logger.warning(f"Could not read master data cache: {traceback.format_exc()}")
+        return None, None
+    if version != MASTER_DATA_CACHE_VERSION:
+        return None, None
+    return fingerprint, state
+
+def write_master_data_cache(fingerprint, state):
+    cache_path = util.get_appdata(MASTER_DATA_CACHE_FILE)
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump((MASTER_DATA_CACHE_VERSION, fingerprint, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        logger.warning(f"Could not write master data cache: {traceback.format_exc()}")
+
+def master_data_from_state(state, fingerprint):
+    master_data = MasterData()
+    for key, value in state.items():
+        setattr(master_data, key, value)
+    master_data.fingerprint = fingerprint
+    return master_data
+
+def rebuild_master_data(fingerprint):
+    """Loads the snapshot from master.mdb and stores it in the cache."""
+    master_data = MasterData()
+    master_data.load()
+    state = master_data.get_state()
+    write_master_data_cache(fingerprint, state)
+    return state
+
+REBUILD_THREAD = None
+def rebuild_master_data_in_background(fingerprint):
+    global REBUILD_THREAD
+    def run():
+        global MASTER_DATA
+        try:
+            master_data = master_data_from_state(rebuild_master_data(fingerprint), fingerprint)
+        except Exception:
+            logger.error(f"Rebuilding master data failed: {traceback.format_exc()}")
+            return
+        # Threads still using the old snapshot keep a consistent view of it.
+        with MASTER_DATA_LOCK:
+            MASTER_DATA = master_data
+        logger.info("Master data rebuilt after game update.")
+    REBUILD_THREAD = threading.Thread(target=run, daemon=True)
+    REBUILD_THREAD.start()
+
+MASTER_DATA = None
+MASTER_DATA_LOCK = threading.Lock()
+def get_master_data(force=False):
+    """Returns the master data snapshot. It is loaded from the on-disk cache when master.mdb
+    has not changed. When forced, it is refreshed if master.mdb changed since it was loaded."""
+    global MASTER_DATA
+    master_data = MASTER_DATA
+    if master_data is not None and not force:
+        return master_data
+
+    with MASTER_DATA_LOCK:
+        if MASTER_DATA is not None and not force:
+            return MASTER_DATA
+
+        if REBUILD_THREAD and REBUILD_THREAD.is_alive():
+            return MASTER_DATA
+
+        fingerprint = get_mdb_fingerprint()
+        if MASTER_DATA is not None:
+            if fingerprint != MASTER_DATA.fingerprint:
+                # The game was updated while running. Keep using the current tables until the new ones are built.
+                logger.info("master.mdb changed, rebuilding master data cache in the background.")
+                rebuild_master_data_in_background(fingerprint)
+            return MASTER_DATA
+
+        start_time = time.perf_counter()
+        cached_fingerprint, state = read_master_data_cache()
+
+        if state is not None and cached_fingerprint == fingerprint:
+            MASTER_DATA = master_data_from_state(state, fingerprint)
+            logger.info(f"Loaded master data from cache in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+        elif state is not None:
+            # The game was updated. Start with the old tables and swap in the new ones once they are built.
+            logger.info("master.mdb changed, rebuilding master data cache in the background.")
+            MASTER_DATA = master_data_from_state(state, cached_fingerprint)
+            rebuild_master_data_in_background(fingerprint)
+        else:
+            MASTER_DATA = master_data_from_state(rebuild_master_data(fingerprint), fingerprint)
+    return MASTER_DATA
+
+
 def _get_event_titles_special(story_id, card_id):
     # Determine if it's a L'Arc special outfit event.
     # First, determine if there is a dress icon.
     event_titles = _get_event_titles_default(story_id)
+    master_data = get_master_data()
 
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT event_title_dress_icon FROM single_mode_story_data WHERE story_id = ? AND card_id = ? LIMIT 1""",
-            (story_id, card_id)
-        )
-        row = cursor.fetchone()
-        if row is None:
-            return event_titles
+    dress_icon = master_data.story_dress_icons.get((story_id, card_id))
+    if not dress_icon:
+        return event_titles
 
-        dress_icon = row[0]
+    # Now match up the events.
+    story_ids = master_data.dress_icon_stories.get(dress_icon)
+    if not story_ids:
+        return event_titles
 
-        if dress_icon == 0:
-            return event_titles
-        
-        # Now match up the events.
-        cursor.execute(
-            """SELECT story_id FROM single_mode_story_data WHERE event_title_dress_icon = ? ORDER BY id""",
-            (dress_icon,)
-        )
-        rows = cursor.fetchall()
+    default_ids = []
+    larc_ids = []
 
-        if not rows:
-            return event_titles
-        
-        default_ids = []
-        larc_ids = []
+    for story in story_ids:
+        str_id = str(story)
+        if str_id.startswith("40"):
+            larc_ids.append(str_id)
+        elif str_id.startswith("50"):
+            default_ids.append(str_id)
 
-        for row in rows:
-            str_id = str(row[0])
-            if str_id.startswith("40"):
-                larc_ids.append(str_id)
-            elif str_id.startswith("50"):
-                default_ids.append(str_id)
-        
-        try:
-            index = larc_ids.index(str(story_id)) % len(default_ids)
-        except ValueError:
-            return event_titles
-        
-        if index >= len(default_ids):
-            return event_titles
-        
-        event_titles.extend(_get_event_titles_default(default_ids[index]))
+    try:
+        index = larc_ids.index(str(story_id)) % len(default_ids)
+    except (ValueError, ZeroDivisionError):
         return event_titles
 
+    if index >= len(default_ids):
+        return event_titles
+
+    event_titles.extend(_get_event_titles_default(int(default_ids[index])))
+    return event_titles
+
 
 def _get_event_titles_default(story_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT text FROM text_data WHERE category = 181 AND "index" = ? LIMIT 1""",
-            (story_id,)
-        )
-        row = cursor.fetchone()
-        if row is None:
-            return [None]
-        
-        return [row[0]]
+    return [get_master_data().text[181].get(story_id)]
     
 def convert_short_story_id(story_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT story_id FROM single_mode_story_data WHERE short_story_id = ? LIMIT 1""",
-            (story_id,)
-        )
-        row = cursor.fetchone()
-
-        if row is None:
-            return story_id
-        
-        return row[0]
+    return get_master_data().short_story_ids.get(story_id, story_id)
 
 def get_event_titles(story_id, card_id):
     story_id = convert_short_story_id(story_id)
@@ -180,170 +621,51 @@ def get_event_titles(story_id, card_id):
     return event_titles
 
 def get_song_title(song_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT text FROM text_data WHERE category = 16 AND "index" = ? LIMIT 1""",
-            (song_id,)
-        )
-        song_title = cursor.fetchone()[0]
-    return song_title
+    return get_master_data().text[16].get(song_id)
 
 def get_status_name(status_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT text FROM text_data WHERE category = 142 AND "index" = ? LIMIT 1""",
-            (status_id,)
-        )
-        status_name = cursor.fetchone()[0]
-    return status_name
+    return get_master_data().text[142].get(status_id)
 
 def get_skill_name(skill_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT text FROM text_data WHERE category = 47 AND "index" = ? LIMIT 1""",
-            (skill_id,)
-        )
-        skill_name = cursor.fetchone()[0]
-    return skill_name
+    return get_master_data().skill_name_dict.get(skill_id)
 
 def get_skill_hint_name(group_id, rarity):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT td.text FROM skill_data sd INNER JOIN text_data td ON sd.id = td."index" AND td.category = 47 WHERE sd.group_id = ? AND sd.rarity = ? LIMIT 1""",
-            (group_id, rarity)
-        )
-        skill_hint_name = cursor.fetchone()[0]
-    return skill_hint_name
+    return get_master_data().skill_hint_name_dict.get((group_id, rarity))
 
 def get_race_program_name(program_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT t.text FROM single_mode_program s INNER JOIN text_data t ON s.race_instance_id = t."index" AND t.category = 28 WHERE s.id = ? LIMIT 1""",
-            (program_id,)
-        )
-        program_name = cursor.fetchone()[0]
-    return program_name
+    return get_master_data().race_program_name_dict.get(program_id)
 
 def get_outfit_name(card_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT text FROM text_data WHERE category = 14 AND "index" = ? LIMIT 1""",
-            (card_id,)
-        )
-        outfit_name = cursor.fetchone()[0]
-    return outfit_name
+    return get_master_data().text[14].get(card_id)
 
 def get_support_card_string(support_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT rarity, command_id, support_card_type, chara_id FROM support_card_data WHERE id = ? LIMIT 1""",
-            (support_id,)
-        )
-        row = cursor.fetchone()
-
-        if row is None:
-            logger.warning(f"Support card not found for id: {support_id}")
-            return "SUPPORT CARD NOT FOUND"
+    row = get_master_data().support_card_dict.get(support_id)
+    if row is None:
+        logger.warning(f"Support card not found for id: {support_id}")
+        return "SUPPORT CARD NOT FOUND"
 
     return create_support_card_string(*row)
 
-EVENT_TITLE_DICT = {}
 def get_event_title_dict(force=False):
-    global EVENT_TITLE_DICT
-    if force or not EVENT_TITLE_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT s.story_id, s.short_story_id, t.text FROM text_data t JOIN single_mode_story_data s ON t."index" = s.story_id WHERE category = 181"""
-            )
-            rows = cursor.fetchall()
-
-        out = {}
-        for row in rows:
-            out[row[0]] = row[2]
-            if row[1] != 0:
-                out[row[1]] = row[2]
-        EVENT_TITLE_DICT.update(out)
-    return EVENT_TITLE_DICT
+    return get_master_data(force).event_title_dict
 
-RACE_PROGRAM_NAME_DICT = {}
 def get_race_program_name_dict(force=False):
-    global RACE_PROGRAM_NAME_DICT
-    if force or not RACE_PROGRAM_NAME_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT s.id, t.text FROM single_mode_program s INNER JOIN text_data t ON s.race_instance_id = t."index" AND t.category = 28"""
-            )
-            rows = cursor.fetchall()
-        RACE_PROGRAM_NAME_DICT.update({row[0]: row[1] for row in rows})
-    return RACE_PROGRAM_NAME_DICT
-
-SKILL_NAME_DICT = {}
-def get_skill_name_dict(force=False):
-    global SKILL_NAME_DICT
-    if force or not SKILL_NAME_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT sd.id, td.text FROM skill_data sd INNER JOIN text_data td ON sd.id = td."index" AND td.category = 47"""
-            )
-            rows = cursor.fetchall()
-
-        SKILL_NAME_DICT.update({row[0]: row[1] for row in rows})
+    return get_master_data(force).race_program_name_dict
 
-    return SKILL_NAME_DICT
+def get_skill_name_dict(force=False):
+    return get_master_data(force).skill_name_dict
 
-SKILL_HINT_NAME_DICT = {}
 def get_skill_hint_name_dict(force=False):
-    global SKILL_HINT_NAME_DICT
-    if force or not SKILL_HINT_NAME_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT sd.group_id, sd.rarity, td.text FROM skill_data sd INNER JOIN text_data td ON sd.id = td."index" AND td.category = 47"""
-            )
-            rows = cursor.fetchall()
-        
-        SKILL_HINT_NAME_DICT.update({(row[0], row[1]): row[2] for row in rows})
+    return get_master_data(force).skill_hint_name_dict
 
-    return SKILL_HINT_NAME_DICT
-
-STATUS_NAME_DICT = {}
 def get_status_name_dict(force=False):
-    global STATUS_NAME_DICT
-    if force or not STATUS_NAME_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT "index", text FROM text_data WHERE category = 142"""
-            )
-            rows = cursor.fetchall()
-        
-        STATUS_NAME_DICT.update({row[0]: row[1] for row in rows})
-
-    return STATUS_NAME_DICT
+    return get_master_data(force).status_name_dict
 
-OUTFIT_NAME_DICT = {}
 def get_outfit_name_dict(force=False):
-    global OUTFIT_NAME_DICT
-    if force or not OUTFIT_NAME_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT "index", text FROM text_data WHERE category = 5"""
-            )
-            rows = cursor.fetchall()
-        
-        OUTFIT_NAME_DICT.update({row[0]: row[1] for row in rows})
-
-    return OUTFIT_NAME_DICT
+    return get_master_data(force).outfit_name_dict
 
-SUPPORT_CARD_DICT = {}
 def get_support_card_dict(force=False):
-    global SUPPORT_CARD_DICT
-    if force or not SUPPORT_CARD_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT id, rarity, command_id, support_card_type, chara_id FROM support_card_data"""
-            )
-            rows = cursor.fetchall()
-        SUPPORT_CARD_DICT.update({row[0]: row[1:] for row in rows})
-    return SUPPORT_CARD_DICT
+    return get_master_data(force).support_card_dict
 
 def get_support_card_type(support_data):
     return constants.SUPPORT_CARD_TYPE_DICT[(support_data[1], support_data[2])]
@@ -361,260 +683,62 @@ def get_support_card_string_dict(force=False):
     
     return SUPPORT_CARD_STRING_DICT
 
-CHARA_NAME_DICT = {}
 def get_chara_name_dict(force=False):
-    global CHARA_NAME_DICT
-    if force or not CHARA_NAME_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT "index", text FROM text_data WHERE category = 170"""
-            )
-            rows = cursor.fetchall()
-
-        CHARA_NAME_DICT.update({row[0]: row[1] for row in rows})
-    
-    return CHARA_NAME_DICT
+    return get_master_data(force).chara_name_dict
 
-
-RACE_NAME_DICT = {}
 def get_race_name_dict(force=False):
-    global RACE_NAME_DICT
-    if force or not RACE_NAME_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT smp.id, text FROM single_mode_program smp JOIN text_data td on td."index" = smp.race_instance_id WHERE category = 28"""
-            )
-            rows = cursor.fetchall()
-
-        RACE_NAME_DICT.update({row[0]: row[1] for row in rows})
+    return get_master_data(force).race_name_dict
 
-    return RACE_NAME_DICT
-
-
-RACE_DISTANCE_DICT = {}
 def get_race_distance_dict(force=False):
-    global RACE_DISTANCE_DICT
-    if force or not RACE_DISTANCE_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT smp.id, rcs.distance FROM single_mode_program smp JOIN race_instance ri on smp.race_instance_id = ri.id JOIN race r on ri.race_id = r.id JOIN race_course_set rcs on r.course_set = rcs.id"""
-            )
-            rows = cursor.fetchall()
-
-        RACE_DISTANCE_DICT.update({row[0]: row[1] for row in rows})
+    return get_master_data(force).race_distance_dict
 
-    return RACE_DISTANCE_DICT
-
-
-RACE_SURFACE_DICT = {}
 def get_race_surface_dict(force=False):
-    global RACE_SURFACE_DICT
-    if force or not RACE_SURFACE_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT smp.id, rcs.ground FROM single_mode_program smp JOIN race_instance ri on smp.race_instance_id = ri.id JOIN race r on ri.race_id = r.id JOIN race_course_set rcs on r.course_set = rcs.id"""
-            )
-            rows = cursor.fetchall()
-
-        RACE_SURFACE_DICT.update({row[0]: row[1] for row in rows})
+    return get_master_data(force).race_surface_dict
 
-    return RACE_SURFACE_DICT
-
-
-
-MANT_ITEM_STRING_DICT = {}
 def get_mant_item_string_dict(force=False):
-    global MANT_ITEM_STRING_DICT
-    if force or not MANT_ITEM_STRING_DICT:
-        with Connection() as (_, cursor):
-            try:
-                cursor.execute(
-                    """SELECT "index", text FROM text_data WHERE category = 225"""
-                )
-                rows = cursor.fetchall()
-                MANT_ITEM_STRING_DICT.update({row[0]: row[1] for row in rows})
-            except sqlite3.OperationalError as e:
-                logger.error(f"get_mant_item_string_dict failed: {e}\n{traceback.format_exc()}")
-
-
-    return MANT_ITEM_STRING_DICT
+    return get_master_data(force).mant_item_string_dict
 
-GL_LESSON_DICT = {}
 def get_gl_lesson_dict(force=False):
-    global GL_LESSON_DICT
-    if force or not GL_LESSON_DICT:
-        with Connection() as (_, cursor):
-            try:
-                cursor.execute(
-                    """SELECT s.id, t.text, s.square_type FROM single_mode_live_square s JOIN text_data t ON t."index" = s.square_title_text_id AND t.category = 209"""
-                )
-                rows = cursor.fetchall()
-
-                GL_LESSON_DICT.update({row[0]: (row[1], row[2]) for row in rows})
-            except sqlite3.OperationalError as e:
-                logger.error( f"get_gl_lesson_dict failed: {e}\n{traceback.format_exc()}")
-    
-    return GL_LESSON_DICT
+    return get_master_data(force).gl_lesson_dict
 
-GROUP_CARD_EFFECT_IDS = []
 def get_group_card_effect_ids(force=False):
-    global GROUP_CARD_EFFECT_IDS
-    if force or not GROUP_CARD_EFFECT_IDS:
-        with Connection() as (_, cursor):
-            try:
-                cursor.execute(
-                    """SELECT id, effect_id FROM support_card_data WHERE support_card_type = 3"""
-                )
-                rows = cursor.fetchall()
-                if rows:
-                    GROUP_CARD_EFFECT_IDS[:] = rows  # Thanks StellatedCube
-            except sqlite3.OperationalError as e:
-                logger.error(f"get_group_card_effect_ids failed: {e}\n{traceback.format_exc()}")
-
-    return GROUP_CARD_EFFECT_IDS
+    return get_master_data(force).group_card_effect_ids
 
 def get_program_id_grade(program_id):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT r.grade FROM single_mode_program smp JOIN race_instance ri on smp.race_instance_id = ri.id JOIN race r on ri.race_id = r.id WHERE smp.id = ?;""",
-            (program_id,)
-        )
-        row = cursor.fetchone()
-
-    if not row:
-        return None
+    return get_master_data().program_grade.get(program_id)
 
-    return row[0]
-
-
-PROGRAM_ID_DICT = {}
 def get_program_id_dict(force=False):
-    global PROGRAM_ID_DICT
-    if not PROGRAM_ID_DICT or force:
-        with Connection() as (_, cursor):
-            try:
-                cursor.execute(
-                    """SELECT * FROM single_mode_program;"""
-                )
-                rows = cursor.fetchall()
-                columns = get_columns(cursor)
-                if not rows:
-                    temp = None
-                else:
-                    races = rows_to_dict(rows, columns)
-                    PROGRAM_ID_DICT.update( { race["id"] : race for race in races } )
-            except sqlite3.OperationalError as e:
-                logger.error( f"get_program_id_dict failed: {e}\n{traceback.format_exc()}")
-
-    return PROGRAM_ID_DICT
+    return get_master_data(force).program_id_dict
 
 def get_program_id_data(program_id):
     return get_program_id_dict().get(program_id)
 
-SKILL_ID_DICT = {}
 def get_skill_id_dict(force=False):
-    global SKILL_ID_DICT
-    if force or not SKILL_ID_DICT:
-        with Connection() as (_, cursor):
-            try:
-                cursor.execute(
-                    """SELECT id, group_id, rarity, unique_skill_id_1 FROM skill_data ORDER BY group_rate DESC;"""
-                )
-                rows = cursor.fetchall()
-            except sqlite3.OperationalError as e:
-                logger.error(f"get_group_card_effect_ids failed: {e}\n{traceback.format_exc()}")
-                util.show_error_box_no_report("Error","Failed to read the master.mdb file.<br>Try restarting Uma Launcher after the game updates.<br>Uma Launcher will now close.")
-                if gui.THREADER:
-                    gui.THREADER.stop()
-                rows = []
-        if rows:
-            tmp = {}
-            for row in rows:
-                true_id = row[0]
-                # if row[3] != 0:
-                #     true_id = row[3]
-                
-                skill_key = (row[1], row[2])
-                if skill_key not in tmp:
-                    tmp[skill_key] = true_id
-            SKILL_ID_DICT.update(tmp)
-    
-    return SKILL_ID_DICT
+    return get_master_data(force).skill_id_dict
 
-SCOUTING_SCORE_TO_RANK_DICT = {}
 def get_scouting_score_to_rank_dict(force=False):
-    global SCOUTING_SCORE_TO_RANK_DICT
-    if force or not SCOUTING_SCORE_TO_RANK_DICT:
-        with Connection() as (_, cursor):
-            try:
-
-                cursor.execute(
-                    """SELECT team_min_value FROM team_building_rank"""
-                )
-                rows = cursor.fetchall()
-            except sqlite3.OperationalError as e:
-                logger.error(f"get_group_card_effect_ids failed: {e}\n{traceback.format_exc()}")
-                rows = []
-
-        tmp_dict = {}
-        for i, row in enumerate(rows):
-            min_score = row[0]
-            try:
-                rank = constants.SCOUTING_RANK_LIST[i]
-            except IndexError:
-                rank = constants.SCOUTING_RANK_LIST[-1]
-            tmp_dict[min_score] = rank
-        
-        SCOUTING_SCORE_TO_RANK_DICT.update(tmp_dict)
-
-    return SCOUTING_SCORE_TO_RANK_DICT
+    return get_master_data(force).scouting_score_to_rank_dict
 
 def get_card_inherent_skills(card_id, level=99):
-    skills = []
-    rows = []
-
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT ass.skill_id FROM card_data cd JOIN available_skill_set ass ON cd.available_skill_set_id = ass.available_skill_set_id WHERE cd.id = ? AND ass.need_rank <= ?;""",
-            (card_id, level)
-        )
-        rows = cursor.fetchall()
-    
-    if not rows:
-        return skills
-    
-    for row in rows:
-        skills.append(row[0])
-    
-    return skills
+    return [skill_id for need_rank, skill_id in get_master_data().card_skills.get(card_id, ()) if need_rank <= level]
 
 def sort_skills_by_display_order(skill_id_list):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            f"""SELECT id FROM skill_data WHERE id in ({','.join(['?'] * len(skill_id_list))}) ORDER BY disp_order ASC, id ASC;""",
-            skill_id_list
-        )
-        rows = cursor.fetchall()
-    
-    if not rows:
+    disp_order = get_master_data().skill_disp_order
+    skills = sorted((skill_id for skill_id in set(skill_id_list) if skill_id in disp_order), key=lambda skill_id: (disp_order[skill_id], skill_id))
+
+    if not skills:
         return None
-    
-    return [row[0] for row in rows]
+
+    return skills
 
 def determine_skill_id_from_group_id(group_id, rarity, skills_id_list):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT id FROM skill_data WHERE group_id = ? AND rarity = ? AND group_rate > 0 ORDER BY group_rate ASC;""",
-            (group_id, rarity)
-        )
-        rows = cursor.fetchall()
-    
-    if not rows:
+    group_skills = get_master_data().skill_groups.get((group_id, rarity))
+
+    if not group_skills:
         return None
     
     skill_id = None
-    for row in rows:
-        skill_id = row[0]
+    for skill_id in group_skills:
         if skill_id not in skills_id_list:
             break
         else:
@@ -623,136 +747,37 @@ def determine_skill_id_from_group_id(group_id, rarity, skills_id_list):
     return skill_id
 
 def get_total_minigame_plushies(force=False):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """SELECT chara_id FROM card_data c WHERE default_rarity != 0;"""
-        )
-        rows = cursor.fetchall()
-    
-    total_charas = set()
-    total_plushies = len(rows)
-
-    for row in rows:
-        total_charas.add(row[0])
-    
-    return 3 * (total_plushies + len(total_charas))
+    return get_master_data(force).total_minigame_plushies
 
 def get_uaf_required_rank_for_turn(force=False):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            "SELECT turn,win_sport_rank FROM single_mode_sport_competition"
-        )
-        rows = cursor.fetchall()
-    
-    if not rows:
-        return None
-        
-    return rows
+    return get_master_data(force).uaf_required_rank_for_turn
 
 def get_uaf_training_effects(force=False):
-    with Connection() as (_, cursor):
-        cursor.execute(
-            "SELECT id, effect_value_2 FROM single_mode_sport_compe_effect"
-        )
-        rows = cursor.fetchall()
-    
-    if not rows:
-        return None
-
-    # Convert rows to a dictionary
-    effects_map = {row[0]: row[1] for row in rows}
-    return effects_map
+    return get_master_data(force).uaf_training_effects
 
 def get_cooking_success_rate(power: int) -> int:
-    with Connection() as (_, cursor):
-        cursor.execute(
-            "SELECT success_rate FROM single_mode_cook_success_odds WHERE ? BETWEEN power_min AND power_max",
-            (power,)
-        )
-        row = cursor.fetchone()
-
-    if not row:
-        return 0
-    
-    return row[0]
+    for power_min, power_max, success_rate in get_master_data().cooking_success_odds:
+        if power_min <= power <= power_max:
+            return success_rate
+    return 0
 
 def get_cooking_tasting_success_thresholds(turn_num: int) -> list[int]:
-    with Connection() as (_, cursor):
-        cursor.execute(
-            "SELECT success_num, great_success_num FROM single_mode_cook_power_data WHERE ? < turn_num",
-            (turn_num,)
-        )
-    
-        row = cursor.fetchone()
-
-    if not row:
-        return [0, 0]
-    
-    return [row[0], row[1]]
+    for row_turn_num, success_num, great_success_num in get_master_data().cooking_power_data:
+        if turn_num < row_turn_num:
+            return [success_num, great_success_num]
+    return [0, 0]
 
 def get_cooking_vegetable_max_count(veg_id: int, veg_lv: int) -> int:
     # Get the max count of a vegetable at specified level.
+    return get_master_data().cooking_vegetable_max.get((veg_id, veg_lv), 0)
 
-    with Connection() as (_, cursor):
-        cursor.execute(
-            """
-            SELECT e.effect_value_2
-            FROM single_mode_cook_garden_effect e
-            JOIN single_mode_cook_garden_level l on l.effect_group_id = e.effect_group_id
-            WHERE l.facility_id = ? AND l.facility_lv = ? AND e.effect_type == 110
-            """,
-            (veg_id, veg_lv)
-        )
-        row = cursor.fetchone()
-    
-    if not row:
-        return 0
-    
-    return row[0]
-
-
-SINGLE_MODE_UNIQUE_CHARA_DICT = {}
 def get_single_mode_unique_chara_dict(force=False):
-    global SINGLE_MODE_UNIQUE_CHARA_DICT
-    if force or not SINGLE_MODE_UNIQUE_CHARA_DICT:
-        with Connection() as (_, cursor):
-            cursor.execute(
-                """SELECT scenario_id, partner_id, chara_id FROM single_mode_unique_chara;"""
-            )
-            rows = cursor.fetchall()
-
-        tmp_dict = {}
-        for row in rows:
-            if row[0] not in tmp_dict:
-                tmp_dict[row[0]] = {}
-            
-            tmp_dict[row[0]][row[1]] = row[2]
-        
-        SINGLE_MODE_UNIQUE_CHARA_DICT.update(tmp_dict)
-
-    return SINGLE_MODE_UNIQUE_CHARA_DICT
+    return get_master_data(force).single_mode_unique_chara_dict
 
 
+# Cached dicts and the source they are built from.
 UPDATE_FUNCS = [
-    get_chara_name_dict,
-    get_event_title_dict,
-    get_race_program_name_dict,
-    get_skill_name_dict,
-    get_skill_hint_name_dict,
-    get_status_name_dict,
-    get_outfit_name_dict,
-    get_support_card_dict,
-    get_support_card_string_dict,
-    get_mant_item_string_dict,
-    get_gl_lesson_dict,
-    get_group_card_effect_ids,
-    get_skill_id_dict,
-    get_scouting_score_to_rank_dict,
-    get_single_mode_unique_chara_dict,
-    get_program_id_dict,
-    get_race_name_dict,
-    get_race_distance_dict,
-    get_race_surface_dict
+    (get_support_card_string_dict, MDB_SOURCE)
 ]
 
 def has_carotene_table():
@@ -0,0 +1,83 @@
+import threading
+
+# Seconds between keep-alive comments on an idle event stream.
+KEEPALIVE_INTERVAL = 15
+
+
+class Subscriber():
+    def __init__(self):
+        # Sequence number of the last overlay sent. None if the next one has to be the full overlay.
+        self.seq = None
+
+
+class OverlayChannel():
+    """The latest helper overlay, pushed to the helper pages connected to umaserver's event stream.
+
+    Every published overlay gets the next sequence number. A subscriber that has the previous overlay
+    gets the partial update, anyone further behind gets the whole update, so overlays published faster
+    than they can be sent are skipped. See HelperTable.create_helper_elements for the updates."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.update = None
+        self.partial_update = None
+        self.subscribers = []
+        self.closed = False
+
+    def publish(self, update, partial_update):
+        with self.condition:
+            self.seq += 1
+            self.update = update
+            self.partial_update = partial_update
+            self.condition.notify_all()
+
+    def has_subscribers(self):
+        """A page whose connection dropped still counts until writing to it fails."""
+        return bool(self.subscribers)
+
+    def subscribe(self):
+        subscriber = Subscriber()
+        with self.condition:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.condition:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def request_full(self):
+        """Sends the full overlay to every subscriber, for a page that could not apply a patch."""
+        with self.condition:
+            for subscriber in self.subscribers:
+                subscriber.seq = None
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def is_pending(self, subscriber):
+        return self.update is not None and subscriber.seq != self.seq
+
+    def get_next(self, subscriber, timeout=KEEPALIVE_INTERVAL):
+        """Waits for an overlay the subscriber does not have yet.
+        Returns the update or partial update with its 'seq', None on timeout, and raises EOFError once the channel is closed."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or self.is_pending(subscriber), timeout)
+            if self.closed:
+                raise EOFError
+            if not self.is_pending(subscriber):
+                return None
+
+            if subscriber.seq is not None and subscriber.seq + 1 == self.seq and self.partial_update is not None:
+                message = dict(self.partial_update, seq=self.seq)
+            else:
+                message = dict(self.update, seq=self.seq)
+            subscriber.seq = self.seq
+            return message
+
+
+OVERLAY_CHANNEL = OverlayChannel()
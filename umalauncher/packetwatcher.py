@@ -0,0 +1,86 @@
+import os
+import time
+import pywintypes
+import win32con
+import win32event
+import win32file
+from loguru import logger
+
+
+def msgpack_sort_key(file_name):
+    # Files are named <unix ms timestamp><Q|R>.msgpack. Order by the timestamp,
+    # requests before responses. Unparseable names go last.
+    try:
+        return (0, int(file_name[:-9]), file_name[-9] != "Q")
+    except ValueError:
+        return (1, 0, True)
+
+
+class PacketWatcher:
+    """Waits for new msgpack files in the CarrotJuicer folder.
+    Uses Windows change notifications when available and falls back to polling otherwise."""
+
+    POLL_INTERVAL = 0.25
+
+    def __init__(self, msg_path):
+        self.msg_path = msg_path
+        self.change_handle = None
+        self.notifications_available = True
+
+    def open_change_handle(self):
+        if not os.path.isdir(self.msg_path):
+            # The folder is created by the game; try again later.
+            return
+        try:
+            self.change_handle = win32file.FindFirstChangeNotification(
+                self.msg_path,
+                False,
+                win32con.FILE_NOTIFY_CHANGE_FILE_NAME | win32con.FILE_NOTIFY_CHANGE_LAST_WRITE
+            )
+            logger.info(f"Watching {self.msg_path} for new packets.")
+        except pywintypes.error as e:
+            logger.warning(f"Change notifications unavailable for {self.msg_path}, falling back to polling: {e}")
+            self.change_handle = None
+            self.notifications_available = False
+
+    def close(self):
+        if self.change_handle is not None:
+            try:
+                win32file.FindCloseChangeNotification(self.change_handle)
+            except pywintypes.error:
+                pass
+            self.change_handle = None
+
+    def wait(self, timeout=POLL_INTERVAL):
+        """Blocks until the folder changes or the timeout passes.
+        Returns True if the folder may contain new files."""
+        if self.change_handle is None and self.notifications_available:
+            self.open_change_handle()
+            if self.change_handle is not None:
+                # Pick up anything written before the handle existed.
+                return True
+
+        if self.change_handle is None:
+            time.sleep(timeout)
+            return True
+
+        result = win32event.WaitForSingleObject(self.change_handle, int(timeout * 1000))
+        if result != win32event.WAIT_OBJECT_0:
+            return False
+
+        # Re-arm before the folder is listed so files arriving during processing signal the next wait.
+        try:
+            win32file.FindNextChangeNotification(self.change_handle)
+        except pywintypes.error:
+            # Folder was likely removed. Reopen on the next wait.
+            self.close()
+        return True
+
+    def get_batch(self):
+        """Returns the msgpack files currently in the folder, ordered by the timestamp in their name."""
+        try:
+            file_names = [entry.name for entry in os.scandir(self.msg_path) if entry.name.endswith(".msgpack")]
+        except FileNotFoundError:
+            return []
+        file_names.sort(key=msgpack_sort_key)
+        return [os.path.join(self.msg_path, file_name) for file_name in file_names]
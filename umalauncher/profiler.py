@@ -0,0 +1,224 @@
+"""Timing of the launcher's hot paths, switched on by the "Profiling" debug setting.
+
+    with profiler.span("mdb.query"):
+        ...
+
+    @profiler.timed("helper_table.build")
+    def create_helper_elements(...):
+
+Spans are grouped by name. Nested spans are timed separately, so a span includes the time of the spans inside it.
+While profiling is off, span() returns a shared object that does nothing.
+"""
+import time
+import functools
+import threading
+import psutil
+from loguru import logger
+
+SUMMARY_INTERVAL = 60
+
+# Upper bounds of the histogram buckets in milliseconds. Anything slower goes in an extra last bucket.
+BUCKET_BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+
+ENABLED = False
+LOCK = threading.Lock()
+SPAN_STATS = {}
+COUNTERS = {}
+ENABLED_TIME = None
+REPORTER_STOP = None
+
+
+class SpanStats():
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, milliseconds):
+        self.count += 1
+        self.total += milliseconds
+        if milliseconds > self.max:
+            self.max = milliseconds
+        for i, bound in enumerate(BUCKET_BOUNDS):
+            if milliseconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def get_percentile(self, percentile):
+        """Returns the upper bound of the bucket the percentile falls in."""
+        target = self.count * percentile / 100
+        seen = 0
+        for i, bucket_count in enumerate(self.buckets[:-1]):
+            seen += bucket_count
+            if seen >= target:
+                return min(BUCKET_BOUNDS[i], self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.,
+            'p50_ms': round(self.get_percentile(50), 3),
+            'p90_ms': round(self.get_percentile(90), 3),
+            'p99_ms': round(self.get_percentile(99), 3),
+            'max_ms': round(self.max, 3),
+        }
+
+
+class Span():
+    __slots__ = ("name", "start_time")
+
+    def __init__(self, name):
+        self.name = name
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        record(self.name, time.perf_counter() - self.start_time)
+        return False
+
+
+class NullSpan():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+NULL_SPAN = NullSpan()
+
+
+def span(name):
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name)
+
+
+def timed(name):
+    """Decorator that runs the function in a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, seconds):
+    if not ENABLED:
+        return
+    with LOCK:
+        stats = SPAN_STATS.get(name)
+        if stats is None:
+            stats = SPAN_STATS[name] = SpanStats()
+        stats.add(seconds * 1000)
+
+
+def count(name, amount=1):
+    if not ENABLED:
+        return
+    with LOCK:
+        COUNTERS[name] = COUNTERS.get(name, 0) + amount
+
+
+class ThreadCpuTracker():
+    """CPU time used by each thread since the last call."""
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.last_times = {thread.id: thread.user_time + thread.system_time for thread in self.process.threads()}
+        self.last_time = time.perf_counter()
+
+    def get_usage(self):
+        """Returns {thread name: (percent of one core since the last call, total CPU seconds)}."""
+        now = time.perf_counter()
+        interval = max(now - self.last_time, 1e-6)
+        self.last_time = now
+
+        names = {thread.native_id: thread.name for thread in threading.enumerate()}
+        usage = {}
+        times = {}
+        for thread in self.process.threads():
+            cpu_time = thread.user_time + thread.system_time
+            times[thread.id] = cpu_time
+            used = cpu_time - self.last_times.get(thread.id, 0.)
+            usage[names.get(thread.id, f"Thread {thread.id}")] = (round(used / interval * 100, 1), round(cpu_time, 2))
+        self.last_times = times
+        return usage
+
+THREAD_CPU_TRACKER = None
+
+
+def get_summary():
+    """Returns everything measured since profiling was enabled, and the CPU use of every thread since the last summary."""
+    with LOCK:
+        spans = {name: stats.to_dict() for name, stats in SPAN_STATS.items()}
+        counters = dict(COUNTERS)
+        threads = THREAD_CPU_TRACKER.get_usage() if THREAD_CPU_TRACKER else {}
+
+    return {
+        'enabled': ENABLED,
+        'seconds': round(time.time() - ENABLED_TIME, 1) if ENABLED_TIME else 0.,
+        'spans': spans,
+        'counters': counters,
+        'threads': {name: {'cpu_percent': percent, 'cpu_seconds': seconds} for name, (percent, seconds) in threads.items()},
+    }
+
+
+def log_summary():
+    summary = get_summary()
+    lines = [f"Profile over {summary['seconds']:.0f} s:"]
+    lines.append(f"  {'span':<40} {'count':>8} {'total ms':>10} {'mean ms':>8} {'p90 ms':>8} {'max ms':>9}")
+    for name, stats in sorted(summary['spans'].items(), key=lambda item: -item[1]['total_ms']):
+        lines.append(f"  {name:<40} {stats['count']:>8} {stats['total_ms']:>10.1f} {stats['mean_ms']:>8.2f} {stats['p90_ms']:>8.2f} {stats['max_ms']:>9.1f}")
+    if summary['counters']:
+        lines.append("  counters: " + ", ".join(f"{name}={value}" for name, value in sorted(summary['counters'].items())))
+    busy_threads = sorted(summary['threads'].items(), key=lambda item: -item[1]['cpu_percent'])
+    lines.append("  CPU since last summary: " + ", ".join(f"{name} {thread['cpu_percent']}%" for name, thread in busy_threads if thread['cpu_percent'] > 0))
+    logger.info("\n".join(lines))
+
+
+def run_reporter(stop_event):
+    while not stop_event.wait(SUMMARY_INTERVAL):
+        try:
+            log_summary()
+        except Exception:
+            logger.exception("Could not log profile summary")
+
+
+def reset():
+    global ENABLED_TIME, THREAD_CPU_TRACKER
+    with LOCK:
+        SPAN_STATS.clear()
+        COUNTERS.clear()
+        ENABLED_TIME = time.time()
+        THREAD_CPU_TRACKER = ThreadCpuTracker()
+
+
+def set_enabled(enabled):
+    global ENABLED, REPORTER_STOP
+    if enabled == ENABLED:
+        return
+    if enabled:
+        reset()
+        ENABLED = True
+        REPORTER_STOP = threading.Event()
+        threading.Thread(target=run_reporter, args=(REPORTER_STOP,), name="Profiler", daemon=True).start()
+        logger.info(f"Profiling enabled. Logging a summary every {SUMMARY_INTERVAL} seconds.")
+    else:
+        log_summary()
+        ENABLED = False
+        REPORTER_STOP.set()
+        REPORTER_STOP = None
+        logger.info("Profiling disabled.")
@@ -0,0 +1,105 @@
+import numpy as np
+
+# Replay speeds are stored in 1/100 m/s.
+SPEED_SCALE = 0.01
+
+
+class RaceAnalysis():
+    """Per-horse statistics for a race replay (external.race_data_parser.RaceData).
+    Frames are read as (frame, horse) arrays, so every statistic is computed for all horses at once.
+    Frames after a horse crossed the finish line are ignored."""
+
+    def __init__(self, race_data):
+        self.race_data = race_data
+        horse_frames = race_data.horse_frames
+        self.times = race_data.frame_times.astype(np.float64)
+        self.distance = horse_frames['distance'].astype(np.float64)
+        self.speed = horse_frames['speed'] * SPEED_SCALE
+        self.hp = horse_frames['hp'].astype(np.float64)
+        self.lane = horse_frames['lane_position'].astype(np.int32)
+        self.block_front = horse_frames['block_front_horse_index'].astype(np.int32)
+        self.frame_count, self.horse_num = self.distance.shape
+        self.horse_indexes = np.arange(self.horse_num)
+
+        # The replay keeps running after horses cross the line, so the finish comes from the results.
+        # finish_time_raw is on the same clock as the frames. finish_time is the time shown in game.
+        finish_time = race_data.horse_results['finish_time_raw'].astype(np.float64)
+        finish_frame = np.searchsorted(self.times, finish_time, side='left')
+        self.finish_frame = np.where(finish_time > 0, np.minimum(finish_frame, self.frame_count - 1), self.frame_count - 1)
+        self.running = np.arange(self.frame_count)[:, None] <= self.finish_frame[None, :]
+
+    def get_positions(self):
+        """Returns the (frame, horse) array of race positions, 1 being the leader."""
+        order = np.argsort(-self.distance, axis=1, kind='stable')
+        positions = np.empty_like(order)
+        np.put_along_axis(positions, order, np.broadcast_to(np.arange(1, self.horse_num + 1), order.shape), axis=1)
+        return positions
+
+    def get_position_by_distance(self, distances):
+        """Returns a (distance, horse) array of the position each horse held when it passed each distance."""
+        distances = np.asarray(distances, dtype=np.float64)
+        reached = self.distance[None, :, :] >= distances[:, None, None]
+        frames = np.where(reached.any(axis=1), reached.argmax(axis=1), self.finish_frame[None, :])
+        return self.get_positions()[frames, self.horse_indexes[None, :]]
+
+    def get_lane_changes(self):
+        """Returns the number of lane changes and the total lateral movement of each horse."""
+        lane_delta = np.diff(self.lane, axis=0) * self.running[1:]
+        moving = lane_delta != 0
+        started_moving = moving & ~np.vstack([np.zeros((1, self.horse_num), dtype=bool), moving[:-1]])
+        return started_moving.sum(axis=0), np.abs(lane_delta).sum(axis=0)
+
+    def get_spurt_start(self):
+        """Returns the frame and distance where each horse started its final acceleration
+        towards its top speed, to compare against the planned last_spurt_start_distance."""
+        speed = np.where(self.running, self.speed, -np.inf)
+        peak_frame = speed.argmax(axis=0)
+        accelerating = np.diff(self.speed, axis=0, prepend=self.speed[:1]) > 0
+        before_peak = np.arange(self.frame_count)[:, None] <= peak_frame[None, :]
+        not_accelerating = ~accelerating & before_peak
+        last_frame = self.frame_count - 1 - not_accelerating[::-1].argmax(axis=0)
+        start_frame = np.where(not_accelerating.any(axis=0), last_frame, 0)
+        return start_frame, self.distance[start_frame, self.horse_indexes]
+
+    def get_blocking_intervals(self):
+        """Returns (horse, blocking horse, start time, end time) arrays for every interval
+        in which a horse was blocked by the horse in front of it."""
+        block_front = np.where(self.running, self.block_front, -1)
+        padding = np.full((1, self.horse_num), -1)
+        padded = np.vstack([padding, block_front, padding])
+        changed = padded[1:] != padded[:-1]
+        starts = changed & (padded[1:] >= 0)
+        ends = changed & (padded[:-1] >= 0)
+
+        # Transposed so the intervals come out grouped by horse, in frame order.
+        horses, start_frames = np.nonzero(starts.T)
+        _, end_frames = np.nonzero(ends.T)
+        end_times = self.times[np.minimum(end_frames, self.frame_count - 1)]
+        return horses, block_front[start_frames, horses], self.times[start_frames], end_times
+
+    def summarize(self):
+        """Returns a dict of per-horse statistic arrays.
+        finish_order is the 1-based finishing position, unlike the 0-based one in horse_results."""
+        results = self.race_data.horse_results
+        lane_changes, lane_travel = self.get_lane_changes()
+        spurt_frame, spurt_distance = self.get_spurt_start()
+        horses, _, start_times, end_times = self.get_blocking_intervals()
+        planned_spurt = results['last_spurt_start_distance'].astype(np.float64)
+
+        return {
+            'finish_order': results['finish_order'] + 1,
+            'top_speed': np.where(self.running, self.speed, 0.).max(axis=0),
+            'hp_at_spurt': self.hp[spurt_frame, self.horse_indexes],
+            'hp_left': self.hp[self.finish_frame, self.horse_indexes],
+            'spurt_start_distance': spurt_distance,
+            'planned_spurt_distance': planned_spurt,
+            'spurt_delay': np.where(planned_spurt > 0, spurt_distance - planned_spurt, np.nan),
+            'lane_changes': lane_changes,
+            'lane_travel': lane_travel,
+            'blocked_count': np.bincount(horses, minlength=self.horse_num),
+            'blocked_time': np.bincount(horses, weights=end_times - start_times, minlength=self.horse_num),
+        }
+
+    def get_horse_stats(self, horse_index):
+        """Returns the summary of one horse as plain Python values."""
+        return {key: values[horse_index].item() for key, values in self.summarize().items()}
@@ -0,0 +1,179 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import traceback
+import msgpack
+from loguru import logger
+import util
+import race_analytics
+from external import race_data_parser
+
+RACE_CACHE_FILE = "race_cache.db"
+# Bump when the summary layout or race_analytics changes, so old summaries are dropped.
+RACE_CACHE_VERSION = 2
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+# Hits are written to last_used in batches, after this many hits or seconds.
+USE_FLUSH_COUNT = 64
+USE_FLUSH_INTERVAL = 30
+# The size of the cache is checked after this many inserts.
+EVICT_CHECK_INTERVAL = 32
+
+
+def get_race_key(race_scenario):
+    if isinstance(race_scenario, str):
+        race_scenario = race_scenario.encode("ascii")
+    return hashlib.blake2b(race_scenario, digest_size=16).digest()
+
+
+def summarize_race(race_scenario):
+    """Decodes a race_scenario blob into the compact summary that is cached.
+    Finishing positions in the summary are 1-based, like the ones shown in game."""
+    race_data = race_data_parser.parse_lazy(race_scenario)
+    results = race_data.horse_results
+    summary = {
+        'finish_order': (results['finish_order'] + 1).tolist(),
+        'finish_time': results['finish_time'].tolist(),
+        'last_spurt_start_distance': results['last_spurt_start_distance'].tolist(),
+        'events': [[event.frame_time, event.type, list(event.params)] for event in race_data.events],
+        'stats': None,
+    }
+    try:
+        summary['stats'] = {key: values.tolist() for key, values in race_analytics.RaceAnalysis(race_data).summarize().items()}
+    except Exception:
+        logger.warning("Could not analyze race")
+        logger.warning(traceback.format_exc())
+    return summary
+
+
+class RaceCache():
+    """Race summaries on disk, keyed by a hash of the race_scenario blob.
+    The least recently used summaries are removed once the cache grows past max_size.
+    Reads only write to the database when a batch of hits is flushed, so CSV export workers do not wait on each other."""
+
+    def __init__(self, path, max_size=MAX_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.connection = None
+        self.lock = threading.Lock()
+        self.pending_uses = {}  # key -> time of the last hit not written yet
+        self.last_flush_time = time.monotonic()
+        self.puts_since_evict_check = 0
+
+    def connect(self):
+        if self.connection is not None:
+            return self.connection
+        # CSV export workers share the file, so wait for their writes instead of failing.
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        # Checked and upgraded in one write transaction, so a worker that starts at the same time
+        # waits and then sees the new version instead of dropping the table again.
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute("PRAGMA user_version").fetchone()[0] != RACE_CACHE_VERSION:
+                connection.execute("DROP TABLE IF EXISTS race_summary")
+                connection.execute(f"PRAGMA user_version = {RACE_CACHE_VERSION}")
+            connection.execute("""CREATE TABLE IF NOT EXISTS race_summary (
+                key BLOB PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS race_summary_last_used ON race_summary (last_used)")
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            connection.close()
+            raise
+        self.connection = connection
+        return connection
+
+    def get(self, key):
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute("SELECT data FROM race_summary WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.pending_uses[key] = time.time()
+            if len(self.pending_uses) >= USE_FLUSH_COUNT or time.monotonic() - self.last_flush_time >= USE_FLUSH_INTERVAL:
+                self.flush_uses(connection)
+                connection.commit()
+        return msgpack.unpackb(row[0], raw=False, strict_map_key=False)
+
+    def flush_uses(self, connection):
+        """Writes the pending hits to last_used. Committed by the caller."""
+        if self.pending_uses:
+            connection.executemany("UPDATE race_summary SET last_used = ? WHERE key = ?",
+                                   [(last_used, key) for key, last_used in self.pending_uses.items()])
+            self.pending_uses = {}
+        self.last_flush_time = time.monotonic()
+
+    def put(self, key, summary):
+        data = msgpack.packb(summary, use_bin_type=True)
+        with self.lock:
+            connection = self.connect()
+            connection.execute("INSERT OR REPLACE INTO race_summary (key, data, size, last_used) VALUES (?, ?, ?, ?)",
+                               (key, data, len(data), time.time()))
+            # Already writing, so the pending hits go in the same transaction.
+            self.flush_uses(connection)
+            connection.commit()
+            self.puts_since_evict_check += 1
+            if self.puts_since_evict_check >= EVICT_CHECK_INTERVAL:
+                self.puts_since_evict_check = 0
+                self.evict(connection)
+
+    def evict(self, connection):
+        total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM race_summary").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        # Remove down to 90% so the next few inserts do not evict again.
+        to_free = total_size - self.max_size * 0.9
+        freed = 0
+        keys = []
+        for key, size in connection.execute("SELECT key, size FROM race_summary ORDER BY last_used"):
+            keys.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+        connection.executemany("DELETE FROM race_summary WHERE key = ?", keys)
+        connection.commit()
+        logger.debug(f"Evicted {len(keys)} race summaries from the race cache.")
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                try:
+                    self.flush_uses(self.connection)
+                    self.connection.commit()
+                except sqlite3.Error:
+                    logger.warning(f"Could not update race cache: {traceback.format_exc()}")
+                self.connection.close()
+                self.connection = None
+
+
+RACE_CACHE = None
+def get_race_cache():
+    global RACE_CACHE
+    if RACE_CACHE is None:
+        RACE_CACHE = RaceCache(util.get_appdata(RACE_CACHE_FILE))
+    return RACE_CACHE
+
+
+def get_race_summary(race_scenario):
+    """Returns the race summary, decoding the race only if it is not cached yet."""
+    race_cache = get_race_cache()
+    key = get_race_key(race_scenario)
+    try:
+        summary = race_cache.get(key)
+        if summary is not None:
+            return summary
+    except sqlite3.Error:
+        logger.warning(f"Could not read race cache: {traceback.format_exc()}")
+
+    summary = summarize_race(race_scenario)
+    try:
+        race_cache.put(key, summary)
+    except sqlite3.Error:
+        logger.warning(f"Could not write race cache: {traceback.format_exc()}")
+    return summary
@@ -0,0 +1,349 @@
+"""Replays recorded packets through CarrotJuicer without the game or a browser.
+
+Usage: python replay.py [--mdb master.mdb] [--repeat N] [--allocations] <path> [<path> ...]
+
+A path is either a training log (.umalog or .gz) or a folder of save_packets dumps
+(*_packet_in.json responses and *_packet_out.json requests).
+Set IS_UL_GLOBAL for packets from the global version.
+
+Packets are handled one after another at full speed. The helper table is built and rendered
+right away instead of on the browser thread, and the browser only counts the scripts it is sent.
+Reports per-packet latency percentiles, the time spent in master data lookups, building the
+helper table and rendering it, and with --allocations the memory allocated per packet.
+"""
+import os
+import sys
+import time
+import glob
+import json
+import copy
+import types
+import argparse
+import functools
+import collections
+import tracemalloc
+
+
+# Modules that only exist on Windows. On other platforms they are replaced by placeholders
+# so the packet handling code can be imported. Nothing that needs them is run during a replay.
+WINDOWS_ONLY_MODULES = (
+    "win32api", "win32con", "win32gui", "win32event", "win32file", "win32process", "win32clipboard",
+    "win32com", "win32com.shell", "win32com.shell.shell", "win32com.shell.shellcon", "pywintypes", "SteamPathFinder",
+)
+
+
+class PlaceholderModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+def install_platform_placeholders():
+    for name in WINDOWS_ONLY_MODULES:
+        if name in sys.modules:
+            continue
+        module = PlaceholderModule(name)
+        module.__path__ = []
+        sys.modules[name] = module
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(sys.modules[parent], child, module)
+    sys.modules["pywintypes"].error = type("error", (Exception,), {})
+
+    import subprocess
+    if not hasattr(subprocess, "CREATE_NO_WINDOW"):
+        subprocess.CREATE_NO_WINDOW = 0
+
+
+if sys.platform != "win32":
+    install_platform_placeholders()
+
+# Assets are found relative to the working directory, like when the launcher runs from source.
+LAUNCH_DIR = os.getcwd()
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from loguru import logger
+import util
+
+
+def log_message_box(error, message, *args, **kwargs):
+    logger.error(f"{error}: {message}")
+
+# Message boxes would wait for someone to close them.
+for name in ("show_error_box", "show_error_box_no_report", "show_warning_box", "show_info_box"):
+    setattr(util, name, log_message_box)
+
+import mdb
+import settings
+import training_log
+import helper_table
+import helper_table_elements
+import carrotjuicer
+import image_cache
+
+
+class ReplayBrowser():
+    """Stands in for horsium.BrowserWindow. Scripts are counted, not run."""
+
+    def __init__(self, url):
+        self.url = url
+        self.script_count = 0
+        self.script_bytes = 0
+
+    def execute_script(self, script, *args):
+        self.script_count += 1
+        self.script_bytes += len(script) + sum(len(arg) for arg in args if isinstance(arg, str))
+        return None
+
+    def alive(self):
+        return True
+
+    def current_url(self):
+        return self.url
+
+    def set_topmost(self, is_topmost):
+        pass
+
+    def set_window_rect(self, rect):
+        pass
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+class ReplaySettingsHandler(settings.SettingsHandler):
+    """The default settings. The user's settings file is neither read nor written, and there is no update check."""
+
+    def __init__(self, threader):
+        self.threader = threader
+        self.loaded_settings = settings.DefaultSettings()
+
+    def load_settings(self, first_load=False):
+        pass
+
+    def save_settings(self):
+        pass
+
+
+class ReplayThreader():
+    """The parts of Threader that CarrotJuicer uses. There is no screen state handler, so screen state updates are skipped."""
+    settings = None
+    screenstate = None
+    windowmover = None
+
+    # Settings that would write files or open windows during a replay.
+    SETTING_OVERRIDES = {
+        "save_packets": False,
+        "track_trainings": False,
+        "enable_carrotjuicer": True,
+        "enable_browser": True,
+    }
+
+    def __init__(self):
+        self.settings = ReplaySettingsHandler(self)
+        for key, value in self.SETTING_OVERRIDES.items():
+            self.settings[key] = value
+
+    def stop(self):
+        pass
+
+
+class ReplayCarrotJuicer(carrotjuicer.CarrotJuicer):
+    """CarrotJuicer with a ReplayBrowser. The helper table is rendered as soon as it is updated."""
+    browsers = None
+    overlay_bytes = 0
+
+    def __init__(self, threader):
+        super().__init__(threader)
+        self.browsers = []
+
+    def open_helper(self):
+        self.browser = ReplayBrowser(self.helper_url)
+        self.browsers.append(self.browser)
+
+    def update_helper_table(self, data):
+        super().update_helper_table(data)
+        data, self.pending_helper_data = self.pending_helper_data, None
+        helper_table = self.helper_table.create_helper_elements(data, None)
+        if helper_table:
+            update, partial_update = helper_table
+            self.overlay_bytes += len(json.dumps(partial_update if partial_update is not None else update))
+
+
+class Profile():
+    """Time spent per category of function. Time spent in a nested category only counts for that category."""
+
+    def __init__(self):
+        self.totals = collections.Counter()
+        self.calls = collections.Counter()
+        self.stack = []
+
+    def wrap(self, owner, name, category):
+        func = getattr(owner, name)
+        profile = self
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if profile.stack and profile.stack[-1][0] == category:
+                return func(*args, **kwargs)
+            frame = [category, 0.]
+            profile.stack.append(frame)
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                profile.stack.pop()
+                profile.totals[category] += elapsed - frame[1]
+                profile.calls[category] += 1
+                if profile.stack:
+                    profile.stack[-1][1] += elapsed
+
+        setattr(owner, name, timed)
+
+    def install(self):
+        for module in (mdb, util):
+            for name, func in list(vars(module).items()):
+                if not isinstance(func, types.FunctionType) or func.__module__ != module.__name__:
+                    continue
+                if module is mdb and name.startswith(("get_", "determine_", "sort_")) or name.startswith("get_") and name.endswith("_dict"):
+                    self.wrap(module, name, "mdb lookups")
+        self.wrap(helper_table.HelperTable, "create_helper_elements", "table building")
+        self.wrap(helper_table_elements.Preset, "generate_overlay_patch", "rendering")
+        self.wrap(helper_table_elements.Preset, "generate_overlay_model", "rendering")
+
+
+def iter_recorded_packets(path):
+    """Yields (packet type, packet) in the form CarrotJuicer receives them."""
+    if os.path.isdir(path):
+        for packet_path in sorted(glob.glob(os.path.join(path, "*_packet_*.json"))):
+            with open(packet_path, "r", encoding="utf-8") as f:
+                packet = json.load(f)
+            yield ("response" if packet_path.endswith("_packet_in.json") else "request"), packet
+        return
+
+    for packet in training_log.TrainingLogReader(path):
+        direction = packet.pop('_direction', 1)
+        if direction == 1:
+            # Training logs keep the response data without the envelope.
+            yield "response", {'data': packet}
+        else:
+            yield "request", packet
+
+
+def get_percentile(values, percentile):
+    if not values:
+        return 0.
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+class ReplayResult():
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.allocations = collections.defaultdict(list)
+        self.errors = 0
+        self.replay_time = 0.
+
+
+def replay(juicer, packets, result, track_allocations):
+    for packet_type, packet in packets:
+        if track_allocations:
+            tracemalloc.reset_peak()
+            memory_before, _ = tracemalloc.get_traced_memory()
+
+        start_time = time.perf_counter()
+        try:
+            if packet_type == "response":
+                juicer.handle_response(packet, is_json=True)
+            else:
+                juicer.handle_request_data(packet)
+        except Exception:
+            result.errors += 1
+            logger.exception(f"Replay: error while handling {packet_type}")
+        elapsed = time.perf_counter() - start_time
+        result.latencies[packet_type].append(elapsed)
+        result.replay_time += elapsed
+
+        if track_allocations:
+            _, memory_peak = tracemalloc.get_traced_memory()
+            result.allocations[packet_type].append(memory_peak - memory_before)
+
+
+def print_report(juicer, result, profile):
+    latencies = result.latencies
+    allocations = result.allocations
+    print(f"{'packets':<10} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'total ms':>9}")
+    for packet_type, times in sorted(latencies.items()):
+        print(f"{packet_type:<10} {len(times):>7} " + " ".join(f"{get_percentile(times, percentile) * 1000:>8.3f}" for percentile in (50, 90, 99, 100)) + f" {sum(times) * 1000:>9.1f}")
+
+    print()
+    print(f"{'time spent':<16} {'calls':>8} {'total ms':>9} {'share':>7}")
+    handled_time = result.replay_time
+    other_time = handled_time - sum(profile.totals.values())
+    for category, category_time in list(profile.totals.most_common()) + [("other handling", other_time)]:
+        share = category_time / handled_time * 100 if handled_time else 0.
+        print(f"{category:<16} {profile.calls.get(category, ''):>8} {category_time * 1000:>9.1f} {share:>6.1f}%")
+
+    if allocations:
+        print()
+        print(f"{'allocated':<10} {'p50 KiB':>9} {'p99 KiB':>9} {'max KiB':>9}")
+        for packet_type, sizes in sorted(allocations.items()):
+            print(f"{packet_type:<10} " + " ".join(f"{get_percentile(sizes, percentile) / 1024:>9.1f}" for percentile in (50, 99, 100)))
+        print("Timings include tracemalloc overhead.")
+
+    print()
+    print(f"Browser scripts: {sum(browser.script_count for browser in juicer.browsers)}, "
+          f"{sum(browser.script_bytes for browser in juicer.browsers) / 1024:.0f} KiB, overlay sent: {juicer.overlay_bytes / 1024:.0f} KiB")
+    print(f"Errors: {result.errors}")
+
+
+def set_log_level(level):
+    logger.remove()
+    logger.add(sys.stderr, level=level)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays recorded packets through CarrotJuicer and reports where the time goes.")
+    parser.add_argument("paths", nargs="+", help="Training logs or folders of save_packets dumps.")
+    parser.add_argument("--mdb", help="master.mdb to use instead of the game's.")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the packets this many times.")
+    parser.add_argument("--allocations", action="store_true", help="Measure memory allocated per packet.")
+    parser.add_argument("--browser-rendering", action="store_true", help="Send the table as a model to be built in the browser.")
+    parser.add_argument("--log-level", default="WARNING", help="Log level of the launcher's own logging.")
+    args = parser.parse_args()
+
+    set_log_level(args.log_level)
+
+    if args.browser_rendering:
+        ReplayThreader.SETTING_OVERRIDES["overlay_browser_rendering"] = True
+    if args.mdb:
+        mdb.DB_PATH = os.path.join(LAUNCH_DIR, args.mdb)
+    # Asset and name refreshes go over the network, which is not what is measured here.
+    mdb.update_mdb_cache = lambda background=True: mdb.get_master_data(force=True)
+    image_cache.prefetch_deck_icons = lambda chara_info: None
+
+    packets = [packet for path in args.paths for packet in iter_recorded_packets(os.path.join(LAUNCH_DIR, path))]
+    print(f"Loaded {len(packets)} packets.")
+
+    # Creating the juicer loads the master data, which should not be part of the timings.
+    juicer = ReplayCarrotJuicer(ReplayThreader())
+
+    profile = Profile()
+    profile.install()
+    if args.allocations:
+        tracemalloc.start()
+
+    result = ReplayResult()
+    for _ in range(args.repeat):
+        # Handling changes the packets, so every pass gets its own copy.
+        replay(juicer, copy.deepcopy(packets), result, args.allocations)
+    print_report(juicer, result, profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ import win32clipboard
 from requests import JSONDecodeError, HTTPError
 import presence_screens as scr
 import util
+import profiler
 import dmm
 import mdb
 import vpn
@@ -76,11 +77,14 @@ class ScreenState:
         else:
             self.small_text = self.large_text
         self.large_image = chara_icon
-        if chara_id in self.handler.chara_names_dict:
-            self.large_text = self.handler.chara_names_dict[chara_id]
+        # Looked up every time, the names are replaced when umapyoi.net has newer ones.
+        chara_names_dict = util.get_character_name_dict()
+        outfit_names_dict = util.get_outfit_name_dict()
+        if chara_id in chara_names_dict:
+            self.large_text = chara_names_dict[chara_id]
             if outfit_id:
-                if outfit_id in self.handler.outfit_names_dict:
-                    self.large_text += f"\n{self.handler.outfit_names_dict[outfit_id]}"
+                if outfit_id in outfit_names_dict:
+                    self.large_text += f"\n{outfit_names_dict[outfit_id]}"
         else:
             self.large_text = None
 
@@ -136,17 +140,12 @@ class ScreenStateHandler():
     fallback_chara_icon = "chara_0000"
     fallback_music_icon = "music_0000"
 
-    chara_names_dict = None
-    outfit_names_dict = None
-
     vpn = None
 
     def __init__(self, threader):
         self.threader = threader
 
         self.get_available_icons()
-        self.chara_names_dict = util.get_character_name_dict()
-        self.outfit_names_dict = util.get_outfit_name_dict()
         self.screen_state = ScreenState(self)
 
         self.last_seen = time.perf_counter()
@@ -188,6 +187,7 @@ class ScreenStateHandler():
         self.available_music_icons = music_icons
 
 
+    @profiler.timed("screenstate.screenshot")
     def get_screenshot(self):
         if util.is_minimized(self.game_handle):
             # logger.warning("Game is minimized, cannot get screenshot.")
@@ -370,7 +370,8 @@ class ScreenStateHandler():
                     self.rpc_last_update = cur_update
                     self.rpc_latest_state = self.screen_state
                     try:
-                        self.rpc.update(**self.screen_state.to_dict())
+                        with profiler.span("screenstate.rich_presence"):
+                            self.rpc.update(**self.screen_state.to_dict())
                     except Exception:
                         # RPC not connected. Continue
                         self.close_rpc()
@@ -401,6 +402,7 @@ class ScreenStateHandler():
         self.rpc_latest_state = None
         return
 
+    @profiler.timed("screenstate.update")
     def update(self):
         new_state = self.determine_state()
 
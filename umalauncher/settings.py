@@ -13,6 +13,7 @@ import gui
 import settings_elements as se
 import helper_table_defaults as htd
 import helper_table_elements as hte
+import profiler
 
 
 class DefaultSettings(se.NewSettings):
@@ -93,6 +94,12 @@ class DefaultSettings(se.NewSettings):
             False,
             se.SettingType.BOOL,
         ),
+        "profiling": se.Setting(
+            "Profiling",
+            "Measure how long the launcher's work takes and log a summary every minute.<br>The summary is also available at http://127.0.0.1:3150/profile",
+            False,
+            se.SettingType.BOOL,
+        ),
         # "game_install_path = se.Setting(
         #     "Game install path",
         #     "Path to the game's installation folder. (Where DMM installed the game and umamusume.exe is located.)",
@@ -185,6 +192,13 @@ class DefaultSettings(se.NewSettings):
             se.SettingType.RADIOBUTTONS,
             tab="Event Helper"
         ),
+        "overlay_browser_rendering": se.Setting(
+            "Build the overlay table in the browser",
+            "Send the training table as numbers and build it in the browser instead of sending its HTML every turn.<br>Looks the same either way.",
+            False,
+            se.SettingType.BOOL,
+            tab="Event Helper"
+        ),
         "custom_browser_divider": se.Setting(
             "Custom browser divider",
             None,
@@ -448,6 +462,8 @@ class SettingsHandler():
             util.log_set_info()
             logger.debug("Debug mode disabled. Logging less.")
 
+        profiler.set_enabled(self['profiling'])
+
         # # Check if the game install path is correct.
         # for folder_tuple in [
         #     ('s_game_install_path', "umamusume.exe", "Please choose the game's installation folder.\n(Where umamusume.exe is located.)", "Selected folder does not include umamusume.exe.\nPlease try again.")
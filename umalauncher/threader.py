@@ -1,22 +1,37 @@
+import multiprocessing
+if __name__ == "__main__":
+    # CSV export workers are started from this executable. Run their code and exit before anything else loads.
+    multiprocessing.freeze_support()
+
 import util
 import sys
+import os
 
-gzips = list([path for path in sys.argv if path.endswith(".gz")])
-if gzips:
-    # User dropped file(s) on the launcher.
-    # Use them for CSV generation.
-    import training_tracker
-    training_tracker.training_csv_dialog(gzips)
-    sys.exit()
-
-if not util.elevate():
-    util.show_warning_box("Launch Error", "Uma Launcher needs administrator privileges to start.")
-    sys.exit()
+# Process pool workers import this script as __mp_main__ and must not start the launcher.
+if __name__ == "__main__":
+    training_logs = list([path for path in sys.argv if path.endswith((".umalog", ".gz"))])
+    if training_logs:
+        # User dropped file(s) on the launcher.
+        # Use them for CSV generation.
+        import training_tracker
+        training_tracker.training_csv_dialog(training_logs)
+        sys.exit()
+
+    training_log_folders = list([path for path in sys.argv[1:] if os.path.isdir(path)])
+    if training_log_folders:
+        # User dropped folder(s) on the launcher.
+        # Export the race statistics of the logs inside.
+        import training_tracker
+        training_tracker.race_stats_csv_dialog(training_log_folders)
+        sys.exit()
+
+    if not util.elevate():
+        util.show_warning_box("Launch Error", "Uma Launcher needs administrator privileges to start.")
+        sys.exit()
 
 import threading
 import time
 import psutil
-import os
 import win32api
 from loguru import logger
 import requests
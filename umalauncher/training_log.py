@@ -0,0 +1,371 @@
+# Training log container.
+#
+# Layout:
+#   header   MAGIC, format version, record codec
+#   blocks   "B", compressed size, record count, turn at block start, zlib(records)
+#            each record is a u32 length followed by the encoded packet
+#   footer   "X", compressed size, zlib(JSON list of [turn, block offset])
+#   trailer  offset of the footer, TRAILER_MAGIC
+#
+# A new block is started at every turn so the footer can map turns to offsets.
+# The footer is only a shortcut: files that were not closed cleanly are read by
+# walking the block headers, and an incomplete last block is dropped when the
+# file is opened for appending again.
+#
+# Logs written before this format are gzip files containing comma-separated
+# JSON objects. They are still accepted by TrainingLogReader.
+import os
+import json
+import gzip
+import zlib
+import queue
+import struct
+import codecs
+import threading
+import traceback
+import msgpack
+from loguru import logger
+import profiler
+
+LOG_EXTENSION = ".umalog"
+LEGACY_LOG_EXTENSION = ".gz"
+LOG_EXTENSIONS = (LOG_EXTENSION, LEGACY_LOG_EXTENSION)
+
+MAGIC = b"ULTLOG\x00"
+FORMAT_VERSION = 1
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+
+HEADER = struct.Struct("<7sBB")
+BLOCK_HEADER = struct.Struct("<cIIi")
+RECORD_LENGTH = struct.Struct("<I")
+FOOTER_HEADER = struct.Struct("<cI")
+TRAILER = struct.Struct("<Q8s")
+TRAILER_MAGIC = b"ULTLIDX\x00"
+
+BLOCK_MARKER = b"B"
+FOOTER_MARKER = b"X"
+
+MAX_BLOCK_SIZE = 256 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def is_legacy_log(path):
+    with open(path, "rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def get_packet_turn(packet):
+    """Returns the turn a response packet shows, or None."""
+    if packet.get('_direction') != 1:
+        return None
+    chara_info = packet.get('chara_info')
+    if not chara_info:
+        return None
+    return chara_info.get('turn')
+
+
+def encode_packet(packet, codec):
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(packet, use_bin_type=True)
+    return json.dumps(packet, ensure_ascii=False).encode("utf-8")
+
+
+def decode_packet(data, codec):
+    if codec == CODEC_MSGPACK:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(data)
+
+
+def scan_blocks(f, start, end):
+    """Walks the block headers between start and end.
+    Returns the turn index and the offset where the last complete block ends."""
+    turn_index = []
+    offset = start
+    while offset + BLOCK_HEADER.size <= end:
+        f.seek(offset)
+        marker, size, _, turn = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+        if marker != BLOCK_MARKER or offset + BLOCK_HEADER.size + size > end:
+            break
+        if not turn_index or turn_index[-1][0] != turn:
+            turn_index.append((turn, offset))
+        offset += BLOCK_HEADER.size + size
+    return turn_index, offset
+
+
+def read_footer(f, file_size):
+    """Returns (turn index, footer offset) if the file ends with a valid footer, else (None, None)."""
+    if file_size < HEADER.size + TRAILER.size:
+        return None, None
+    f.seek(file_size - TRAILER.size)
+    footer_offset, trailer_magic = TRAILER.unpack(f.read(TRAILER.size))
+    if trailer_magic != TRAILER_MAGIC or footer_offset >= file_size:
+        return None, None
+    f.seek(footer_offset)
+    marker, size = FOOTER_HEADER.unpack(f.read(FOOTER_HEADER.size))
+    if marker != FOOTER_MARKER:
+        return None, None
+    try:
+        turn_index = json.loads(zlib.decompress(f.read(size)))
+    except (zlib.error, ValueError):
+        return None, None
+    return [tuple(item) for item in turn_index], footer_offset
+
+
+class TrainingLogWriter():
+    """Appends packets to a training log. The file stays open until close() is called."""
+
+    def __init__(self, path, codec=CODEC_MSGPACK):
+        self.path = path
+        self.codec = codec
+        self.block_records = []
+        self.block_size = 0
+        self.block_turn = 0
+        self.turn_index = []
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, "r+b")
+            self.reopen()
+        else:
+            self.file = open(path, "wb")
+            self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.codec))
+
+    def reopen(self):
+        """Prepares an existing log for appending by dropping its footer or any incomplete block."""
+        file_size = os.path.getsize(self.path)
+        magic, _, self.codec = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a training log.")
+
+        turn_index, footer_offset = read_footer(self.file, file_size)
+        if turn_index is None:
+            logger.warning(f"Training log {self.path} was not closed cleanly. Recovering.")
+            turn_index, footer_offset = scan_blocks(self.file, HEADER.size, file_size)
+
+        self.turn_index = turn_index
+        if turn_index:
+            self.block_turn = turn_index[-1][0]
+        self.file.seek(footer_offset)
+        self.file.truncate()
+
+    def write(self, packet):
+        return self.write_record(encode_packet(packet, self.codec), get_packet_turn(packet))
+
+    def write_record(self, record, turn):
+        """Adds an encoded packet. Returns True if it ended a turn."""
+        self.block_records.append(RECORD_LENGTH.pack(len(record)))
+        self.block_records.append(record)
+        self.block_size += RECORD_LENGTH.size + len(record)
+
+        if turn is not None and turn > self.block_turn:
+            # Start a new block so the next turn can be found through the index.
+            self.flush_block()
+            self.block_turn = turn
+            return True
+        if self.block_size >= MAX_BLOCK_SIZE:
+            self.flush_block()
+        return False
+
+    def flush_block(self):
+        if not self.block_records:
+            return
+        offset = self.file.tell()
+        compressed = zlib.compress(b"".join(self.block_records))
+        self.file.write(BLOCK_HEADER.pack(BLOCK_MARKER, len(compressed), len(self.block_records) // 2, self.block_turn))
+        self.file.write(compressed)
+        if not self.turn_index or self.turn_index[-1][0] != self.block_turn:
+            self.turn_index.append((self.block_turn, offset))
+        self.block_records = []
+        self.block_size = 0
+
+    def flush(self, sync=False):
+        self.flush_block()
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush_block()
+        footer_offset = self.file.tell()
+        footer = zlib.compress(json.dumps(self.turn_index).encode("utf-8"))
+        self.file.write(FOOTER_HEADER.pack(FOOTER_MARKER, len(footer)))
+        self.file.write(footer)
+        self.file.write(TRAILER.pack(footer_offset, TRAILER_MAGIC))
+        self.file.close()
+
+
+class LegacyTrainingLogWriter():
+    """Appends packets to a log in the old gzip format. Only used for runs that were started with it."""
+
+    def __init__(self, path):
+        self.path = path
+        self.codec = CODEC_JSON
+
+    def write_record(self, record, turn):
+        # Append a gzip member with the packet, separated by a comma.
+        is_first = not os.path.exists(self.path)
+        with gzip.open(self.path, 'ab') as f:
+            if not is_first:
+                f.write(b',')
+            f.write(record)
+        return False
+
+    def flush(self, sync=False):
+        pass
+
+    def close(self):
+        pass
+
+
+class BackgroundLogWriter():
+    """Writes packets on a separate thread so disk latency does not hold up packet handling.
+    Packets are encoded by the caller, so later changes to the packet dict do not end up in the log.
+    Each turn is fsynced once it ends. close() writes everything that is still queued."""
+
+    QUEUE_SIZE = 1024
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, packet):
+        with profiler.span("training_log.encode"):
+            record = encode_packet(packet, self.writer.codec)
+        self.queue.put((record, get_packet_turn(packet)))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                with profiler.span("training_log.write"):
+                    if self.writer.write_record(*item):
+                        self.writer.flush(sync=True)
+            except Exception:
+                logger.error(f"Failed to write to training log {self.writer.path}")
+                logger.error(traceback.format_exc())
+
+    def close(self):
+        if not self.thread.is_alive():
+            return
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            self.writer.close()
+        except Exception:
+            logger.error(f"Failed to close training log {self.writer.path}")
+            logger.error(traceback.format_exc())
+
+
+def open_log_writer(path):
+    if path.endswith(LEGACY_LOG_EXTENSION):
+        writer = LegacyTrainingLogWriter(path)
+    else:
+        writer = TrainingLogWriter(path)
+    return BackgroundLogWriter(writer)
+
+
+class TrainingLogReader():
+    """Streams packets from a training log in either format."""
+
+    LEGACY_READ_SIZE = 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.legacy = is_legacy_log(path)
+
+    def get_turn_index(self):
+        """Returns a list of (turn, block offset) for the new format, or None for legacy logs."""
+        if self.legacy:
+            return None
+        with open(self.path, "rb") as f:
+            file_size = os.path.getsize(self.path)
+            turn_index, _ = read_footer(f, file_size)
+            if turn_index is None:
+                turn_index, _ = scan_blocks(f, HEADER.size, file_size)
+        return turn_index
+
+    def __iter__(self):
+        return self.iter_packets()
+
+    def iter_packets(self, from_turn=None):
+        """Yields packets one at a time.
+        If from_turn is given, starts at the packets sent during that turn."""
+        if self.legacy:
+            yield from self.iter_legacy_packets(from_turn)
+        else:
+            yield from self.iter_block_packets(from_turn)
+
+    def iter_block_packets(self, from_turn):
+        with open(self.path, "rb") as f:
+            file_size = os.path.getsize(self.path)
+            magic, _, codec = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a training log.")
+
+            turn_index, end = read_footer(f, file_size)
+            if turn_index is None:
+                turn_index, end = scan_blocks(f, HEADER.size, file_size)
+
+            offset = HEADER.size
+            if from_turn is not None:
+                later_blocks = [block_offset for turn, block_offset in turn_index if turn >= from_turn]
+                if not later_blocks:
+                    return
+                offset = later_blocks[0]
+
+            while offset + BLOCK_HEADER.size <= end:
+                f.seek(offset)
+                marker, size, _, _ = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+                if marker != BLOCK_MARKER:
+                    break
+                block = zlib.decompress(f.read(size))
+                offset += BLOCK_HEADER.size + size
+
+                position = 0
+                while position < len(block):
+                    (length,) = RECORD_LENGTH.unpack_from(block, position)
+                    position += RECORD_LENGTH.size
+                    yield decode_packet(block[position:position + length], codec)
+                    position += length
+
+    def iter_legacy_packets(self, from_turn):
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        position = 0
+        seeking = from_turn is not None
+        with gzip.open(self.path, "rb") as f:
+            eof = False
+            while True:
+                # Skip separators between objects.
+                while position < len(buffer) and buffer[position] in ", \n\r\t":
+                    position += 1
+
+                try:
+                    if position >= len(buffer):
+                        raise ValueError("Need more data")
+                    packet, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if eof:
+                        if buffer[position:].strip():
+                            logger.warning(f"Trailing data in {self.path} could not be parsed.")
+                        return
+                    chunk = f.read(self.LEGACY_READ_SIZE)
+                    eof = not chunk
+                    buffer = buffer[position:] + text_decoder.decode(chunk, final=eof)
+                    position = 0
+                    continue
+
+                position = end
+                if seeking:
+                    turn = get_packet_turn(packet)
+                    if turn is not None and turn >= from_turn:
+                        seeking = False
+                    continue
+                yield packet
@@ -1,9 +1,8 @@
 import os
-import json
-import gzip
 import re
 import time
 import threading
+import concurrent.futures
 import traceback
 import win32gui
 import win32con
@@ -21,13 +20,16 @@ import gui
 import mdb
 import util
 import constants
-from external import race_data_parser
+import training_log
+import race_cache
+import profiler
 
 
 class TrainingTracker():
 
     def __init__(self, training_id: str, card_id: int=None, training_log_folder: str=util.TRAINING_LOGS_FOLDER, full_path: str=None):
         self.full_path=full_path
+        self.log_writer = None
         if not training_log_folder:
             training_log_folder = util.TRAINING_LOGS_FOLDER
         self.training_log_folder = training_log_folder
@@ -92,7 +94,11 @@ class TrainingTracker():
 
 
     def get_sav_path(self):
-        return self.get_training_path(".gz")
+        # Runs that were started with an older version keep using the old format.
+        legacy_path = self.get_training_path(training_log.LEGACY_LOG_EXTENSION)
+        if os.path.exists(legacy_path) and not os.path.exists(self.get_training_path(training_log.LOG_EXTENSION)):
+            return legacy_path
+        return self.get_training_path(training_log.LOG_EXTENSION)
 
 
     def get_csv_path(self):
@@ -100,22 +106,29 @@ class TrainingTracker():
 
 
     def write_packet(self, packet: dict):
-        # Convert to json string and save with gzip
-        # Append to gzip if file exists
-        is_first = not os.path.exists(self.get_sav_path())
-        if packet is not None:
-            with gzip.open(self.get_sav_path(), 'ab') as f:
-                if not is_first:
-                    f.write(','.encode('utf-8'))
-                f.write(json.dumps(packet, ensure_ascii=False).encode('utf-8'))
+        if packet is None:
+            return
+
+        if self.log_writer is None:
+            self.log_writer = training_log.open_log_writer(self.get_sav_path())
+        self.log_writer.write(packet)
+
+
+    def close(self):
+        if self.log_writer is not None:
+            self.log_writer.close()
+            self.log_writer = None
+
+
+    def iter_packets(self, from_turn=None):
+        if not os.path.exists(self.get_sav_path()):
+            return iter(())
+        return training_log.TrainingLogReader(self.get_sav_path()).iter_packets(from_turn)
 
 
     def load_packets(self):
-        packet_list = []
         logger.debug("Loading packets from file")
-        if os.path.exists(self.get_sav_path()):
-            with gzip.open(self.get_sav_path(), 'rb') as f:
-                packet_list = json.loads(f"[{f.read().decode('utf-8')}]")
+        packet_list = list(self.iter_packets())
         logger.debug(f"Amount of packets loaded: {len(packet_list)}")
         return packet_list
 
@@ -256,11 +269,32 @@ class TrainingAction():
     add_skillhint: set = field(default_factory=set)
     add_status: set = field(default_factory=set)
     remove_status: set = field(default_factory=set)
+    race_stats: dict = field(default_factory=dict)
+
+
+RACE_STAT_COLUMNS = [
+    ("Race Top Speed", 'top_speed'),
+    ("Race HP Left", 'hp_left'),
+    ("Race Spurt Start", 'spurt_start_distance'),
+    ("Race Planned Spurt", 'planned_spurt_distance'),
+    ("Race Spurt Delay", 'spurt_delay'),
+    ("Race Lane Changes", 'lane_changes'),
+    ("Race Blocked Count", 'blocked_count'),
+    ("Race Blocked Time", 'blocked_time'),
+]
+
+
+def format_race_stat(value):
+    if value is None or value != value:
+        # Missing or NaN
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return value
 
 
 class TrainingAnalyzer():
     training_tracker = None
-    packets = None
     last_turn = 0
     scenario_id = None
     card_id = None
@@ -271,23 +305,40 @@ class TrainingAnalyzer():
     last_mant_shop_items_dict = {}
     next_action_type = None
     gm_effect_active = False
-    action_list = []
-
-    def __init__(self):
-        self.chara_names_dict = util.get_character_name_dict()
-        self.event_title_dict = mdb.get_event_title_dict()
-        self.race_program_name_dict = mdb.get_race_program_name_dict()
-        self.skill_name_dict = mdb.get_skill_name_dict()
-        self.skill_hint_name_dict = mdb.get_skill_hint_name_dict()
-        self.status_name_dict = mdb.get_status_name_dict()
-        self.outfit_name_dict = util.get_outfit_name_dict()
-        self.support_card_string_dict = mdb.get_support_card_string_dict()
-        self.mant_item_string_dict = mdb.get_mant_item_string_dict()
-        self.gl_lesson_dict = mdb.get_gl_lesson_dict()
+    last_action = None
+
+    def __init__(self, snapshot=None):
+        # The snapshot holds every lookup the analyzer needs, so process pool workers
+        # can be created from it without opening the mdb themselves.
+        if snapshot is None:
+            snapshot = {
+                'chara_names_dict': util.get_character_name_dict(),
+                'event_title_dict': mdb.get_event_title_dict(),
+                'race_program_name_dict': mdb.get_race_program_name_dict(),
+                'skill_name_dict': mdb.get_skill_name_dict(),
+                'skill_hint_name_dict': mdb.get_skill_hint_name_dict(),
+                'status_name_dict': mdb.get_status_name_dict(),
+                'outfit_name_dict': util.get_outfit_name_dict(),
+                'support_card_dict': mdb.get_support_card_dict(),
+                'support_card_string_dict': mdb.get_support_card_string_dict(),
+                'mant_item_string_dict': mdb.get_mant_item_string_dict(),
+                'gl_lesson_dict': mdb.get_gl_lesson_dict(),
+            }
+        self.snapshot = snapshot
+        self.chara_names_dict = snapshot['chara_names_dict']
+        self.event_title_dict = snapshot['event_title_dict']
+        self.race_program_name_dict = snapshot['race_program_name_dict']
+        self.skill_name_dict = snapshot['skill_name_dict']
+        self.skill_hint_name_dict = snapshot['skill_hint_name_dict']
+        self.status_name_dict = snapshot['status_name_dict']
+        self.outfit_name_dict = snapshot['outfit_name_dict']
+        self.support_card_dict = snapshot['support_card_dict']
+        self.support_card_string_dict = snapshot['support_card_string_dict']
+        self.mant_item_string_dict = snapshot['mant_item_string_dict']
+        self.gl_lesson_dict = snapshot['gl_lesson_dict']
 
     def set_training_tracker(self, training_tracker):
         self.training_tracker = training_tracker
-        self.packets = None
         self.last_turn = 0
         self.scenario_id = None
         self.card_id = None
@@ -298,26 +349,28 @@ class TrainingAnalyzer():
         self.last_mant_shop_items_dict = {}
         self.next_action_type = None
         self.gm_effect_active = False
-        self.action_list = []
-        self.packets = self.training_tracker.load_packets()
+        self.last_action = None
 
-    def to_csv_list(self):
-        self.action_list = []
-
-        # Grab req/resp pairs
-        prev_resp = None
-        # for i in range(0, len(self.packets), 2):
-        packet_index = 0
-        while packet_index < len(self.packets) - 1:
-            req = self.packets[packet_index]
-            resp = self.packets[packet_index+1]
+    def iter_packet_pairs(self, packets):
+        """Yields (request, response) pairs from a packet stream."""
+        packets = iter(packets)
+        for req in packets:
+            resp = next(packets, None)
 
             # Check if response really is a response
-            while resp['_direction'] != 1:
-                packet_index += 1
-                resp = self.packets[packet_index+1]
-            packet_index += 2
+            while resp is not None and resp['_direction'] != 1:
+                resp = next(packets, None)
+
+            if resp is None:
+                return
+            yield req, resp
+
+    def iter_actions(self):
+        """Yields the actions of the run one at a time, reading the log as it goes."""
+        self.last_action = None
 
+        prev_resp = None
+        for pair_index, (req, resp) in enumerate(self.iter_packet_pairs(self.training_tracker.iter_packets())):
             if 'chara_info' in resp:
                 chara_info = resp['chara_info']
 
@@ -373,18 +426,18 @@ class TrainingAnalyzer():
                     power = this_horse_data['pow'],
                     guts = this_horse_data['guts'],
                     wisdom = this_horse_data['wiz'],
-                    skill_pt = self.action_list[-1].skill_pt,
-                    energy = self.action_list[-1].energy,
+                    skill_pt = self.last_action.skill_pt,
+                    energy = self.last_action.energy,
                     motivation = this_horse_data['motivation'],
                     fans = this_horse_data['fan_count'] if 'fan_count' in this_horse_data else -1,
                     skill = {tuple(item.values()) for item in this_horse_data['skill_array']},
-                    skillhint = self.action_list[-1].skillhint,
-                    status = self.action_list[-1].status
+                    skillhint = self.last_action.skillhint,
+                    status = self.last_action.status
                 )
 
             else:
                 # Unknown packet
-                logger.error(f'Unknown response packet type at index {packet_index}: {resp}')
+                logger.error(f'Unknown response packet type at pair {pair_index}: {resp}')
                 continue
 
             # Determine if turn changed
@@ -394,8 +447,8 @@ class TrainingAnalyzer():
                 self.gm_effect_active = False
 
             # Calculate deltas
-            if self.action_list:
-                prev_action = self.action_list[-1]
+            if self.last_action:
+                prev_action = self.last_action
                 action.dspeed = action.speed - prev_action.speed
                 action.dstamina = action.stamina - prev_action.stamina
                 action.dpower = action.power - prev_action.power
@@ -415,15 +468,16 @@ class TrainingAnalyzer():
             # Determine action type
             self.determine_action_type(req, resp, action, prev_resp)
 
-            # Add to list
-            self.action_list.append(action)
+            self.last_action = action
+            yield action
 
             if 'home_info' in resp:
                 self.last_failure_rates = {command['command_id']: command['failure_rate'] for command in resp['home_info']['command_info_array']}
 
             prev_resp = resp
 
-        # Write to CSV
+    def get_csv_headers(self):
+        """Returns the CSV columns. Must be called after the first action was read."""
         scenario_str = constants.SCENARIO_DICT.get(self.scenario_id, 'Unknown Scenario')
         chara_str = f"{self.chara_names_dict.get(self.chara_id, 'Unknown Character')} {self.outfit_name_dict.get(self.card_id, 'Unknown Outfit')}"
         support_1_str = f"{self.support_cards[0]['support_card_id']} - {self.support_card_string_dict[self.support_cards[0]['support_card_id']]}"
@@ -470,20 +524,23 @@ class TrainingAnalyzer():
                 ("Skill Hints Added", lambda x: "|".join([self.skill_hint_name_dict[(skillhint[0], skillhint[1])] + f" LVL{skillhint[2]}" for skillhint in x.add_skillhint])),
                 ("Statuses Added", lambda x: "|".join([self.status_name_dict[status] for status in x.add_status])),
                 ("Statuses Removed", lambda x: "|".join([self.status_name_dict[status] for status in x.remove_status])),
-            ]
-
-        # Create CSV
-        out_rows = []
-
-        header_row = ",".join([header[0] for header in headers])
-        out_rows.append(header_row)
+            ] + [(header, lambda x, key=key: format_race_stat(x.race_stats.get(key))) for header, key in RACE_STAT_COLUMNS]
+        return headers
 
+    def iter_csv_rows(self):
+        """Yields the CSV lines, header first, while streaming through the log.
+        Only the current req/resp pair is held in memory."""
         def remove_zero(value):
             if value in (0, '0'):
                 return ""
             return value
 
-        for action in self.action_list:
+        headers = None
+        for action in self.iter_actions():
+            if headers is None:
+                headers = self.get_csv_headers()
+                yield ",".join([header[0] for header in headers])
+
             # Ignore certain actions
             if action.action_type.value < 0:
                 continue
@@ -515,17 +572,22 @@ class TrainingAnalyzer():
                 formatted_cells.append(cell_data)
 
             # Combine lines
-            row = ",".join(formatted_cells)
-            out_rows.append(row)
+            yield ",".join(formatted_cells)
+
+        if headers is None:
+            # Empty log. Still raises like before if there is no starting packet.
+            yield ",".join([header[0] for header in self.get_csv_headers()])
 
-        return out_rows
+    def to_csv_list(self):
+        return list(self.iter_csv_rows())
 
 
     def to_csv(self):
         t1 = time.perf_counter()
         with open(self.training_tracker.get_csv_path(), 'w', encoding='utf-8') as csvfile:
-            csvfile.write("\n".join(self.to_csv_list()))
+            csvfile.write("\n".join(self.iter_csv_rows()))
         t2 = time.perf_counter()
+        profiler.record("training_tracker.to_csv", t2 - t1)
         logger.debug(f"CSV generation took {t2-t1:0.4f} seconds")
 
 
@@ -573,7 +635,7 @@ class TrainingAnalyzer():
                     if prev_resp:
                         support_index = prev_resp['unchecked_event_array'][0]['event_contents_info']['tips_training_partner_id'] - 1
                         support_id = self.support_cards[support_index]['support_card_id']
-                        hint_chara_id = mdb.get_support_card_dict()[support_id][3]
+                        hint_chara_id = self.support_card_dict[support_id][3]
 
                 action.text = self.chara_names_dict[hint_chara_id] if hint_chara_id in self.chara_names_dict else "Unknown Chara"
                 action.action_type = ActionType.SkillHint
@@ -735,11 +797,13 @@ class TrainingAnalyzer():
 
     def make_race_action(self, action: TrainingAction, race_dict: dict):
         race_data = race_dict['race_start_info']
-        race_scenario = race_data_parser.parse(race_dict['race_scenario'])
+        race_summary = race_cache.get_race_summary(race_dict['race_scenario'])
         action.action_type = ActionType.Race
         action.text = self.race_program_name_dict[race_data['program_id']]
         frame_order = race_data['race_horse_data'][0]['frame_order']
-        action.value = race_scenario.horse_result[frame_order-1].finish_order + 1  # Saving the finishing position here for now.
+        action.value = race_summary['finish_order'][frame_order-1]  # Saving the finishing position here for now.
+        if race_summary['stats']:
+            action.race_stats = {key: values[frame_order-1] for key, values in race_summary['stats'].items()}
         self.last_program_id = race_data['program_id']
         return
 
@@ -769,7 +833,7 @@ class TrainingAnalyzer():
             motivation.append(packet['chara_info']['motivation'])
             fans.append(packet['chara_info']['fans'])
 
-        for packet in self.packets:
+        for packet in self.training_tracker.iter_packets():
             if packet['_direction'] == 1:
                 in_packets.append(packet)
                 # Incoming packet
@@ -804,69 +868,144 @@ class TrainingAnalyzer():
         ax.yaxis.set_major_locator(ticker.MultipleLocator(100))
 
 
+CSV_WORKER_ANALYZER = None
+def init_csv_worker(snapshot):
+    global CSV_WORKER_ANALYZER
+    CSV_WORKER_ANALYZER = TrainingAnalyzer(snapshot)
+
+
+def get_run_csv_rows(training_path, training_analyzer=None):
+    """Returns the CSV rows of one training log. Runs inside a process pool worker unless an analyzer is given."""
+    if training_analyzer is None:
+        training_analyzer = CSV_WORKER_ANALYZER
+    _, training_name = os.path.split(training_path)
+    training_name, _ = os.path.splitext(training_name)
+    training_analyzer.set_training_tracker(TrainingTracker(training_name, full_path=os.path.splitext(training_path)[0]))
+    return list(training_analyzer.iter_csv_rows())
+
+
+def get_run_race_rows(training_path, training_analyzer=None):
+    """Returns one CSV row with the race statistics of every race in a training log, header first."""
+    if training_analyzer is None:
+        training_analyzer = CSV_WORKER_ANALYZER
+    _, training_name = os.path.split(training_path)
+    training_name, _ = os.path.splitext(training_name)
+    training_analyzer.set_training_tracker(TrainingTracker(training_name, full_path=os.path.splitext(training_path)[0]))
+
+    rows = [",".join(["Log", "Turn", "Race", "Finish"] + [header for header, _ in RACE_STAT_COLUMNS])]
+    for action in training_analyzer.iter_actions():
+        if action.action_type != ActionType.Race:
+            continue
+        cells = [training_name, action.turn, action.text, action.value] + [format_race_stat(action.race_stats.get(key)) for _, key in RACE_STAT_COLUMNS]
+        cells = [str(cell).replace('"', '""') for cell in cells]
+        rows.append(",".join(f"\"{cell}\"" if ',' in cell else cell for cell in cells))
+    return rows
+
+
 class TrainingCombiner:
     training_paths = None
     output_file_path = None
     result = None
+    progress_message = None
+    current_training_path = None
 
-    def __init__(self, training_paths, output_file_path, result: list):
+    def __init__(self, training_paths, output_file_path, result: list, row_function=get_run_csv_rows):
         self.training_paths = training_paths
         self.output_file_path = output_file_path
         self.result = result
+        self.row_function = row_function
+        self.progress_message = "Creating CSV..."
+        self.finished_count = 0
+        self.progress_lock = threading.Lock()
+
+    def update_progress(self, _=None):
+        with self.progress_lock:
+            self.finished_count += 1
+            self.progress_message = f"Creating CSV... ({self.finished_count}/{len(self.training_paths)})"
+
+    def get_current_training_name(self):
+        _, training_name = os.path.split(self.current_training_path)
+        training_name, _ = os.path.splitext(training_name)
+        return training_name
+
+    def iter_run_rows(self, training_analyzer):
+        """Yields the rows of every run, in the order the runs were given.
+        Runs are analyzed in a process pool when there is more than one."""
+        worker_count = min(len(self.training_paths), os.cpu_count() or 1)
+        if worker_count <= 1:
+            for training_path in self.training_paths:
+                self.current_training_path = training_path
+                rows = self.row_function(training_path, training_analyzer)
+                self.update_progress()
+                yield rows
+            return
+
+        logger.debug(f"Analyzing {len(self.training_paths)} runs with {worker_count} processes")
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=worker_count, initializer=init_csv_worker, initargs=(training_analyzer.snapshot,))
+        try:
+            futures = [executor.submit(self.row_function, training_path) for training_path in self.training_paths]
+            for future in futures:
+                future.add_done_callback(self.update_progress)
+            for training_path, future in zip(self.training_paths, futures):
+                self.current_training_path = training_path
+                yield future.result()
+        finally:
+            # Drop the queued runs if one of them failed.
+            executor.shutdown(wait=True, cancel_futures=True)
 
     def combine(self):
-        csvs = []
+        # Rows are streamed into a temporary file as each run finishes.
+        # It replaces the output once every run was converted.
+        tmp_file_path = self.output_file_path + ".tmp"
         training_analyzer = TrainingAnalyzer()
-        for training_path in self.training_paths:
-            try:
-                _, training_name = os.path.split(training_path)
-                training_name, _ = os.path.splitext(training_name)
-                training_analyzer.set_training_tracker(TrainingTracker(training_name, full_path=os.path.splitext(training_path)[0]))
-                csvs.append(training_analyzer.to_csv_list())
-            except NotImplementedError as e:
-                util.show_error_box_no_report(f"Error while generating CSV for {training_name}", str(e))
-                self.result.append(False)
-                return
-            except Exception:
-                logger.error(traceback.format_exc())
-                util.show_error_box("Error", f"Error while generating CSV for {training_name}")
-                self.result.append(False)
-                logger.debug(f"Error while generating CSV for {training_path}")
-                return
-
-        with open(self.output_file_path, 'w', encoding='utf-8') as csv_file:
-            first = True
-            for i, rows in enumerate(csvs):
-                if not first:
-                    csv_file.write("\n")
-                header = True
-                for j, row in enumerate(rows):
-                    if len(self.training_paths) > 1:
-                        if header:
-                            header = False
-                            if not first:
-                                rows[j] = ''
+        try:
+            with open(tmp_file_path, 'w', encoding='utf-8') as csv_file:
+                try:
+                    for i, rows in enumerate(self.iter_run_rows(training_analyzer)):
+                        if i > 0:
+                            csv_file.write("\n")
+                        separator = ""
+                        for j, row in enumerate(rows):
+                            if len(self.training_paths) > 1:
+                                if j == 0:
+                                    if i > 0:
+                                        continue
+                                    row = "Run," + row
+                                else:
+                                    row = f"{i + 1}," + row
+                            if not row:
                                 continue
-                            first = False
-                            rows[j] = "Run," + row
-                        else:
-                            rows[j] = f"{i + 1}," + row
-                csv_file.write("\n".join(row for row in rows if row))
+                            csv_file.write(separator + row)
+                            separator = "\n"
+                except NotImplementedError as e:
+                    util.show_error_box_no_report(f"Error while generating CSV for {self.get_current_training_name()}", str(e))
+                    self.result.append(False)
+                    return
+                except Exception:
+                    logger.error(traceback.format_exc())
+                    util.show_error_box("Error", f"Error while generating CSV for {self.get_current_training_name()}")
+                    self.result.append(False)
+                    logger.debug(f"Error while generating CSV for {self.current_training_path}")
+                    return
+            os.replace(tmp_file_path, self.output_file_path)
+        finally:
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
         self.result.append(True)
-        logger.debug("Finished generating CSV for %s", self.output_file_path)
+        logger.debug(f"Finished generating CSV for {self.output_file_path}")
         return
 
 
-def combine_trainings(training_paths, output_file_path):
+def combine_trainings(training_paths, output_file_path, row_function=get_run_csv_rows):
     result = []
     
-    combiner = TrainingCombiner(training_paths, output_file_path, result)
+    combiner = TrainingCombiner(training_paths, output_file_path, result, row_function)
     combiner_thread = threading.Thread(target=combiner.combine)
     logger.debug("Starting thread to generate CSV")
     combiner_thread.start()
 
     logger.debug("Running popup")
-    gui.show_widget(gui.UmaBorderlessPopup, "Creating CSV", "Creating CSV...", combiner_thread, result)
+    gui.show_widget(gui.UmaBorderlessPopup, "Creating CSV", combiner.progress_message, combiner, result)
     logger.debug("Finished popup")
 
     return result[0]
@@ -880,8 +1019,8 @@ def training_csv_dialog(training_paths=None):
                 InitialDir=util.TRAINING_LOGS_FOLDER,
                 Title="Select training log(s)",
                 Flags=win32con.OFN_ALLOWMULTISELECT | win32con.OFN_FILEMUSTEXIST | win32con.OFN_EXPLORER | win32con.OFN_NOCHANGEDIR,
-                DefExt="gz",
-                Filter="Training logs (*.gz)\0*.gz\0\0",
+                DefExt=training_log.LOG_EXTENSION[1:],
+                Filter="Training logs (*.umalog;*.gz)\0*.umalog;*.gz\0\0",
                 MaxFile=2147483647
             )
             # os.chdir(cwd_before)
@@ -900,19 +1039,34 @@ def training_csv_dialog(training_paths=None):
             util.show_warning_box("Error", "No file(s) selected.")
             return
 
-    # Check if all files end with .gz
+    # Check if all files are training logs
     # If not, show error message
     for training_path in training_paths:
-        if not training_path.endswith(".gz"):
-            util.show_warning_box("Error", "All chosen files must be .gz (gzip) files.")
+        if not training_path.endswith(training_log.LOG_EXTENSIONS):
+            util.show_warning_box("Error", "All chosen files must be training logs (.umalog or .gz files).")
             return
 
+    output_file_path = ask_csv_output_path("training")
+    if not output_file_path:
+        return
+
+    # Update cached dicts first
+    mdb.update_mdb_cache(background=False)
+
+    if not combine_trainings(training_paths, output_file_path):
+        return
+
+    util.show_info_box("Success", "CSV successfully created.")
+    return
+
+
+def ask_csv_output_path(default_name, initial_dir=util.TRAINING_LOGS_FOLDER):
     try:
         output_file_path, _, _ = win32gui.GetSaveFileNameW(
-            InitialDir=util.TRAINING_LOGS_FOLDER,
+            InitialDir=initial_dir,
             Title="Select output file",
             Flags=win32con.OFN_EXPLORER | win32con.OFN_OVERWRITEPROMPT | win32con.OFN_PATHMUSTEXIST | win32con.OFN_NOCHANGEDIR,
-            File="training",
+            File=default_name,
             DefExt="csv",
             Filter="CSV (*.csv)\0*.csv\0\0"
         )
@@ -921,7 +1075,7 @@ def training_csv_dialog(training_paths=None):
     except util.pywinerror:
         # os.chdir(cwd_before)
         util.show_warning_box("Error", "No output file given.")
-        return
+        return None
     
     # os.chdir(cwd_before)
 
@@ -929,11 +1083,27 @@ def training_csv_dialog(training_paths=None):
 
     if not output_file_path.endswith(".csv"):
         output_file_path += ".csv"
+    return output_file_path
+
+
+def race_stats_csv_dialog(folder_paths):
+    """Exports the race statistics of every training log in the given folders to one CSV."""
+    training_paths = []
+    for folder_path in folder_paths:
+        training_paths += sorted(entry.path for entry in os.scandir(folder_path) if entry.is_file() and entry.name.endswith(training_log.LOG_EXTENSIONS))
+
+    if not training_paths:
+        util.show_warning_box("Error", "No training logs (.umalog or .gz files) found in the chosen folder(s).")
+        return
+
+    output_file_path = ask_csv_output_path("races", folder_paths[0])
+    if not output_file_path:
+        return
 
     # Update cached dicts first
-    mdb.update_mdb_cache()
+    mdb.update_mdb_cache(background=False)
 
-    if not combine_trainings(training_paths, output_file_path):
+    if not combine_trainings(training_paths, output_file_path, get_run_race_rows):
         return
 
     util.show_info_box("Success", "CSV successfully created.")
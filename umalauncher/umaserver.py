@@ -1,8 +1,11 @@
-from flask import Flask, request
+from flask import Flask, Response, request, redirect, send_file
 from werkzeug.serving import make_server
 from loguru import logger
 import json
 import util
+import profiler
+import image_cache
+import overlay_channel
 
 domain = '127.0.0.1'
 port = 3150
@@ -48,6 +51,87 @@ def skills_window_rect():
 
     return '', 200
 
+# Only the helper page may read the overlay. Requests without an Origin header do not come from a web page.
+OVERLAY_ORIGINS = ("https://gametora.com",)
+
+def is_overlay_origin_allowed():
+    origin = request.headers.get('Origin')
+    return origin is None or origin in OVERLAY_ORIGINS
+
+def get_overlay_cors_headers():
+    origin = request.headers.get('Origin')
+    if origin is None:
+        return {}
+    return {
+        'Access-Control-Allow-Origin': origin,
+        'Vary': "Origin",
+    }
+
+@app.route('/overlay-events', methods=['GET'])
+def overlay_events():
+    # Server-sent events with the helper overlay. The helper page on gametora.com subscribes with an EventSource.
+    if not is_overlay_origin_allowed():
+        return '', 403
+    channel = overlay_channel.OVERLAY_CHANNEL
+    subscriber = channel.subscribe()
+
+    def stream():
+        try:
+            yield "retry: 1000\n\n"
+            while True:
+                message = channel.get_next(subscriber)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {message['seq']}\nevent: overlay\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+        except EOFError:
+            pass
+        finally:
+            channel.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype="text/event-stream", headers={
+        'Cache-Control': "no-cache",
+        **get_overlay_cors_headers(),
+    })
+
+@app.route('/overlay-resync', methods=['POST'])
+def overlay_resync():
+    if not is_overlay_origin_allowed():
+        return '', 403
+    overlay_channel.OVERLAY_CHANNEL.request_full()
+    return '', 200, get_overlay_cors_headers()
+
+@app.route('/profile', methods=['GET'])
+def profile():
+    return profiler.get_summary(), 200
+
+# One year, the longest cache lifetime browsers accept. Asset URLs change with the image.
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+@app.route('/assets/<path:asset_path>', methods=['GET'])
+def asset_image(asset_path):
+    image = util.ASSET_IMAGES.get(asset_path)
+    if image is None:
+        return '', 404
+    png, etag = image
+
+    response = app.response_class(png, mimetype="image/png")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+@app.route('/gametora/<path:image_path>', methods=['GET'])
+def gametora_image(image_path):
+    if not image_cache.ALLOWED_PATH.fullmatch(image_path):
+        return '', 404
+    file_path = image_cache.get_image_cache().get(image_path)
+    if file_path is None:
+        # Let the browser try GameTora itself.
+        return redirect(image_cache.GAMETORA_IMAGE_URL + image_path)
+    return send_file(file_path, mimetype="image/png", max_age=ASSET_MAX_AGE, conditional=True, etag=True)
+
 @app.route('/topmost', methods=['POST'])
 def topmost():
     global threader
@@ -106,11 +190,13 @@ class UmaServer():
 
     def run(self):
         logger.info("Starting server")
-        self.server = make_server(domain, port, app)
+        # Threaded, so an image that is still downloading does not hold up the other requests.
+        self.server = make_server(domain, port, app, threaded=True)
         self.server.serve_forever()
 
     def stop(self):
         logger.info("Stopping server")
+        overlay_channel.OVERLAY_CHANNEL.close()
         if self.server:
             self.server.shutdown()
         logger.info("Server stopped")
\ No newline at end of file
@@ -1,6 +1,6 @@
 import os
 import sys
-import base64
+import hashlib
 import io
 import ctypes
 import win32event
@@ -115,6 +115,7 @@ import win32con
 import traceback
 import math
 import time
+import threading
 import requests
 from pywintypes import error as pywinerror  # pylint: disable=no-name-in-module
 from PIL import Image
@@ -126,7 +127,7 @@ TRAINING_LOGS_FOLDER = get_appdata("training_logs")
 
 last_failed_request = None
 has_failed_once = False
-def do_get_request(url, error_title=None, error_message=None, ignore_timeout=False):
+def do_get_request(url, error_title=None, error_message=None, ignore_timeout=False, headers=None, show_warning=True):
     global last_failed_request
     global has_failed_once
 
@@ -138,13 +139,13 @@ def do_get_request(url, error_title=None, error_message=None, ignore_timeout=Fal
             else:
                 return None
         logger.debug(f"GET request to {url}")
-        response = requests.get(url, timeout=10)
+        response = requests.get(url, headers=headers, timeout=10)
         response.raise_for_status()
         return response
     except:
         logger.warning(f"Failed to connect to {url}")
         logger.warning(traceback.format_exc())
-        if ignore_timeout or not has_failed_once:
+        if show_warning and (ignore_timeout or not has_failed_once):
             has_failed_once = True
             logger.warning(traceback.format_exc())
             show_warning_box(
@@ -492,54 +493,129 @@ def is_minimized(handle):
         # Default to it being minimized as to not save the game window.
         return True
 
-downloaded_chara_dict = {}
+UMAPYOI_API_URL = "https://umapyoi.net/api/v1/"
+UMAPYOI_CACHE_FOLDER = get_appdata("umapyoi_cache")
+
+class UmapyoiNameCache():
+    """Translated names from a umapyoi.net API endpoint, stored on disk with the ETag and Last-Modified validators.
+    The stored response is used right away and revalidated in the background,
+    so an unchanged response only costs a 304 and an unreachable server costs nothing.
+    names is replaced, never changed, so it can be read while it is being updated."""
+
+    def __init__(self, endpoint, parse):
+        self.endpoint = endpoint
+        self.path = os.path.join(UMAPYOI_CACHE_FOLDER, endpoint.replace("/", "_") + ".json")
+        self.parse = parse
+        self.names = {}
+        self.mdb_names = {}
+        self.lock = threading.Lock()
+        self.entry = None
+        self.loaded = False
+        self.refreshing = False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            return entry if 'data' in entry else None
+        except (OSError, ValueError):
+            logger.warning(f"Could not read {self.path}: {traceback.format_exc()}")
+            return None
+
+    def save(self, entry):
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(UMAPYOI_CACHE_FOLDER, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logger.warning(f"Could not write {self.path}: {traceback.format_exc()}")
+
+    def get(self):
+        """Returns the stored response data, or None if nothing was downloaded yet."""
+        with self.lock:
+            if not self.loaded:
+                self.entry = self.load()
+                self.loaded = True
+            entry = self.entry
+        return entry['data'] if entry else None
+
+    def update_names(self, mdb_names):
+        """Sets names to the names from master.mdb, replaced by the stored umapyoi.net names where there are any.
+        names is set again in the background if umapyoi.net has newer names. mdb_names is not changed."""
+        self.mdb_names = mdb_names
+        data = self.get()
+        self.names = {**mdb_names, **self.parse(data)} if data else mdb_names
+        self.revalidate()
+        return self.names
+
+    def revalidate(self):
+        """Asks umapyoi.net for a newer response in a background thread."""
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self.refresh, name="UmapyoiCache", daemon=True).start()
+
+    def refresh(self):
+        try:
+            with self.lock:
+                entry = self.entry
+            headers = {}
+            if entry:
+                if entry.get('etag'):
+                    headers['If-None-Match'] = entry['etag']
+                if entry.get('last_modified'):
+                    headers['If-Modified-Since'] = entry['last_modified']
+
+            # With a stored response there are still translations to show, so failing is not worth a warning.
+            response = do_get_request(UMAPYOI_API_URL + self.endpoint, headers=headers, show_warning=entry is None)
+            if response is None:
+                return
+            if response.status_code == 304:
+                logger.debug(f"{self.endpoint} from umapyoi.net is unchanged")
+                return
+
+            entry = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'data': response.json(),
+            }
+            with self.lock:
+                self.entry = entry
+            self.save(entry)
+            logger.info(f"Downloaded {self.endpoint} from umapyoi.net")
+            self.names = {**self.mdb_names, **self.parse(entry['data'])}
+        except Exception:
+            logger.warning(f"Could not refresh {self.endpoint} from umapyoi.net: {traceback.format_exc()}")
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+
+CHARACTER_NAME_CACHE = UmapyoiNameCache("character/names",
+                                        lambda characters: {character['game_id']: character['name'] for character in characters})
 def get_character_name_dict(force=False):
-    global downloaded_chara_dict
-
-    if force or not downloaded_chara_dict:
-        chara_dict = mdb.get_chara_name_dict()
-        response = do_get_request("https://umapyoi.net/api/v1/character/names")
-        if not response:
-            return chara_dict
-
-        for character in response.json():
-            chara_dict[character['game_id']] = character['name']
+    if force or not CHARACTER_NAME_CACHE.names:
+        return CHARACTER_NAME_CACHE.update_names(mdb.get_chara_name_dict())
+    return CHARACTER_NAME_CACHE.names
 
-        downloaded_chara_dict.update(chara_dict)
-    return downloaded_chara_dict
-
-downloaded_outfit_dict = {}
+OUTFIT_NAME_CACHE = UmapyoiNameCache("outfit",
+                                     lambda outfits: {outfit['id']: outfit['title'] for outfit in outfits})
 def get_outfit_name_dict(force=False):
-    global downloaded_outfit_dict
-
-    if force or not downloaded_outfit_dict:
-        outfit_dict = mdb.get_outfit_name_dict()
-        response = do_get_request("https://umapyoi.net/api/v1/outfit")
-        if not response:
-            return outfit_dict
-
-        for outfit in response.json():
-            outfit_dict[outfit['id']] = outfit['title']
+    if force or not OUTFIT_NAME_CACHE.names:
+        return OUTFIT_NAME_CACHE.update_names(mdb.get_outfit_name_dict())
+    return OUTFIT_NAME_CACHE.names
 
-        downloaded_outfit_dict.update(outfit_dict)
-    return downloaded_outfit_dict
-
-downloaded_race_name_dict = {}
+RACE_NAME_CACHE = UmapyoiNameCache("race_program",
+                                   lambda race_programs: {race_program['id']: race_program['name'] for race_program in race_programs})
 def get_race_name_dict(force=False):
-    global downloaded_race_name_dict
-
-    if force or not downloaded_race_name_dict:
-        race_name_dict = mdb.get_race_program_name_dict()
-        logger.info("Requesting race names from umapyoi.net")
-        response = do_get_request("https://umapyoi.net/api/v1/race_program")
-        if not response:
-            return race_name_dict
-        
-        for race_program in response.json():
-            race_name_dict[race_program['id']] = race_program['name']
-        
-        downloaded_race_name_dict.update(race_name_dict)
-    return downloaded_race_name_dict
+    if force or not RACE_NAME_CACHE.names:
+        return RACE_NAME_CACHE.update_names(mdb.get_race_program_name_dict())
+    return RACE_NAME_CACHE.names
 
 def create_gametora_helper_url(card_id, scenario_id, support_ids, language="English", server="ja"):
     support_ids = list(map(str, support_ids))
@@ -551,6 +627,22 @@ def create_gametora_helper_url(card_id, scenario_id, support_ids, language="Engl
     language_segment = constants.GT_LANGUAGE_URL_DICT.get(language, "")
     return f"https://gametora.com/{language_segment}umamusume/training-event-helper?deck={np.base_repr(int(str(card_id) + str(scenario_id)), 36)}-{np.base_repr(int(support_ids[0] + support_ids[1] + support_ids[2]), 36)}-{np.base_repr(int(support_ids[3] + support_ids[4] + support_ids[5]), 36)}&server={server}".lower()
 
+# PNGs of the asset images used in the overlay, served by umaserver: path relative to _assets -> (PNG bytes, ETag)
+ASSET_IMAGES = {}
+ASSET_IMAGE_URL = "http://127.0.0.1:3150/assets/"
+
+def store_asset_image(asset_path, img):
+    """Stores img as a PNG for umaserver to serve and returns its URL.
+    The URL changes when the image does, so the browser can keep it cached."""
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    png = buffer.getvalue()
+    buffer.close()
+
+    etag = hashlib.blake2b(png, digest_size=8).hexdigest()
+    ASSET_IMAGES[asset_path] = (png, etag)
+    return f"{ASSET_IMAGE_URL}{asset_path}?v={etag}"
+
 gm_fragment_dict = {}
 def get_gm_fragment_dict(force=False):
     global gm_fragment_dict
@@ -567,17 +659,8 @@ def get_gm_fragment_dict(force=False):
 
             img = Image.open(asset_path)
             img.thumbnail((36, 36))
-
-            # Save the image in memory in PNG format
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
+            tmp_gm_fragment_dict[i] = store_asset_image(f"gm/frag_{i:02}.png", img)
             img.close()
-
-            # Encode PNG image to base64 string
-            b64 = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
-            tmp_gm_fragment_dict[i] = b64
-
-            buffer.close()
         
         gm_fragment_dict.update(tmp_gm_fragment_dict)
     return gm_fragment_dict
@@ -601,17 +684,9 @@ def assets_folder_images_to_dict(folder, size=None):
         if size is not None:
             img.thumbnail(size)
 
-        # Save the image in memory in PNG format
-        buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
+        img_dict[img_key] = store_asset_image(f"{folder.removeprefix('_assets/')}/{image_path}", img)
         img.close()
 
-        # Encode PNG image to base64 string
-        b64 = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
-        img_dict[img_key] = b64
-
-        buffer.close()
-
     return img_dict
 
 
@@ -707,18 +782,19 @@ def scouting_score_to_rank_string(score):
             break
     return current_rank
 
+# Cached dicts and the source they are built from: master.mdb, umapyoi.net or an asset folder.
 UPDATE_FUNCS = [
-    get_character_name_dict,
-    get_outfit_name_dict,
-    get_race_name_dict,
-    get_gm_fragment_dict,
-    get_uaf_sport_image_dict,
-    get_uaf_genre_image_dict,
-    get_gff_veg_image_dict,
-    get_gl_token_dict,
-    get_rmu_image_dict,
-    get_dreams_image_dict,
-    get_group_support_id_to_passion_zone_effect_id_dict,
+    (get_character_name_dict, mdb.UMAPYOI_SOURCE),
+    (get_outfit_name_dict, mdb.UMAPYOI_SOURCE),
+    (get_race_name_dict, mdb.UMAPYOI_SOURCE),
+    (get_gm_fragment_dict, "_assets/gm"),
+    (get_uaf_sport_image_dict, "_assets/uaf/sports"),
+    (get_uaf_genre_image_dict, "_assets/uaf/genres"),
+    (get_gff_veg_image_dict, "_assets/gff/vegetables"),
+    (get_gl_token_dict, "_assets/gl/tokens"),
+    (get_rmu_image_dict, "_assets/rmu"),
+    (get_dreams_image_dict, "_assets/dreams"),
+    (get_group_support_id_to_passion_zone_effect_id_dict, mdb.MDB_SOURCE),
 ]
 
 def get_game_variant_string():
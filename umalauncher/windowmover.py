@@ -2,6 +2,7 @@ import os
 import time
 from loguru import logger
 import util
+import profiler
 import win32gui
 
 
@@ -14,12 +15,14 @@ class GameWindow():
         self.threader = threader
         return
 
+    @profiler.timed("windowmover.get_rect")
     def get_rect(self):
         rect = util.get_window_rect(self.handle)
         if not rect:
             return None, None
         return rect, rect_is_portrait(rect)
 
+    @profiler.timed("windowmover.set_pos")
     def set_pos(self, pos, is_portrait):
         if pos[2] < 1 or pos[3] < 1:
             logger.error(f"Trying to set window to invalid size: {pos}")